@@ -28,11 +28,11 @@ class JobSearchAdmin(ReadOnlyAdminDateFieldsMIXIN):
 
     def crawl_page_action(self, request, queryset):
         for page in queryset:
-            tasks.get_job_page_posts.delay(page.pk)
+            tasks.crawl_job_search.delay(page.pk)
 
     def crawl_page_repetitive_action(self, request, queryset):
         for page in queryset:
-            tasks.get_job_page_posts.delay(page.pk, ignore_repetitive=False)
+            tasks.crawl_job_search.delay(page.pk, ignore_repetitive=False)
 
     actions = (crawl_page_action, crawl_page_repetitive_action)
 
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class LinkedinConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "linkedin"
+
+    def ready(self):
+        from linkedin import signals  # noqa: F401
@@ -0,0 +1,111 @@
+from celery.utils.log import get_task_logger
+from selenium.common.exceptions import JavascriptException
+
+logger = get_task_logger(__name__)
+
+# Each find_element, get_attribute and text of the helpers in linkedin.tasks is an
+# http call to the selenium grid. These scripts read the same selectors in the
+# browser and return all fields of a page at once, the helpers remain as fallback.
+READ_JOB_CARD = """
+function readJobCard(card) {
+    const text = (selector) => {
+        const element = card.querySelector(selector);
+        return element ? element.innerText.trim() : null;
+    };
+    const link = card.querySelector(".job-card-container__link");
+    const strong = card.querySelector(".artdeco-entity-lockup__title strong");
+    const icon = 'svg[data-test-icon="linkedin-bug-color-small"]';
+    return {
+        element: card,
+        id: card.getAttribute("data-occludable-job-id"),
+        url: link ? link.href : null,
+        title: strong ? strong.innerText.trim() : text(".artdeco-entity-lockup__title"),
+        company: text(".artdeco-entity-lockup__subtitle"),
+        location: text(".artdeco-entity-lockup__caption"),
+        easy_apply: card.querySelector(icon) !== null,
+    };
+}
+"""
+JOB_CARDS_SCRIPT = (
+    READ_JOB_CARD
+    + """
+return Array.from(
+    document.getElementsByClassName("scaffold-layout__list-item"), readJobCard
+);
+"""
+)
+JOB_CARD_SCRIPT = READ_JOB_CARD + "return readJobCard(arguments[0]);"
+JOB_DETAIL_SCRIPT = """
+const details = document.getElementById("job-details");
+const insights = document.getElementsByClassName(
+    "job-details-jobs-unified-top-card__job-insight"
+);
+return {
+    description: details ? details.innerText : null,
+    insights: Array.from(insights, (element) => element.innerText),
+};
+"""
+POSTS_SCRIPT = """
+return Array.from(document.getElementsByClassName("feed-shared-update-v2"), (article) => {
+    const body = article.querySelector(".break-words");
+    const counts = article.querySelector("ul.social-details-social-counts");
+    const labels = counts ? Array.from(counts.querySelectorAll("li"), (social) => {
+        const button = social.querySelector("button");
+        return social.getAttribute("aria-label")
+            || (button && button.getAttribute("aria-label"));
+    }) : null;
+    return {
+        element: article,
+        id: article.getAttribute("data-urn"),
+        body: body ? body.innerText : null,
+        labels: labels,
+    };
+});
+"""
+
+
+def run_script(driver, script, *args):
+    """Runs an extraction script, None if it fails so the caller falls back"""
+    try:
+        return driver.execute_script(script, *args)
+    except JavascriptException:
+        logger.warning("extraction script failed", exc_info=True)
+        return None
+
+
+def read_job_cards(driver):
+    """Reads job cards of a search page. Cards that LinkedIn has not rendered
+    yet (it renders them when they get into view) only have element and id.
+
+    Returns:
+        list: dicts of element, id, url, title, company, location and easy_apply
+        of cards, None if the script failed
+    """
+    return run_script(driver, JOB_CARDS_SCRIPT)
+
+
+def read_job_card(driver, element):
+    return run_script(driver, JOB_CARD_SCRIPT, element)
+
+
+def is_rendered(card):
+    return card.get("title") is not None
+
+
+def read_job_details(driver):
+    """Reads description and insights of the opened job
+
+    Returns:
+        dict: description and insights texts, None if the script failed
+    """
+    return run_script(driver, JOB_DETAIL_SCRIPT)
+
+
+def read_posts(driver):
+    """Reads posts of a channel page
+
+    Returns:
+        list: dicts of element, id, body and labels of social counts of posts,
+        None if the script failed
+    """
+    return run_script(driver, POSTS_SCRIPT)
@@ -0,0 +1,117 @@
+import time
+import uuid
+
+import redis
+
+# db 5 is flushed by linkedin duplicate checker and db 15 by views cache
+REDIS_CLIENT = redis.Redis(host="social_redis", port=6379, db=6)
+FRONTIER_KEY = "linkedin:frontier"
+# worker token -> time of its last popped unit
+WORKERS_KEY = "linkedin:frontier:workers"
+# a worker that popped no unit for WORKER_TTL seconds is considered dead
+WORKER_TTL = 60 * 60
+# seconds until the frontier is dispatched again when no browser was free
+RETRY_DELAY = 2 * 60
+# jobs of a search result page, offset of page n is n * PAGE_SIZE
+PAGE_SIZE = 25
+# units of searches with higher priority are popped first, then first pages
+MAX_PAGES = 1000
+
+
+def unit_member(search_id, offset, ignore_repetitive):
+    return f"{search_id}:{offset}:{int(ignore_repetitive)}"
+
+
+def unit_score(priority, offset):
+    return priority * MAX_PAGES - offset // PAGE_SIZE
+
+
+def push_search(search, ignore_repetitive=True):
+    """Adds all pages of a job search to the frontier. Pages that are already
+    waiting in the frontier are not added twice.
+
+    Args:
+        search (JobSearch): the job search
+        ignore_repetitive (bool, optional): skip jobs that were sent before.
+
+    Returns:
+        int: number of added pages
+    """
+    units = {
+        unit_member(search.pk, page * PAGE_SIZE, ignore_repetitive): unit_score(
+            search.priority, page * PAGE_SIZE
+        )
+        for page in range(min(max(search.page_count, 1), MAX_PAGES))
+    }
+    return REDIS_CLIENT.zadd(FRONTIER_KEY, units)
+
+
+def push_back(unit, priority):
+    """Returns a popped unit to the frontier, e.g. no browser was free for it"""
+    search_id, offset, ignore_repetitive = unit
+    REDIS_CLIENT.zadd(
+        FRONTIER_KEY,
+        {
+            unit_member(search_id, offset, ignore_repetitive): unit_score(
+                priority, offset
+            )
+        },
+    )
+
+
+def pop_unit():
+    """Pops the page with the highest priority
+
+    Returns:
+        tuple: search id, page offset and ignore_repetitive, None if the frontier
+        is empty
+    """
+    popped = REDIS_CLIENT.zpopmax(FRONTIER_KEY)
+    if not popped:
+        return None
+    search_id, offset, ignore_repetitive = popped[0][0].decode().split(":")
+    return int(search_id), int(offset), ignore_repetitive == "1"
+
+
+def drop_next_pages(search, offset, ignore_repetitive=True):
+    """Removes pages of a search after offset, e.g. a page had only seen jobs so
+    the next ones are older and seen too.
+
+    Returns:
+        int: number of removed pages
+    """
+    members = [
+        unit_member(search.pk, page * PAGE_SIZE, ignore_repetitive)
+        for page in range(offset // PAGE_SIZE + 1, max(search.page_count, 1))
+    ]
+    if not members:
+        return 0
+    return REDIS_CLIENT.zrem(FRONTIER_KEY, *members)
+
+
+def size():
+    return REDIS_CLIENT.zcard(FRONTIER_KEY)
+
+
+def join(worker=None):
+    """Marks a frontier worker alive, called when it starts and for each unit
+
+    Returns:
+        str: token of the worker
+    """
+    worker = worker or uuid.uuid4().hex
+    REDIS_CLIENT.zadd(WORKERS_KEY, {worker: time.time()})
+    return worker
+
+
+def leave(worker):
+    """Removes a stopped frontier worker
+
+    Returns:
+        int: number of workers that are still crawling
+    """
+    pipe = REDIS_CLIENT.pipeline()
+    pipe.zrem(WORKERS_KEY, worker)
+    pipe.zremrangebyscore(WORKERS_KEY, "-inf", time.time() - WORKER_TTL)
+    pipe.zcard(WORKERS_KEY)
+    return pipe.execute()[-1]
@@ -0,0 +1,17 @@
+from linkedin import parsers
+from reusable.benchmarks import ParserBenchmarkCommand
+
+
+class Command(ParserBenchmarkCommand):
+    app = "linkedin"
+    snapshots = [
+        ("job_search.html", parsers.parse_job_cards),
+        ("job_search.html", parsers.parse_job_details),
+        ("company_posts.html", parsers.parse_posts),
+        ("feed.html", parsers.parse_feed),
+    ]
+    captured = {
+        "linkedin-jobs": parsers.parse_job_cards,
+        "linkedin-job": parsers.parse_job_details,
+        "linkedin-posts": parsers.parse_posts,
+    }
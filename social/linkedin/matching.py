@@ -0,0 +1,149 @@
+import re
+import uuid
+import threading
+
+from django.core.cache import cache
+
+VERSION_KEY = "linkedin:matcher_version"
+# places of IgnoringFilter
+TITLE = "title"
+COMPANY = "company"
+LOCATION = "location"
+# places are checked in this order, the first matching place is the reason
+PLACES = (TITLE, COMPANY, LOCATION)
+
+
+def compile_words(words):
+    """Compiles lower cased words into one pattern that finds them as substrings.
+    Longer words come first, so where words overlap the longest one matches.
+
+    Returns:
+        Pattern: the pattern, None if there is no word
+    """
+    words = sorted({word for word in words if word}, key=len, reverse=True)
+    if not words:
+        return None
+    return re.compile(f"(?=({'|'.join(map(re.escape, words))}))")
+
+
+class JobMatcher:
+    """Ignoring filters and keywords of a JobSearch compiled to a pattern per
+    place and a pattern of keywords, so a job is matched by one pass over each
+    field instead of a pass per filter or keyword. Matching is case insensitive
+    substring matching like plain `in` checks of lower cased strings.
+
+    Args:
+        ignore_filters (list): (place, keyword) of ignoring filters
+        keywords (list): keywords reported in notifications
+    """
+
+    def __init__(self, ignore_filters, keywords):
+        self.ignored = {
+            place: [
+                keyword.lower()
+                for filter_place, keyword in ignore_filters
+                if filter_place == place and keyword is not None
+            ]
+            for place in PLACES
+        }
+        self.filters = {
+            place: compile_words(words) for place, words in self.ignored.items()
+        }
+        # an empty filter is in every text
+        self.ignore_all = {
+            place for place, words in self.ignored.items() if "" in words
+        }
+        self.keywords = list(keywords)
+        lowered = {keyword.lower() for keyword in self.keywords}
+        self.keywords_pattern = compile_words(lowered)
+        # a keyword may only be found as a prefix of a longer keyword
+        self.prefixes = {
+            keyword: [other for other in lowered if other and keyword.startswith(other)]
+            for keyword in lowered
+        }
+
+    def ignored_place(self, job_detail):
+        """Returns the first place of the job that an ignoring filter is in
+
+        Args:
+            job_detail (dict): details of the job, its title, company and location
+
+        Returns:
+            str: the place, None if no filter matches the job
+        """
+        for place in PLACES:
+            if place in self.ignore_all:
+                return place
+            pattern = self.filters[place]
+            if pattern is not None and pattern.search(job_detail[place].lower()):
+                return place
+        return None
+
+    def found_keywords(self, body):
+        """Returns keywords that are in body, in order of keywords
+
+        Args:
+            body (str): text, e.g. description of the job
+
+        Returns:
+            list: found keywords
+        """
+        found = set()
+        if self.keywords_pattern is not None:
+            for match in self.keywords_pattern.finditer(body.lower()):
+                found.update(self.prefixes[match.group(1)])
+        return [
+            keyword
+            for keyword in self.keywords
+            if not keyword or keyword.lower() in found
+        ]
+
+
+def matcher_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate_matchers():
+    """Makes all processes compile matchers again, e.g. a filter changed"""
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+class MatcherCache:
+    """Compiled matchers of job searches in this process. A matcher is compiled
+    again when the shared version changed since it was compiled.
+    """
+
+    def __init__(self):
+        self.matchers = {}
+        self.lock = threading.Lock()
+
+    def get(self, search):
+        """Returns the compiled matcher of a job search
+
+        Args:
+            search (JobSearch): the job search
+
+        Returns:
+            JobMatcher: the matcher
+        """
+        version = matcher_version()
+        with self.lock:
+            cached = self.matchers.get(search.pk)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        keywords = []
+        for words in search.keywords.values_list("words", flat=True):
+            keywords += words.split(",")
+        matcher = JobMatcher(
+            list(search.ignore_filters.values_list("place", "keyword")), keywords
+        )
+        with self.lock:
+            self.matchers[search.pk] = (version, matcher)
+        return matcher
+
+
+MATCHERS = MatcherCache()
@@ -1,6 +1,7 @@
 from django.db import models
 
 from reusable.models import BaseModel
+from linkedin.matching import MATCHERS
 from user.models import Profile
 
 
@@ -72,14 +73,18 @@ class JobSearch(BaseModel):
             result = result + keyword.keywords_in_array
         return result
 
+    @property
+    def matcher(self):
+        """Compiled ignoring filters and keywords, cached until they change"""
+        return MATCHERS.get(self)
+
     @property
     def page_data(self):
         return (
             self.message,
             self.url,
-            self.output_channel.pk,
-            self.keywords_in_array,
-            self.ignore_filters.all(),
+            self.output_channel_id,
+            self.matcher,
             self.just_easily_apply,
         )
 
@@ -0,0 +1,118 @@
+from urllib.parse import urljoin
+
+from reusable.parsing import parse, parse_fragment, has_class, first, text
+
+# Selectors mirror the helpers of linkedin.tasks and the scripts of
+# linkedin.extraction, parsers return the same fields as the scripts.
+LINKEDIN_URL = "https://www.linkedin.com/"
+JOB_CARD = f'//*[{has_class("scaffold-layout__list-item")}]'
+JOB_LINK = f'.//*[{has_class("job-card-container__link")}]'
+JOB_TITLE = f'.//*[{has_class("artdeco-entity-lockup__title")}]'
+JOB_COMPANY = f'.//*[{has_class("artdeco-entity-lockup__subtitle")}]'
+JOB_LOCATION = f'.//*[{has_class("artdeco-entity-lockup__caption")}]'
+EASY_APPLY = './/*[local-name()="svg" and @data-test-icon="linkedin-bug-color-small"]'
+JOB_INSIGHT = f'//*[{has_class("job-details-jobs-unified-top-card__job-insight")}]'
+POST = f'//*[{has_class("feed-shared-update-v2")}]'
+POST_BODY = f'.//*[{has_class("break-words")}]'
+POST_COUNTS = './/ul[contains(@class, "social-details-social-counts")]'
+FEED_ARTICLE = '//div[starts-with(@data-id, "urn:li:activity:")]'
+FEED_BODY = f'.//*[{has_class("feed-shared-update-v2__commentary")}]'
+
+
+def read_job_card(card):
+    link = first(card, JOB_LINK)
+    title = first(card, JOB_TITLE)
+    strong = first(title, ".//strong")
+    return {
+        "element": None,
+        "id": card.get("data-occludable-job-id"),
+        "url": urljoin(LINKEDIN_URL, link.get("href")) if link is not None else None,
+        "title": text(strong if strong is not None else title),
+        "company": text(first(card, JOB_COMPANY)),
+        "location": text(first(card, JOB_LOCATION)),
+        "easy_apply": first(card, EASY_APPLY) is not None,
+    }
+
+
+def parse_job_cards(source):
+    """Parses job cards of a search page
+
+    Args:
+        source (str): html of the page
+
+    Returns:
+        list: dicts of id, url, title, company, location and easy_apply of cards,
+        see extraction.read_job_cards
+    """
+    return [read_job_card(card) for card in parse(source).xpath(JOB_CARD)]
+
+
+def parse_job_card(source):
+    """Parses a job card by its outerHTML"""
+    return read_job_card(parse_fragment(source))
+
+
+def parse_job_details(source):
+    """Parses description and insights of the opened job of a search page
+
+    Args:
+        source (str): html of the page
+
+    Returns:
+        dict: description and insights texts
+    """
+    document = parse(source)
+    return {
+        "description": text(first(document, '//*[@id="job-details"]')),
+        "insights": [text(insight) for insight in document.xpath(JOB_INSIGHT)],
+    }
+
+
+def read_post_labels(post):
+    counts = first(post, POST_COUNTS)
+    if counts is None:
+        return None
+    labels = []
+    for social in counts.xpath(".//li"):
+        label = social.get("aria-label")
+        if not label:
+            button = first(social, ".//button")
+            label = button.get("aria-label") if button is not None else None
+        labels.append(label)
+    return labels
+
+
+def parse_posts(source):
+    """Parses posts of a channel page
+
+    Args:
+        source (str): html of the page
+
+    Returns:
+        list: dicts of id, body and labels of social counts of posts,
+        see extraction.read_posts
+    """
+    return [
+        {
+            "element": None,
+            "id": post.get("data-urn"),
+            "body": text(first(post, POST_BODY)),
+            "labels": read_post_labels(post),
+        }
+        for post in parse(source).xpath(POST)
+    ]
+
+
+def parse_feed(source):
+    """Parses activities of the feed
+
+    Args:
+        source (str): html of the page
+
+    Returns:
+        list: dicts of id and body of activities
+    """
+    return [
+        {"id": article.get("data-id"), "body": text(first(article, FEED_BODY))}
+        for article in parse(source).xpath(FEED_ARTICLE)
+    ]
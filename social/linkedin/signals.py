@@ -0,0 +1,18 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from linkedin import models
+from linkedin.matching import invalidate_matchers
+
+
+@receiver(post_save, sender=models.Keyword)
+@receiver(post_delete, sender=models.Keyword)
+@receiver(post_save, sender=models.IgnoringFilter)
+@receiver(post_delete, sender=models.IgnoringFilter)
+@receiver(m2m_changed, sender=models.JobSearch.keywords.through)
+@receiver(m2m_changed, sender=models.JobSearch.ignore_filters.through)
+def invalidate_job_matchers(**kwargs):
+    """Compiled matchers of job searches are outdated when their keywords or
+    ignoring filters change
+    """
+    invalidate_matchers()
@@ -1,44 +1,78 @@
 import time
-import sys
 import pickle
 import traceback
 from typing import Tuple, Optional
-import redis
 
 from django.conf import settings
 from django.utils import timezone
 from django.utils.html import strip_tags
 from celery import shared_task
 from celery.utils.log import get_task_logger
-from langdetect import detect
-from langdetect.lang_detect_exception import LangDetectException
-from urllib3.exceptions import MaxRetryError
-from selenium import webdriver
 from selenium.common.exceptions import (
     NoSuchElementException,
     TimeoutException,
-    SessionNotCreatedException,
     StaleElementReferenceException,
 )
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.wait import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
 
 from linkedin import models as lin_models
 from reusable.models import get_network_model
-from reusable.other import only_one_concurrency
-from reusable.browser import scroll
+from reusable.dedup import get_duplicate_checker, clear_legacy_keys
+from reusable.language import detect_language
+from reusable.browser import scroll, parses_page_source, page_source
+from reusable.waits import wait_for, elements_more_than, script_returns, Pacer
+from reusable.browser_pool import BrowserPool, BrowserUnavailable, create_driver
+from linkedin import extraction, parsers, frontier
 from notification import tasks as not_tasks
 from notification.utils import telegram_text_purify
 from ai.chatgpt.main import get_cover_letter
 
 logger = get_task_logger(__name__)
 MINUTE = 60
-TASKS_TIMEOUT = 1 * MINUTE
-DUPLICATE_CHECKER = redis.StrictRedis(host="social_redis", port=6379, db=5)
+DAY = 24 * 60 * MINUTE
+# ids were keys of the db before namespaces, activities of the feed and of
+# expression searches share the namespace as they did then
+JOB_CHECKER = get_duplicate_checker("linkedin:job", DAY * 30, legacy_key=str)
+ACTIVITY_CHECKER = get_duplicate_checker("linkedin:activity", DAY * 30, legacy_key=str)
 LINKEDIN_URL = "https://www.linkedin.com/"
+FEED_ACTIVITY = './/div[starts-with(@data-id, "urn:li:activity:")]'
+FEED_IDS_SCRIPT = """
+return Array.from(
+    document.querySelectorAll('div[data-id^="urn:li:activity:"]'),
+    (activity) => activity.getAttribute("data-id")
+);
+"""
+# the feed is scrolled until this many activities are not sent before
+FEED_UNSEEN_ACTIVITIES = 20
+# details of another job are remembered before clicking a job card
+MARK_JOB_DETAILS_SCRIPT = """
+const details = document.getElementById("job-details");
+const current = new URLSearchParams(window.location.search).get("currentJobId");
+window.crawlerPreviousDetails =
+    details && current !== arguments[0] ? details.innerText : null;
+"""
+# details pane shows the job: its url or title link is the job and the
+# description is loaded and differs from the one before the click
+JOB_DETAILS_LOADED_SCRIPT = """
+const jobId = arguments[0];
+const details = document.getElementById("job-details");
+if (!details || !details.innerText.trim()) {
+    return false;
+}
+const current = new URLSearchParams(window.location.search).get("currentJobId");
+const link = document.querySelector(
+    `.scaffold-layout__detail a[href*="/jobs/view/${jobId}/"]`
+);
+if (current !== jobId && !link) {
+    return false;
+}
+const previous = window.crawlerPreviousDetails;
+return !!link || previous === null || details.innerText !== previous;
+"""
+PACER = Pacer("linkedin")
 
 
 def get_config():
@@ -49,34 +83,13 @@ def get_config():
     return config
 
 
-def get_driver():
-    """This function creates a browser driver and returns it
+def load_linkedin_cookies(driver):
+    """This function head the browser to the LinkedIn website and logs in by
+    the stored cookies. It runs once for each session of the browser pool.
 
-    Returns:
-        Webdriver: webdriver browser
-    """
-    try:
-        return webdriver.Remote(
-            "http://social_firefox:4444/wd/hub",
-            DesiredCapabilities.FIREFOX,
-            options=webdriver.FirefoxOptions(),
-        )
-    except SessionNotCreatedException as error:
-        logger.info("Error: %s\n\n%s", error, traceback.format_exc())
-    except MaxRetryError as error:
-        logger.info("Error: %s\n\n%s", error, traceback.format_exc())
-    # Should do appropriate action instead of exit (for example restarting docker)
-    sys.exit()
-
-
-def initialize_linkedin_driver():
-    """This function head the browser to the LinkedIn website.
-
-    Returns:
-        Webdriver: webdriver browser
+    Args:
+        driver (Webdriver): webdriver browser
     """
-    driver = get_driver()
-
     cookies = None
     with open("/app/social/linkedin_cookies.pkl", "rb") as linkedin_cookie:
         cookies = pickle.load(linkedin_cookie)
@@ -84,7 +97,11 @@ def initialize_linkedin_driver():
     driver.get(LINKEDIN_URL)
     for cookie in cookies:
         driver.add_cookie(cookie)
-    return driver
+
+
+BROWSER_POOL = BrowserPool(
+    "linkedin", load_linkedin_cookies, capacity=settings.LINKEDIN_MAX_SESSIONS
+)
 
 
 def driver_exit(driver):
@@ -105,7 +122,7 @@ def login():
     LINKEDIN_EMAIL -> username
     LINKEDIN_PASSWORD -> password
     """
-    driver = get_driver()
+    driver = create_driver()
     driver.get(f"{LINKEDIN_URL}login")
     try:
         WebDriverWait(driver, 20).until(
@@ -167,19 +184,22 @@ def store_posts(channel_id, post_id, body, meta_data):
         post.save()
 
 
-def get_post_statistics(reaction_element):
+def parse_post_statistics(labels):
+    """Parses aria-labels of social counts of a post, e.g. "12 reactions"
+
+    Args:
+        labels (list): aria-labels of items of social counts
+
+    Returns:
+        dict: reaction, comment and share counts
+    """
     statistics = {
         "reaction_count": 0,
         "comment_count": 0,
         "share_counter": 0,
     }
-    socials = reaction_element.find_elements(By.XPATH, ".//li")
-    for social in socials:
-        temp = social.get_attribute("aria-label")
-        if not temp:
-            temp = social.find_elements(By.XPATH, ".//button")
-            temp = temp[0].get_attribute("aria-label")
-        temp = temp.split()[:2]
+    for label in filter(None, labels):
+        temp = label.split()[:2]
         value, elem = int(temp[0].replace(",", "")), temp[1]
         if elem == "reactions":
             statistics["reaction_count"] = value
@@ -190,36 +210,93 @@ def get_post_statistics(reaction_element):
     return statistics
 
 
+def get_post_statistics(reaction_element):
+    labels = []
+    socials = reaction_element.find_elements(By.XPATH, ".//li")
+    for social in socials:
+        temp = social.get_attribute("aria-label")
+        if not temp:
+            temp = social.find_elements(By.XPATH, ".//button")
+            temp = temp[0].get_attribute("aria-label")
+        labels.append(temp)
+    return parse_post_statistics(labels)
+
+
+def get_linkedin_post_detail(article):
+    """Extracts id, body and statistics of a post by its html element. It is the
+    fallback of extraction.read_posts
+
+    Args:
+        article (WebElement): html element of the post
+
+    Returns:
+        tuple: id, body and statistics of the post
+    """
+    post_id = article.get_attribute("data-urn")
+    body = article.find_element(By.CLASS_NAME, "break-words").text
+    reaction = article.find_elements(
+        By.XPATH,
+        './/ul[contains(@class, "social-details-social-counts")]',
+    )[0]
+    return post_id, body, get_post_statistics(reaction)
+
+
+def get_linkedin_posts_detail(driver):
+    """Extracts id, body and statistics of posts of a page. All posts are read by
+    one script or parsed from the page source, posts that the script can not
+    read are extracted by helpers.
+
+    Args:
+        driver (Webdriver): webdriver browser
+
+    Returns:
+        list: (id, body, statistics) of posts
+    """
+    if parses_page_source():
+        posts = parsers.parse_posts(page_source(driver, "linkedin-posts"))
+    else:
+        posts = extraction.read_posts(driver)
+    if posts is None:
+        posts = [
+            {"element": element}
+            for element in driver.find_elements(By.CLASS_NAME, "feed-shared-update-v2")
+        ]
+    result = []
+    for post in posts:
+        try:
+            if post.get("body") is None or post.get("labels") is None:
+                if post["element"] is None:
+                    raise NoSuchElementException(f"post {post['id']} is incomplete")
+                result.append(get_linkedin_post_detail(post["element"]))
+            else:
+                statistics = parse_post_statistics(post["labels"])
+                result.append((post["id"], post["body"], statistics))
+        except (NoSuchElementException, IndexError):
+            logger.error(traceback.format_exc())
+    return result
+
+
 @shared_task(name="get_linkedin_posts")
-@only_one_concurrency(key="browser1", timeout=TASKS_TIMEOUT)
 def get_linkedin_posts(channel_id):
     channel_model = get_network_model("Channel")
     channel = channel_model.objects.get(pk=channel_id)
     channel_url = channel.username
-    driver = initialize_linkedin_driver()
-    driver.get(channel_url)
-    scroll(driver, 1)
-    time.sleep(5)
     try:
-        articles = driver.find_elements(By.CLASS_NAME, "feed-shared-update-v2")
-        for article in articles:
-            try:
-                post_id = article.get_attribute("data-urn")
-                body = article.find_element(By.CLASS_NAME, "break-words").text
-                reaction = article.find_elements(
-                    By.XPATH,
-                    './/ul[contains(@class, "social-details-social-counts")]',
-                )[0]
-                statistics = get_post_statistics(reaction)
+        with BROWSER_POOL.lease() as driver:
+            driver.get(channel_url)
+            wait_for(
+                driver,
+                elements_more_than((By.CLASS_NAME, "feed-shared-update-v2")),
+                message="posts of channel",
+            )
+            scroll(driver, 1)
+            for post_id, body, statistics in get_linkedin_posts_detail(driver):
                 store_posts.delay(channel_id, post_id, body, statistics)
-            except NoSuchElementException:
-                logger.error(traceback.format_exc())
-    except NoSuchElementException:
-        logger.error(traceback.format_exc())
-    finally:
-        driver_exit(driver)
-        channel.last_crawl = timezone.localtime()
-        channel.save()
+    except BrowserUnavailable as error:
+        logger.info("skipped crawling channel %s: %s", channel_id, error)
+        return
+    channel.last_crawl = timezone.localtime()
+    channel.save()
 
 
 def sort_by_recent(driver):
@@ -230,71 +307,166 @@ def sort_by_recent(driver):
     )
     if "recent" not in sort.text:
         sort.click()
-        time.sleep(5)
-        sort_button = driver.find_element(
-            "xpath",
-            "//button[@class='display-flex \
-                full-width artdeco-dropdown__trigger artdeco-dropdown__trigger--placement-bottom \
-                    ember-view']/following-sibling::div",
+        options = wait_for(
+            driver,
+            lambda driver: driver.find_element(
+                "xpath",
+                "//button[@class='display-flex full-width artdeco-dropdown__trigger "
+                "artdeco-dropdown__trigger--placement-bottom ember-view']"
+                "/following-sibling::div",
+            ).find_elements("tag name", "li")[1:],
+            message="sort options",
         )
-        sort_button = sort_button.find_elements("tag name", "li")[1]
-        sort_button.click()
-        time.sleep(5)
+        if options is None:
+            return driver
+        activities = driver.find_elements(By.XPATH, FEED_ACTIVITY)
+        options[0].click()
+        if activities:
+            # the feed is reloaded by the new sort
+            wait_for(driver, EC.staleness_of(activities[0]), message="sorted feed")
+        wait_for(driver, elements_more_than((By.XPATH, FEED_ACTIVITY)), message="feed")
     return driver
 
 
+def has_unseen_activities(driver):
+    """Whether the loaded feed has FEED_UNSEEN_ACTIVITIES activities that are not
+    sent before
+
+    Args:
+        driver (Webdriver): webdriver browser
+
+    Returns:
+        bool: True if enough activities are unseen
+    """
+    activity_ids = driver.execute_script(FEED_IDS_SCRIPT)
+    return len(ACTIVITY_CHECKER.unseen(activity_ids)) >= FEED_UNSEEN_ACTIVITIES
+
+
 @shared_task
 def get_linkedin_feed():
     config_model = get_network_model("Config")
     config = config_model.objects.last()
     if config is None or not config.crawl_linkedin_feed:
         return
-    driver = initialize_linkedin_driver()
-    driver.get(f"{LINKEDIN_URL}feed/")
-    WebDriverWait(driver, 30).until(
-        EC.presence_of_element_located((By.ID, "global-nav-search"))
-    )
-    driver = sort_by_recent(driver)
-    scroll(driver, 5)
-    time.sleep(5)
-    articles = driver.find_elements(
-        By.XPATH,
-        './/div[starts-with(@data-id, "urn:li:activity:")]',
-    )
-    for article in articles:
-        try:
-            driver.execute_script("arguments[0].scrollIntoView();", article)
-            time.sleep(2)
-            feed_id = article.get_attribute("data-id")
-            body = article.find_element(
-                By.CLASS_NAME, "feed-shared-update-v2__commentary"
-            ).text
-            if DUPLICATE_CHECKER.exists(feed_id):
-                continue
-            DUPLICATE_CHECKER.set(feed_id, "", ex=86400 * 30)
-            link = f"{LINKEDIN_URL}feed/update/{feed_id}/"
-            body = telegram_text_purify(body)
-            message = f"{body}\n\n{link}"
-            not_tasks.send_telegram_message(strip_tags(message))
-            time.sleep(3)
-        except NoSuchElementException:
-            logger.error(traceback.format_exc())
-    driver_exit(driver)
+    try:
+        with BROWSER_POOL.lease() as driver:
+            driver.get(f"{LINKEDIN_URL}feed/")
+            WebDriverWait(driver, 30).until(
+                EC.presence_of_element_located((By.ID, "global-nav-search"))
+            )
+            driver = sort_by_recent(driver)
+            scroll(driver, 5, enough=has_unseen_activities)
+            articles = driver.find_elements(By.XPATH, FEED_ACTIVITY)
+            activities = []
+            for article in articles:
+                try:
+                    driver.execute_script("arguments[0].scrollIntoView();", article)
+                    wait_for(
+                        driver,
+                        lambda _: article.find_elements(
+                            By.CLASS_NAME, "feed-shared-update-v2__commentary"
+                        ),
+                        message="activity commentary",
+                    )
+                    feed_id = article.get_attribute("data-id")
+                    body = article.find_element(
+                        By.CLASS_NAME, "feed-shared-update-v2__commentary"
+                    ).text
+                    activities.append((feed_id, body))
+                except NoSuchElementException:
+                    logger.error(traceback.format_exc())
+    except BrowserUnavailable as error:
+        logger.info("skipped crawling linkedin feed: %s", error)
+        return
+    unseen = set(ACTIVITY_CHECKER.claim([feed_id for feed_id, _ in activities]))
+    for feed_id, body in activities:
+        if feed_id not in unseen:
+            continue
+        unseen.discard(feed_id)
+        link = f"{LINKEDIN_URL}feed/update/{feed_id}/"
+        body = telegram_text_purify(body)
+        message = f"{body}\n\n{link}"
+        not_tasks.send_telegram_message(strip_tags(message))
 
 
 @shared_task
 def check_job_pages():
+    """Adds pages of enabled job searches to the crawl frontier and crawls it"""
     pages = lin_models.JobSearch.objects.filter(enable=True).order_by("-priority")
     for page in pages:
         now = timezone.localtime()
-        logger.info("%s start crawling linkedin page %s", now, page.name)
-        get_job_page_posts(page.pk)
+        logger.info("%s queue crawling linkedin page %s", now, page.name)
+        frontier.push_search(page)
+    dispatch_job_frontier()
+
+
+@shared_task
+def crawl_job_search(page_id: int, ignore_repetitive: bool = True):
+    """Adds pages of a job search to the crawl frontier and crawls it
+
+    Args:
+        page_id (int): the primary key of JobSearch obj.
+        ignore_repetitive (bool, optional): ignore repetitive jobs or not.
+    """
+    page = lin_models.JobSearch.objects.get(pk=page_id)
+    frontier.push_search(page, ignore_repetitive)
+    dispatch_job_frontier()
+
+
+@shared_task
+def dispatch_job_frontier():
+    """Starts a frontier worker for each browser session linkedin may open"""
+    _, capacity = BROWSER_POOL.get_capacity()
+    for _ in range(min(capacity, frontier.size())):
+        crawl_job_frontier.delay()
+
+
+@shared_task
+def crawl_job_frontier():
+    """Crawls pages of the frontier until it is empty. Workers share the frontier,
+    so pages are crawled in parallel as much as linkedin sessions are allowed.
+    When a page has only seen jobs, next pages of its search are dropped.
+    """
+    worker = frontier.join()
+    stopped = False
+    try:
+        while (unit := frontier.pop_unit()) is not None:
+            frontier.join(worker)
+            page_id, starting_job, ignore_repetitive = unit
+            page = lin_models.JobSearch.objects.filter(pk=page_id).first()
+            if page is None:
+                continue
+            try:
+                seen_only = crawl_job_page(page, ignore_repetitive, starting_job)
+            except BrowserUnavailable as error:
+                # other workers are crawling, the page waits for them
+                frontier.push_back(unit, page.priority)
+                logger.warning(f"{error}, frontier worker stops")
+                stopped = True
+                break
+            if seen_only:
+                dropped = frontier.drop_next_pages(
+                    page, starting_job, ignore_repetitive
+                )
+                logger.info(
+                    f"page {page_id} with starting-job {starting_job} had only seen "
+                    f"jobs, {dropped} next pages are dropped"
+                )
+    finally:
+        crawling = frontier.leave(worker)
+    if stopped and not crawling:
+        # no worker is left for the pushed back page
+        dispatch_job_frontier.apply_async(countdown=frontier.RETRY_DELAY)
 
 
 def remove_redis_keys():
-    redis_keys = DUPLICATE_CHECKER.keys("*")
-    counter = DUPLICATE_CHECKER.delete(*redis_keys)
-    return counter
+    """Forgets seen jobs and activities, so they are sent again. Keys of ids
+    from before namespaces are deleted too, like all keys of the db were.
+
+    Returns:
+        int: number of deleted keys
+    """
+    return JOB_CHECKER.clear() + ACTIVITY_CHECKER.clear() + clear_legacy_keys()
 
 
 def sort_by_most_recent(driver):
@@ -303,19 +475,31 @@ def sort_by_most_recent(driver):
         './/button[contains(@class, "search-reusables__filter-pill-button")]',
     )
     filter_button[len(filter_button) - 1].click()
-    time.sleep(2)
-    most_recent_input = driver.find_elements(
-        By.XPATH,
-        './/label[contains(@for, "advanced-filter-sortBy-DD")]',
+    most_recent_input = wait_for(
+        driver,
+        EC.element_to_be_clickable(
+            (By.XPATH, './/label[contains(@for, "advanced-filter-sortBy-DD")]')
+        ),
+        message="sort filter",
     )
-    most_recent_input[0].click()
-    time.sleep(2)
-    apply_button = driver.find_elements(
-        By.XPATH,
-        './/button[contains(@data-test-reusables-filters-modal-show-results-button, "true")]',
+    if most_recent_input is None:
+        return driver
+    most_recent_input.click()
+    apply_button = wait_for(
+        driver,
+        EC.element_to_be_clickable(
+            (
+                By.XPATH,
+                ".//button[contains("
+                '@data-test-reusables-filters-modal-show-results-button, "true")]',
+            )
+        ),
+        message="show results button",
     )
-    apply_button[0].click()
-    time.sleep(2)
+    if apply_button is None:
+        return driver
+    apply_button.click()
+    wait_for(driver, EC.invisibility_of_element(apply_button), message="results")
     return driver
 
 
@@ -333,19 +517,15 @@ def is_english(language):
     return True
 
 
-def check_eligible(keyword, job_detail):
-    return keyword.lower() not in job_detail.lower()
-
-
 def is_eligible(
-    ig_filters, just_easily_apply: bool, job_detail: dict
+    matcher, just_easily_apply: bool, job_detail: dict
 ) -> Tuple[bool, Optional[str]]:
     """Checks if job is eligible or not based on job_detail and ignoring filters
     Details are job's title, job's company, job's location
 
     Args:
         job_detail (dict): details of job like location, language
-        ig_filters (IgnoringFilter): defined filters for a JobSearch
+        matcher (JobMatcher): compiled ignoring filters of a JobSearch
 
     Returns:
         bool: True if is eligible otherwise is False
@@ -354,16 +534,9 @@ def is_eligible(
         return False, "easy_apply"
     if not is_english(job_detail["language"]):
         return False, "language"
-    for ig_filter in ig_filters:
-        detail, reason = "", ""
-        if ig_filter.place == lin_models.IgnoringFilter.TITLE:
-            detail, reason = job_detail["title"], "title"
-        elif ig_filter.place == lin_models.IgnoringFilter.COMPANY:
-            detail, reason = job_detail["company"], "company"
-        elif ig_filter.place == lin_models.IgnoringFilter.LOCATION:
-            detail, reason = job_detail["location"], "location"
-        if not check_eligible(ig_filter.keyword, detail):
-            return False, reason
+    reason = matcher.ignored_place(job_detail)
+    if reason is not None:
+        return False, reason
     return True, None
 
 
@@ -477,6 +650,20 @@ def get_job_description(driver):
         return "Cannot-extract-description"
 
 
+def parse_company_size(insights):
+    """Extract company size from insights of selected job
+
+    Args:
+        insights (list): texts of job insights
+
+    Returns:
+        str: job's company size
+    """
+    if len(insights) < 2:
+        return "N/A"
+    return insights[1].split("·")[0].replace("employees", "")
+
+
 def get_job_company_size(driver):
     """Extract selected job's company size
 
@@ -490,34 +677,23 @@ def get_job_company_size(driver):
         company_size_el = driver.find_elements(
             By.CLASS_NAME, "job-details-jobs-unified-top-card__job-insight"
         )
-        if not company_size_el:
-            return "N/A"
-        company_size = company_size_el[1].text
-        return company_size.split("·")[0].replace("employees", "")
+        return parse_company_size([element.text for element in company_size_el])
     except NoSuchElementException:
         return "N/A"
-    except IndexError:
-        return "N/A"
 
 
 def get_language(description):
-    try:
-        return detect(description)
-    except LangDetectException:
-        return "Cannot-detect-language"
+    return detect_language(description) or "Cannot-detect-language"
 
 
-def check_keywords(body, keywords):
+def check_keywords(body, matcher):
     result = ""
-    body = body.lower()
-    for keyword in keywords:
-        if keyword.lower() not in body:
-            continue
+    for keyword in matcher.found_keywords(body):
         result += f"\n{keyword}: ✅"
     return result
 
 
-def send_notification(message, data, keywords, output_channel_pk, cover_letter: str):
+def send_notification(message, data, matcher, output_channel_pk, cover_letter: str):
     """This function gets a message template and places the retrieved data into that.
     Then sends it to specified output channel
 
@@ -534,7 +710,7 @@ def send_notification(message, data, keywords, output_channel_pk, cover_letter:
         .replace("company", data["company"])
         .replace("size", data["company_size"])
         .replace("easy_apply", data["easy_apply"])
-        .replace("keywords", check_keywords(data["description"], keywords))
+        .replace("keywords", check_keywords(data["description"], matcher))
     )
     message += f"\n\n\n{cover_letter}"
     not_tasks.send_message_to_telegram_channel(
@@ -543,30 +719,79 @@ def send_notification(message, data, keywords, output_channel_pk, cover_letter:
     )
 
 
-def get_job_detail(driver, element) -> dict:
+def card_value(card, key, extract, element):
+    """Returns a field of a card read by extraction script, falls back to its
+    helper when the script could not read it
+    """
+    value = card.get(key)
+    return extract(element) if value is None else value
+
+
+def get_job_detail(driver, element, card=None) -> dict:
     """This function gets browser driver and job html content and returns some
     information like job-link, job-desc and job-language.
 
     Args:
         driver (Webdriver): browser webdriver
         element (HTMLElement): html element of job
+        card (dict, optional): fields of the job card read by extraction script
 
     Returns:
         result (dict): consist of information about job: link, description, language, title,
             location, company
     """
+    card = card or {}
     result = {}
-    result["url"] = get_job_url(element)
-    result["easy_apply"] = check_easy_apply(element)
-    result["description"] = get_job_description(driver)
-    result["company_size"] = get_job_company_size(driver)
+    if card.get("url") is not None:
+        result["url"] = card["url"].split("?")[0]  # remove query params
+    else:
+        result["url"] = get_job_url(element)
+    if card.get("easy_apply") is not None:
+        result["easy_apply"] = "✅" if card["easy_apply"] else "❌"
+    else:
+        result["easy_apply"] = check_easy_apply(element)
+    if parses_page_source():
+        details = parsers.parse_job_details(page_source(driver, "linkedin-job"))
+    else:
+        details = extraction.read_job_details(driver)
+    if details is not None and details["description"] is not None:
+        result["description"] = details["description"]
+        result["company_size"] = parse_company_size(details["insights"])
+    else:
+        result["description"] = get_job_description(driver)
+        result["company_size"] = get_job_company_size(driver)
     result["language"] = get_language(result["description"])
-    result["title"] = telegram_text_purify(get_job_title(element))
-    result["location"] = telegram_text_purify(get_job_location(element))
-    result["company"] = telegram_text_purify(get_job_company(element))
+    result["title"] = telegram_text_purify(
+        card_value(card, "title", get_job_title, element)
+    )
+    location = card_value(card, "location", get_job_location, element)
+    result["location"] = telegram_text_purify(location.replace("\n", " | "))
+    result["company"] = telegram_text_purify(
+        card_value(card, "company", get_job_company, element)
+    )
     return result
 
 
+def get_job_cards(driver):
+    """Reads all job cards of a search page by one extraction script or parses
+    them from the page source. If the script fails, cards only have their element
+    and are read by helpers. Parsed cards have no element.
+
+    Args:
+        driver (Webdriver): browser webdriver
+
+    Returns:
+        list: dicts of fields of job cards, see extraction.read_job_cards
+    """
+    if parses_page_source():
+        return parsers.parse_job_cards(page_source(driver, "linkedin-jobs"))
+    cards = extraction.read_job_cards(driver)
+    if cards is None:
+        items = driver.find_elements(By.CLASS_NAME, "scaffold-layout__list-item")
+        cards = [{"element": item} for item in items]
+    return cards
+
+
 def get_card_id(element) -> str:
     """Tries to extract card id from element.
 
@@ -585,22 +810,6 @@ def get_card_id(element) -> str:
         return "Cannot-extract-card-id"
 
 
-@shared_task
-def check_page_count(page_id: int, ignore_repetitive: bool, starting_job: int):
-    """Check if we should crawl next page or not.
-
-    Args:
-        page_id (int): the primary key of JobSearch obj.
-        ignore_repetitive (bool): ignore repetitive jobs or not.
-        starting_job (int): the starting job of current page.
-    """
-    page = lin_models.JobSearch.objects.get(pk=page_id)
-    if page.page_count == 1:
-        return
-    if starting_job != ((page.page_count - 1) * 25):
-        get_job_page_posts.delay(page_id, ignore_repetitive, starting_job + 25)
-
-
 @shared_task
 def update_job_search_last_crawl_at(page_id: int, counter: int):
     """Update last_crawl_at field of JobSearch object.
@@ -613,40 +822,42 @@ def update_job_search_last_crawl_at(page_id: int, counter: int):
     """
     # Simply update with the most recent crawl count
     lin_models.JobSearch.objects.filter(pk=page_id).update(
-        last_crawl_at=timezone.localtime(),
-        last_crawl_count=counter
+        last_crawl_at=timezone.localtime(), last_crawl_count=counter
     )
 
 
-@shared_task
-def get_job_page_posts(
-    page_id: int, ignore_repetitive: bool = True, starting_job: int = 0
-):
-    """
-    This function gets a page id and crawl its jobs.
+def crawl_job_page(page, ignore_repetitive: bool, starting_job: int):
+    """Crawls jobs of a result page of a job search
+
+    Args:
+        page (JobSearch): the job search
+        ignore_repetitive (bool): ignore repetitive jobs or not.
+        starting_job (int): offset of the result page
+
+    Raises:
+        BrowserUnavailable: no browser session was free in time
+
+    Returns:
+        bool: True if the page had jobs and all of them were seen before
     """
-    page = lin_models.JobSearch.objects.get(pk=page_id)
-    (
-        message,
-        url,
-        output_channel,
-        keywords,
-        ig_filters,
-        just_easily_apply,
-    ) = page.page_data
+    page_id = page.pk
+    message, url, output_channel, matcher, just_easily_apply = page.page_data
     try:
-        with initialize_linkedin_driver() as driver:
+        with BROWSER_POOL.lease() as driver:
             prepare_driver(driver, url, starting_job)
-            time.sleep(5)
-            items = driver.find_elements(By.CLASS_NAME, "scaffold-layout__list-item")
-            counter = process_items(
+            wait_for(
                 driver,
-                items,
+                elements_more_than((By.CLASS_NAME, "scaffold-layout__list-item")),
+                message="job cards",
+            )
+            cards = get_job_cards(driver)
+            counter, seen_only = process_items(
+                driver,
+                cards,
                 ignore_repetitive,
                 message,
-                keywords,
+                matcher,
                 output_channel,
-                ig_filters,
                 just_easily_apply,
                 page.profile.about_me,
             )
@@ -654,13 +865,16 @@ def get_job_page_posts(
             f"found {counter} jobs in page: {page_id} with starting-job: {starting_job}"
         )
         update_job_search_last_crawl_at.delay(page_id, counter)
-        check_page_count.delay(page_id, ignore_repetitive, starting_job)
+        return seen_only and ignore_repetitive
+    except BrowserUnavailable:
+        raise
     except Exception as error:
-        msg = f"Error in get_job_page_posts: {error}"
+        msg = f"Error in crawl_job_page: {error}"
         msg += f"\npage_id: {page_id}, starting_job: {starting_job}"
         msg += f"\nignore_repetitive: {ignore_repetitive}"
         msg = f"\n{traceback.format_exc()}"
         logger.error(msg)
+        return False
 
 
 def prepare_driver(driver, url, starting_job):
@@ -673,26 +887,34 @@ def prepare_driver(driver, url, starting_job):
 
 def process_items(
     driver,
-    items,
+    cards,
     ignore_repetitive,
     message,
-    keywords,
+    matcher,
     output_channel,
-    ig_filters,
     just_easily_apply: bool,
     about_profile: str,
 ):
+    """Sends eligible jobs of cards of a page
+
+    Returns:
+        tuple: number of sent jobs and whether all cards were seen before
+    """
     counter = 0
-    for item in items:
+    card_ids = [card["id"] for card in cards if card.get("id")]
+    # ids of cards read from the page are checked and leased at once
+    claimed = set(JOB_CHECKER.lease(card_ids))
+    seen_only = bool(cards) and not claimed and all(card.get("id") for card in cards)
+    for index, card in enumerate(cards):
         try:
             job_id = process_job_item(
                 driver,
-                item,
+                card,
+                claimed,
                 ignore_repetitive,
                 message,
-                keywords,
+                matcher,
                 output_channel,
-                ig_filters,
                 just_easily_apply,
                 about_profile,
             )
@@ -700,50 +922,82 @@ def process_items(
                 counter += 1
         except StaleElementReferenceException:
             logger.warning("Stale element reference exception")
+            # the rest of cards are not processed, they are crawled again later
+            JOB_CHECKER.release(
+                [card["id"] for card in cards[index:] if card.get("id") in claimed]
+            )
             break
         except NoSuchElementException:
             logger.error("No such element exception", exc_info=True)
         except Exception:
             logger.error("Unhandled exception in process_items", exc_info=True)
-    return counter
+        if card.get("id") in claimed:
+            JOB_CHECKER.finish([card["id"]])
+    return counter, seen_only
 
 
 def process_job_item(
     driver,
-    item,
+    card,
+    claimed,
     ignore_repetitive,
     message,
-    keywords,
+    matcher,
     output_channel,
-    ig_filters,
     just_easily_apply: bool,
     about_profile: str,
 ):
+    if ignore_repetitive and card.get("id") and card["id"] not in claimed:
+        return None
+    item = card["element"]
+    if item is None:
+        if not card["id"]:
+            return None
+        item = driver.find_element(
+            By.CSS_SELECTOR, f'[data-occludable-job-id="{card["id"]}"]'
+        )
     driver.execute_script("arguments[0].scrollIntoView();", item)
-    job_id = item.get_attribute("data-occludable-job-id")
+    if "id" in card:
+        job_id = card["id"]
+    else:
+        job_id = item.get_attribute("data-occludable-job-id")
     logger.info(f"Processing job_id: {job_id}")
 
-    if not job_id or (ignore_repetitive and DUPLICATE_CHECKER.exists(job_id)):
+    if not job_id:
         return None
-    DUPLICATE_CHECKER.set(job_id, "", ex=86400 * 30)
-
+    if "id" not in card:
+        # cards that the script could not read are claimed one by one
+        is_new = bool(JOB_CHECKER.claim([job_id]))
+        if ignore_repetitive and not is_new:
+            return None
+
+    driver.execute_script(MARK_JOB_DETAILS_SCRIPT, job_id)
+    PACER.pace("click")
     item.click()
-    time.sleep(2)
-    # WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.CLASS_NAME, "job-detail")))
-    job_detail = get_job_detail(driver, item)
+    wait_for(
+        driver,
+        script_returns(JOB_DETAILS_LOADED_SCRIPT, job_id),
+        message=f"details of job {job_id}",
+    )
+    if "title" in card and not extraction.is_rendered(card):
+        # it was rendered when it was scrolled into view
+        if parses_page_source():
+            card = parsers.parse_job_card(item.get_attribute("outerHTML"))
+        else:
+            card = extraction.read_job_card(driver, item) or {}
+    job_detail = get_job_detail(driver, item, card)
 
     # cover_letter = get_cover_letter(about_profile, job_detail["description"])
     # logger.info(f"cover_letter: {cover_letter}")
     cover_letter = ""
 
-    eligible, reason = is_eligible(ig_filters, just_easily_apply, job_detail)
+    eligible, reason = is_eligible(matcher, just_easily_apply, job_detail)
     if not eligible:
         logger.info(f"Job is not eligible, reason: {reason}")
         store_ignored_content.delay(job_detail, reason)
         return None
 
-    time.sleep(2)  # Delay between sending each message
-    send_notification(message, job_detail, keywords, output_channel, cover_letter)
+    send_notification(message, job_detail, matcher, output_channel, cover_letter)
     return job_id
 
 
@@ -758,7 +1012,7 @@ def update_expression_search_last_crawl_at(page_id):
 def get_expression_search_posts(page_id, ignore_repetitive=True):
     try:
         page = lin_models.ExpressionSearch.objects.get(pk=page_id)
-        with initialize_linkedin_driver() as driver:
+        with BROWSER_POOL.lease() as driver:
             driver.get(page.url)
             wait = WebDriverWait(driver, 10)
 
@@ -794,14 +1048,13 @@ def process_articles(driver, articles, ignore_repetitive, page):
 def process_article(driver, article, ignore_repetitive, page):
     driver.execute_script("arguments[0].scrollIntoView();", article)
     post_id = get_card_id(article)
-    if not post_id or (ignore_repetitive and DUPLICATE_CHECKER.exists(post_id)):
+    is_new = bool(post_id) and bool(ACTIVITY_CHECKER.claim([post_id]))
+    if not post_id or (ignore_repetitive and not is_new):
         logger.info(f"id is none or duplicate, id: {post_id}")
         return
-    DUPLICATE_CHECKER.set(post_id, "", ex=86400 * 30)
     body = extract_body(article)
     link = f"https://www.linkedin.com/feed/update/{post_id}/"
     message = f"{telegram_text_purify(body)}\n\n{link}"
-    time.sleep(2)  # Delay between sending each message
     not_tasks.send_message_to_telegram_channel(
         strip_tags(message), page.output_channel.pk
     )
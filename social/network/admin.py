@@ -6,8 +6,13 @@ from reusable.admins import ReadOnlyAdminDateFieldsMIXIN
 
 from twitter import tasks as twi_tasks
 from linkedin import tasks as lin_tasks
+from telegram import tasks as tel_tasks
 from . import models
 
+# the crawl action fetches messages of telegram channels of the last
+# CRAWL_BACKFILL_DAYS days
+CRAWL_BACKFILL_DAYS = 30
+
 
 @admin.register(models.Network)
 class NetworkAdmin(ReadOnlyAdminDateFieldsMIXIN, admin.ModelAdmin):
@@ -50,6 +55,8 @@ class ChannelAdmin(ReadOnlyAdminDateFieldsMIXIN, admin.ModelAdmin):
                 twi_tasks.get_twitter_posts.delay(channel.pk)
             elif channel.network.name == "Linkedin":
                 lin_tasks.get_linkedin_posts.delay(channel.pk)
+            elif channel.network.name == "Telegram":
+                tel_tasks.backfill_telegram.delay([channel.pk], CRAWL_BACKFILL_DAYS)
 
     actions = (crawl,)
 
@@ -124,13 +131,23 @@ class ConfigAdmin(ReadOnlyAdminDateFieldsMIXIN, admin.ModelAdmin):
 
 @admin.register(models.ChannelListExport)
 class ChannelListExportAdmin(ReadOnlyAdminDateFieldsMIXIN, admin.ModelAdmin):
-    list_display = ("pk", "file", "created_at")
+    list_display = ("pk", "format", "file", "created_at")
+
+
+@admin.register(models.PostExport)
+class PostExportAdmin(ReadOnlyAdminDateFieldsMIXIN, admin.ModelAdmin):
+    list_display = ("pk", "format", "filters", "file", "created_at")
 
 
 @admin.register(models.IgnoredKeyword)
 class IgnoredKeywordAdmin(ReadOnlyAdminDateFieldsMIXIN, admin.ModelAdmin):
     list_display = ("pk", "keyword", "created_at")
 
+    def delete_queryset(self, request, queryset):
+        # delete one by one so that keywords are un-ignored
+        for ignored_keyword in queryset:
+            ignored_keyword.delete()
+
 
 @admin.register(models.BlockedKeyword)
 class BlockedKeywordAdmin(ReadOnlyAdminDateFieldsMIXIN, admin.ModelAdmin):
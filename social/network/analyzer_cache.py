@@ -0,0 +1,152 @@
+import json
+import time
+import hashlib
+import logging
+from collections import Counter
+
+import redis
+
+from reusable.cache import LocalCache, normalize
+
+logger = logging.getLogger(__name__)
+
+# same db as enrichment queue, db 5 and db 15 are flushed by other jobs
+REDIS_CLIENT = redis.Redis(host="social_redis", port=6379, db=6)
+KEY_PREFIX = "analyzer_cache"
+INDEX_KEY = f"{KEY_PREFIX}:index"
+STATS_KEY = f"{KEY_PREFIX}:stats"
+CACHE_TTL = 7 * 24 * 3600
+MAX_ENTRIES = 500_000
+LOCAL_SIZE = 2048
+COUNTERS = ("local_hits", "redis_hits", "misses")
+
+
+def cache_key(analyzer, language, text):
+    """Key of an analyzer result. Texts that differ only in whitespaces share a key.
+
+    Args:
+        analyzer (str): name of the analyzer
+        language (str): language of the endpoint, None for all languages
+        text (str): analyzed text
+
+    Returns:
+        str: the key
+    """
+    digest = hashlib.sha1(normalize(text).encode()).hexdigest()
+    return f"{KEY_PREFIX}:{analyzer}:{language or 'all'}:{digest}"
+
+
+def analyzer_of(key):
+    return key.split(":")[1]
+
+
+class AnalyzerCache:
+    """Cache of analyzer results in redis with an in-process LRU in front.
+    Redis entries expire after ttl and the oldest ones are evicted when there are
+    more than max_entries. Redis errors are logged and treated as misses.
+    """
+
+    def __init__(self, client=REDIS_CLIENT, ttl=CACHE_TTL, max_entries=MAX_ENTRIES):
+        self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.local = LocalCache(size=LOCAL_SIZE, ttl=ttl)
+
+    def get_many(self, keys):
+        """Looks keys up in the local cache and then in redis
+
+        Args:
+            keys (list): cache keys
+
+        Returns:
+            dict: key -> cached result of found keys
+        """
+        found, counters, remote_keys = {}, Counter(), []
+        for key in keys:
+            value = self.local.get(key)
+            if value is None:
+                remote_keys.append(key)
+            else:
+                found[key] = value
+                counters[(analyzer_of(key), "local_hits")] += 1
+        if remote_keys:
+            try:
+                values = self.client.mget(remote_keys)
+            except redis.RedisError as error:
+                logger.warning("analyzer cache get failed: %s", error)
+                values = [None] * len(remote_keys)
+            for key, value in zip(remote_keys, values):
+                if value is None:
+                    counters[(analyzer_of(key), "misses")] += 1
+                    continue
+                found[key] = json.loads(value)
+                self.local.set(key, found[key])
+                counters[(analyzer_of(key), "redis_hits")] += 1
+        self.count(counters)
+        return found
+
+    def set_many(self, results):
+        """Stores analyzer results
+
+        Args:
+            results (dict): key -> result of the analyzer
+        """
+        if not results:
+            return
+        now = time.time()
+        for key, value in results.items():
+            self.local.set(key, value)
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for key, value in results.items():
+                pipe.set(key, json.dumps(value), ex=self.ttl)
+                pipe.zadd(INDEX_KEY, {key: now})
+            pipe.zremrangebyscore(INDEX_KEY, 0, now - self.ttl)
+            pipe.zcard(INDEX_KEY)
+            size = pipe.execute()[-1]
+            if size > self.max_entries:
+                evicted = [
+                    key
+                    for key, _ in self.client.zpopmin(
+                        INDEX_KEY, size - self.max_entries
+                    )
+                ]
+                self.client.delete(*evicted)
+        except redis.RedisError as error:
+            logger.warning("analyzer cache set failed: %s", error)
+
+    def count(self, counters):
+        """Adds lookups to hit/miss counters of analyzers
+
+        Args:
+            counters (Counter): (analyzer, counter name) -> value
+        """
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for (analyzer, name), value in counters.items():
+                pipe.hincrby(STATS_KEY, f"{analyzer}:{name}", value)
+            pipe.execute()
+        except redis.RedisError as error:
+            logger.warning("analyzer cache stats failed: %s", error)
+
+    def stats(self):
+        """Returns hit/miss counters of analyzers since the last reset
+
+        Returns:
+            dict: analyzer -> counters and hit ratio, plus number of entries
+        """
+        stats = {}
+        for field, value in self.client.hgetall(STATS_KEY).items():
+            analyzer, name = field.decode().split(":")
+            stats.setdefault(analyzer, dict.fromkeys(COUNTERS, 0))[name] = int(value)
+        for counters in stats.values():
+            lookups = sum(counters[name] for name in COUNTERS)
+            hits = counters["local_hits"] + counters["redis_hits"]
+            counters["hit_ratio"] = round(hits / lookups, 4) if lookups else 0
+        return {"analyzers": stats, "entries": self.client.zcard(INDEX_KEY)}
+
+    def reset_stats(self):
+        self.client.delete(STATS_KEY)
+
+
+ANALYZER_CACHE = AnalyzerCache()
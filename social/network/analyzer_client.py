@@ -0,0 +1,209 @@
+import os
+import time
+import asyncio
+import logging
+import weakref
+import threading
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+ANALYZER_TIMEOUT = 5
+# concurrent requests to each analyzer host from a process
+MAX_CONCURRENCY = 8
+KEEPALIVE_CONNECTIONS = 8
+# consecutive failures that open the circuit of a host and seconds it stays open
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30
+
+
+class AnalyzerError(Exception):
+    """An analyzer call failed"""
+
+
+class CircuitOpenError(AnalyzerError):
+    """An analyzer host is considered down, so it is not called"""
+
+    def __init__(self, host, retry_after):
+        super().__init__(f"circuit of {host} is open for {retry_after:.0f}s")
+        self.host = host
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Stops calling a host after consecutive failures. After reset_timeout one
+    trial call is let through, its success closes the circuit again.
+    """
+
+    def __init__(self, threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    def retry_after(self):
+        if self.opened_at is None:
+            return 0
+        return max(self.opened_at + self.reset_timeout - time.monotonic(), 0)
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.trial or self.retry_after() > 0:
+                return False
+            self.trial = True
+            return True
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.threshold:
+                if self.opened_at is None or self.trial:
+                    logger.warning(
+                        "analyzer circuit opened after %s failures", self.failures
+                    )
+                self.opened_at = time.monotonic()
+                self.trial = False
+
+
+# per process state, celery workers fork after this module is imported
+_STATE = {"pid": None}
+
+
+def get_state():
+    if _STATE["pid"] != os.getpid():
+        _STATE.update(
+            pid=os.getpid(),
+            breakers={},
+            loops=weakref.WeakKeyDictionary(),
+            local=threading.local(),
+            lock=threading.Lock(),
+        )
+    return _STATE
+
+
+def get_limits():
+    return httpx.Limits(
+        max_connections=None, max_keepalive_connections=KEEPALIVE_CONNECTIONS
+    )
+
+
+def get_breaker(host):
+    """Returns circuit breaker of an analyzer host, shared by all event loops"""
+    state = get_state()
+    with state["lock"]:
+        if host not in state["breakers"]:
+            state["breakers"][host] = CircuitBreaker()
+    return state["breakers"][host]
+
+
+def get_loop():
+    """Returns the event loop that post_many runs calls on in this thread. It
+    lives as long as the process, so its client keeps connections alive.
+    """
+    local = get_state()["local"]
+    if getattr(local, "loop", None) is None:
+        local.loop = asyncio.new_event_loop()
+    return local.loop
+
+
+def get_loop_state():
+    """Returns client and host semaphores of the running event loop, a client
+    and its connections are bound to the loop that created them
+    """
+    loops = get_state()["loops"]
+    loop = asyncio.get_running_loop()
+    if loop not in loops:
+        loops[loop] = {
+            "client": httpx.AsyncClient(timeout=ANALYZER_TIMEOUT, limits=get_limits()),
+            "semaphores": {},
+        }
+    return loops[loop]
+
+
+def check_circuit(host, breaker):
+    if not breaker.allow():
+        raise CircuitOpenError(host, breaker.retry_after())
+
+
+def record_transport_error(breaker, error):
+    breaker.failure()
+    return AnalyzerError(str(error))
+
+
+def parse_response(breaker, response):
+    """Updates the breaker of the host by a response and decodes its body.
+    Server errors count as failures of the host like connection errors.
+
+    Args:
+        breaker (CircuitBreaker): breaker of the host
+        response (httpx.Response): response of the analyzer
+
+    Returns:
+        any: decoded json body
+    """
+    if response.status_code >= 500:
+        breaker.failure()
+    else:
+        breaker.success()
+    try:
+        response.raise_for_status()
+        return response.json()
+    except (httpx.HTTPStatusError, ValueError) as error:
+        raise AnalyzerError(str(error)) from error
+
+
+async def post_many_async(calls):
+    """Posts many requests concurrently with at most MAX_CONCURRENCY in flight
+    to each host, over the keep-alive client of the running event loop
+
+    Args:
+        calls (list): (endpoint, data) pairs
+
+    Returns:
+        list: decoded responses or AnalyzerError of failed calls, in order of calls
+    """
+    loop_state = get_loop_state()
+    client, semaphores = loop_state["client"], loop_state["semaphores"]
+
+    async def call(endpoint, data):
+        host = urlsplit(endpoint).netloc
+        breaker = get_breaker(host)
+        semaphore = semaphores.setdefault(host, asyncio.Semaphore(MAX_CONCURRENCY))
+        async with semaphore:
+            check_circuit(host, breaker)
+            try:
+                response = await client.post(endpoint, data=data)
+            except httpx.TransportError as error:
+                raise record_transport_error(breaker, error) from error
+        return parse_response(breaker, response)
+
+    return await asyncio.gather(
+        *(call(endpoint, data) for endpoint, data in calls),
+        return_exceptions=True,
+    )
+
+
+def post_many(calls):
+    """Sync entry point of post_many_async for batch callers
+
+    Args:
+        calls (list): (endpoint, data) pairs
+
+    Returns:
+        list: decoded responses or AnalyzerError of failed calls, in order of calls
+    """
+    if not calls:
+        return []
+    return get_loop().run_until_complete(post_many_async(calls))
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models import TextField
 
 
 class NetworkConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "network"
+
+    def ready(self):
+        from network.lookups import ILike
+        from network import signals  # noqa: F401
+
+        TextField.register_lookup(ILike)
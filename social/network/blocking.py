@@ -0,0 +1,123 @@
+import logging
+
+from django.db import connection, transaction
+from django.db.models import Count
+
+from reusable.models import get_network_model
+from network import rollups
+from network.lookups import NormalizedKeyword
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+
+
+def normalize_keywords(keywords):
+    """Lower cases keywords and trims and collapses their whitespaces by the
+    database, the same NormalizedKeyword expression that stored keywords are
+    indexed by. Keywords are blocked when their normalized forms are equal.
+
+    Args:
+        keywords (iterable): keywords
+
+    Returns:
+        dict: keyword -> normalized keyword
+    """
+    keywords = list(set(keywords))
+    if not keywords:
+        return {}
+    normalized = NormalizedKeyword.template % {"expressions": "column1"}
+    values = ", ".join(["(%s)"] * len(keywords))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT column1, {normalized} FROM (VALUES {values}) AS keywords",
+            keywords,
+        )
+        return dict(cursor.fetchall())
+
+
+def get_blocked_keywords():
+    """Returns normalized forms of all blocked keywords
+
+    Returns:
+        set: normalized blocked keywords
+    """
+    return set(
+        get_network_model("BlockedKeyword")
+        .objects.annotate(normalized=NormalizedKeyword("keyword"))
+        .values_list("normalized", flat=True)
+    )
+
+
+def find_blocked(keywords):
+    """Returns keywords that match a blocked keyword after normalization
+
+    Args:
+        keywords (iterable): keywords, e.g. new keywords of posts
+
+    Returns:
+        set: the blocked keywords in their given form
+    """
+    blocked_keywords = get_blocked_keywords()
+    if not blocked_keywords:
+        return set()
+    return {
+        keyword
+        for keyword, normalized in normalize_keywords(keywords).items()
+        if normalized in blocked_keywords
+    }
+
+
+def matching(model, keywords):
+    return model.objects.alias(normalized=NormalizedKeyword("keyword")).filter(
+        normalized__in=set(normalize_keywords(keywords).values())
+    )
+
+
+def purge_keywords(keywords, dry_run=False, batch_size=BATCH_SIZE, progress=None):
+    """Deletes stored keywords that match blocked keywords after normalization
+    and removes them from keyword rollups. Keywords are deleted in batches of
+    batch_size rows, each batch in its own transaction.
+
+    Args:
+        keywords (iterable): blocked keywords
+        dry_run (bool, optional): only count matching keywords. Defaults to False.
+        batch_size (int, optional): rows deleted per batch. Defaults to BATCH_SIZE.
+        progress (callable, optional): called with number of deleted rows so far
+        and total number of matching rows after each batch. Defaults to None.
+
+    Returns:
+        dict: stored form of keyword -> number of matching keyword rows
+    """
+    keyword_model = get_network_model("Keyword")
+    rollup_model = get_network_model("KeywordBucketCount")
+    keywords = list(keywords)
+    if not keywords:
+        return {}
+    queryset = matching(keyword_model, keywords)
+    counts = dict(
+        queryset.values_list("keyword").annotate(count=Count("id")).order_by()
+    )
+    total = sum(counts.values())
+    logger.info("%s keywords match %s blocked keywords", total, len(keywords))
+    if dry_run:
+        return counts
+
+    # rollup rows may outlive keywords deleted by an interrupted purge
+    variants = set(counts) | set(
+        matching(rollup_model, keywords).values_list("keyword", flat=True).distinct()
+    )
+    for variant in sorted(variants):
+        rollups.remove_keyword_from_rollups(variant)
+
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.values_list("id", flat=True)[:batch_size])
+            if not ids:
+                break
+            deleted += keyword_model.objects.filter(id__in=ids).delete()[0]
+        logger.info("deleted %s of %s blocked keywords", deleted, total)
+        if progress is not None:
+            progress(deleted, total)
+    return counts
@@ -0,0 +1,256 @@
+import logging
+
+import redis
+from django.db import transaction
+from django.utils import timezone
+
+from reusable.models import get_network_model
+from network import rollups, analyzer_cache, analyzer_client, blocking
+from network.analyzer_cache import ANALYZER_CACHE
+
+logger = logging.getLogger(__name__)
+
+# db 5 is flushed by linkedin duplicate checker and db 15 by views cache
+REDIS_CLIENT = redis.Redis(host="social_redis", port=6379, db=6)
+PENDING_KEY = "enrichment:pending"
+SCHEDULED_KEY = "enrichment:scheduled"
+# a batch is dispatched when it has BATCH_SIZE posts or BATCH_WAIT seconds passed
+BATCH_SIZE = 50
+BATCH_WAIT = 5
+MAX_ATTEMPTS = 10
+RETRY_DELAY = 60
+
+KEYWORDS = "keywords"
+NER = "ner"
+SENTIMENT = "sentiment"
+CATEGORIES = "categories"
+ANALYZERS = (KEYWORDS, NER, SENTIMENT, CATEGORIES)
+# analyzer -> language -> endpoint, None language is used for all languages
+ENDPOINTS = {
+    KEYWORDS: {
+        "persian": "http://persian_analyzer_api/v1/app/keyword/",
+        "english": "http://analyzer_api/api/v1/keyword/",
+    },
+    NER: {
+        "persian": "http://persian_analyzer_api/v1/app/ner/",
+        "english": "http://analyzer_api/api/v1/ner/",
+    },
+    SENTIMENT: {None: "http://persian_analyzer_api/v1/app/sentiment/"},
+    CATEGORIES: {None: "http://persian_analyzer_api/v1/app/classification/"},
+}
+NER_KEY_MAPPING = {
+    "date": "تاریخ",
+    "time": "زمان",
+    "event": "رویداد",
+    "money": "مالی",
+    "person": "شخص",
+    "percent": "درصد",
+    "product": "محصول",
+    "facility": "تسهیلات",
+    "location": "مکان",
+    "organization": "سازمان",
+    "FAC": "سازه",
+    "ORG": "سازمان",
+    "GPE": "مکان",
+    "LOC": "مکان",
+    "EVENT": "رویداد",
+    "MONEY": "مالی",
+}
+
+
+def push_pending(post_ids):
+    """Adds posts to the pending enrichment queue
+
+    Args:
+        post_ids (list): ids of new posts
+
+    Returns:
+        tuple: whether a full batch is pending and whether a delayed flush
+        should be scheduled
+    """
+    length = REDIS_CLIENT.rpush(PENDING_KEY, *post_ids)
+    batch_full = length // BATCH_SIZE > (length - len(post_ids)) // BATCH_SIZE
+    schedule = not batch_full and bool(
+        REDIS_CLIENT.set(SCHEDULED_KEY, 1, nx=True, ex=BATCH_WAIT)
+    )
+    return batch_full, schedule
+
+
+def pop_pending():
+    """Pops a batch of pending posts
+
+    Returns:
+        list: ids of at most BATCH_SIZE posts
+    """
+    return [
+        int(post_id) for post_id in REDIS_CLIENT.lpop(PENDING_KEY, BATCH_SIZE) or []
+    ]
+
+
+def restore_pending(post_ids):
+    """Puts popped posts back to the front of the pending queue, e.g. their
+    batch was not dispatched
+
+    Args:
+        post_ids (list): ids of the popped posts
+    """
+    REDIS_CLIENT.lpush(PENDING_KEY, *reversed(post_ids))
+
+
+def get_endpoint(analyzer, language):
+    endpoints = ENDPOINTS[analyzer]
+    return endpoints.get(None) or endpoints.get(language)
+
+
+def analyze_posts(posts, analyzers):
+    """Calls analyzers for posts concurrently through the analyzer client.
+    Results are looked up in the analyzer cache first and posts with the same text
+    are analyzed once. No database row is locked here.
+
+    Args:
+        posts (list): Post objects with their channels
+        analyzers (list): names of analyzers
+
+    Returns:
+        tuple: results that map (post id, analyzer) to response and
+        analyzer -> ids of posts that their call failed
+    """
+    calls, texts = {}, {}
+    for post in posts:
+        for analyzer in analyzers:
+            endpoint = get_endpoint(analyzer, post.channel.language)
+            if endpoint is None:
+                logger.warning("no %s analyzer for post %s", analyzer, post.pk)
+                continue
+            language = None if None in ENDPOINTS[analyzer] else post.channel.language
+            key = analyzer_cache.cache_key(analyzer, language, post.body)
+            calls[(post.pk, analyzer)] = key
+            texts[key] = (endpoint, post.body)
+
+    responses = ANALYZER_CACHE.get_many(list(texts))
+    missing = [key for key in texts if key not in responses]
+    fetched = {}
+    for key, result in zip(
+        missing,
+        analyzer_client.post_many(
+            [(texts[key][0], {"text": texts[key][1]}) for key in missing]
+        ),
+    ):
+        if isinstance(result, analyzer_client.AnalyzerError):
+            logger.warning("%s failed: %s", key, result)
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            fetched[key] = result
+    ANALYZER_CACHE.set_many(fetched)
+    responses.update(fetched)
+
+    results, failed = {}, {}
+    for (post_id, analyzer), key in calls.items():
+        if key in responses:
+            results[(post_id, analyzer)] = responses[key]
+        else:
+            failed.setdefault(analyzer, []).append(post_id)
+    return results, failed
+
+
+def keyword_words(resp):
+    # responses are shared through the analyzer cache, so they are not modified
+    return resp["keywords"] + resp.get("keyphrases", [])
+
+
+def build_keywords(post, resp, ignored_keywords, blocked_keywords):
+    """Builds keyword objects of a post. Blocked keywords (see
+    blocking.find_blocked) are dropped and ignored keywords are saved with
+    ignored flag.
+    """
+    keyword_model = get_network_model("Keyword")
+    return [
+        keyword_model(post=post, keyword=keyword, ignored=keyword in ignored_keywords)
+        for keyword in keyword_words(resp)
+        if keyword not in blocked_keywords
+    ]
+
+
+def build_ner(resp):
+    temp = {}
+    for key, title in NER_KEY_MAPPING.items():
+        if key in resp:
+            temp[title] = list(set(resp[key]))
+    return temp
+
+
+def save_results(post_ids, results):
+    """Writes analyzer results of posts in one short transaction
+
+    Args:
+        post_ids (list): ids of analyzed posts
+        results (dict): maps (post id, analyzer) to response of the analyzer
+    """
+    post_model = get_network_model("Post")
+    keyword_model = get_network_model("Keyword")
+    ignored_keywords = set(
+        get_network_model("IgnoredKeyword").objects.values_list("keyword", flat=True)
+    )
+    blocked_keywords = blocking.find_blocked(
+        keyword
+        for (_, analyzer), resp in results.items()
+        if analyzer == KEYWORDS
+        for keyword in keyword_words(resp)
+    )
+
+    with transaction.atomic():
+        posts = list(
+            post_model.objects.select_for_update(of=("self",))
+            .select_related("channel")
+            .filter(id__in=post_ids)
+            .order_by("id")
+        )
+        keywords, moves, fields = [], [], set()
+        for post in posts:
+            if (resp := results.get((post.pk, KEYWORDS))) is not None:
+                keywords += build_keywords(
+                    post, resp, ignored_keywords, blocked_keywords
+                )
+            if (resp := results.get((post.pk, NER))) is not None:
+                post.ner = build_ner(resp)
+                fields.add("ner")
+            if (resp := results.get((post.pk, SENTIMENT))) is not None:
+                post.sentiment = resp
+                fields.add("sentiment")
+            if (resp := results.get((post.pk, CATEGORIES))) is not None:
+                sorted_result = sorted(resp, key=lambda k: k["score"], reverse=True)
+                moves.append((post, post.main_category_title))
+                post.category = sorted_result
+                post.main_category_title = sorted_result[0]["label"]
+                fields.update(("category", "main_category_title"))
+        if fields:
+            now = timezone.now()
+            for post in posts:
+                post.updated_at = now
+            post_model.objects.bulk_update(posts, sorted(fields | {"updated_at"}))
+        keyword_model.objects.bulk_create(keywords)
+        rollups.add_keywords_to_rollups(keywords)
+        rollups.move_post_categories(moves)
+
+
+def enrich(post_ids, analyzers=ANALYZERS):
+    """Runs analyzers for a batch of posts and saves their results
+
+    Args:
+        post_ids (list): ids of posts
+        analyzers (list, optional): names of analyzers. Defaults to all analyzers.
+
+    Returns:
+        dict: analyzer -> ids of posts that their call failed
+    """
+    posts = list(
+        get_network_model("Post")
+        .objects.select_related("channel")
+        .filter(id__in=post_ids)
+        .only("id", "body", "channel__language")
+    )
+    results, failed = analyze_posts(posts, analyzers)
+    if results:
+        save_results([post.pk for post in posts], results)
+    return failed
@@ -0,0 +1,135 @@
+import io
+import csv
+import tempfile
+
+from django.utils import timezone
+from django.core.files.base import File
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, Border, Side
+
+from reusable.models import get_network_model
+
+CHUNK_SIZE = 2000
+XLSX = "xlsx"
+CSV = "csv"
+CHANNEL_HEADER = ["Number", "Name", "Network", "Status"]
+POST_HEADER = [
+    "Id",
+    "Channel",
+    "Network",
+    "Created At",
+    "Body",
+    "Views",
+    "Shares",
+    "Category",
+]
+
+
+def to_local(value):
+    """Excel does not support timezones, so dates are written in local time"""
+    return timezone.localtime(value).replace(tzinfo=None)
+
+
+def write_xlsx(file, title, header, rows):
+    """Writes rows to a workbook in write-only mode, so rows are streamed to
+    the file instead of being kept in memory.
+
+    Args:
+        file (file): binary file to write to
+        title (str): title of the worksheet
+        header (list): column titles
+        rows (iterable): rows of cell values
+    """
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(title)
+    worksheet.freeze_panes = "B2"
+    header_cells = []
+    for column_title in header:
+        cell = WriteOnlyCell(worksheet, value=column_title)
+        cell.font = Font(bold=True)
+        cell.alignment = Alignment(horizontal="center")
+        cell.border = Border(bottom=Side(border_style="medium", color="FF000000"))
+        header_cells.append(cell)
+    worksheet.append(header_cells)
+    for row in rows:
+        worksheet.append(row)
+    workbook.save(file)
+
+
+def write_csv(file, header, rows):
+    """Writes rows as utf-8 csv with BOM, so excel detects persian texts
+
+    Args:
+        file (file): binary file to write to
+        header (list): column titles
+        rows (iterable): rows of cell values
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    writer = csv.writer(text)
+    writer.writerow(header)
+    writer.writerows(rows)
+    text.flush()
+    text.detach()
+
+
+def save_export(export, title, header, rows):
+    """Writes rows to a temporary file and then saves it to the export file field.
+    Memory usage does not depend on number of rows.
+
+    Args:
+        export (ChannelListExport|PostExport): the export object
+        title (str): title of the worksheet
+        header (list): column titles
+        rows (iterable): rows of cell values
+    """
+    with tempfile.TemporaryFile() as file:
+        if export.format == CSV:
+            write_csv(file, header, rows)
+        else:
+            write_xlsx(file, title, header, rows)
+        file.seek(0)
+        export.file.save(f"export.{export.format}", File(file))
+
+
+def channel_rows():
+    channels = (
+        get_network_model("Channel")
+        .objects.order_by("id")
+        .values_list("name", "network__name", "status")
+    )
+    for number, row in enumerate(channels.iterator(chunk_size=CHUNK_SIZE), start=1):
+        yield [number, *row]
+
+
+def post_rows(queryset, export_format):
+    posts = queryset.order_by("id").values_list(
+        "id",
+        "channel__username",
+        "channel__network__name",
+        "created_at",
+        "body",
+        "views_count",
+        "share_count",
+        "main_category_title",
+    )
+    for row in posts.iterator(chunk_size=CHUNK_SIZE):
+        row = list(row)
+        row[3] = to_local(row[3])
+        if export_format == CSV:
+            row[3] = row[3].isoformat(sep=" ", timespec="seconds")
+        yield row
+
+
+def export_channels(export):
+    save_export(export, "Channel List Report", CHANNEL_HEADER, channel_rows())
+
+
+def export_posts(export, queryset):
+    """Exports posts of a queryset, e.g. posts filtered by PostFilter
+
+    Args:
+        export (PostExport): the export object
+        queryset (queryset): posts to export
+    """
+    save_export(export, "Post Report", POST_HEADER, post_rows(queryset, export.format))
@@ -4,6 +4,7 @@ from django_filters import (
     CharFilter,
     NumberFilter,
 )
+from rest_framework.filters import SearchFilter
 
 from . import models
 
@@ -65,6 +66,35 @@ class PostFilter(FilterSet):
         fields = ("channels", "networks", "date", "tags")
 
 
+def rollup_filter_by_network_ids(queryset, _name, value):
+    """filter rollups by network ids
+
+    Args:
+        queryset (queryset): queryset of post or keyword rollups
+        name (_type_): _description_
+        value (str): value of network ids
+
+    Returns:
+        queryset: filtered queryset of rollups
+    """
+    values = value.split(",")
+    return queryset.filter(network_id__in=values)
+
+
+class RollupFilter(FilterSet):
+    """Filters of PostFilter and KeywordFilter that post and keyword rollups can answer.
+    Date range is applied by the statics itself.
+    """
+
+    channels = CharFilter(method=filter_by_channel_ids)
+    networks = CharFilter(method=rollup_filter_by_network_ids)
+    tags = CharFilter(method=filter_by_tag_ids)
+
+    class Meta:
+        model = models.PostHourlyRollup
+        fields = ("channels", "networks", "tags")
+
+
 def keyword_filter_by_channel_ids(queryset, _name, value):
     """filter keywords by channel ids
 
@@ -151,3 +181,14 @@ class ChannelFilter(FilterSet):
             "status",
             "networks",
         )
+
+
+class PostSearchFilter(SearchFilter):
+    """Search filter that looks up fields without a prefix with ``ilike``
+    instead of ``icontains``, so search on post bodies uses the trigram index.
+    """
+
+    def construct_search(self, field_name):
+        if field_name[0] in self.lookup_prefixes:
+            return super().construct_search(field_name)
+        return f"{field_name}__ilike"
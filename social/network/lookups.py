@@ -0,0 +1,32 @@
+from django.db.models import CharField, Func
+from django.db.models.lookups import IContains
+
+
+class ILike(IContains):
+    """Case insensitive contains that postgres runs as ``ILIKE``.
+    Unlike ``icontains`` it does not wrap the column in ``UPPER()``, so the
+    trigram index of the column is used.
+    """
+
+    lookup_name = "ilike"
+
+    def as_sql(self, compiler, connection):
+        lhs_sql, params = self.process_lhs(compiler, connection)
+        rhs_sql, rhs_params = self.process_rhs(compiler, connection)
+        params.extend(rhs_params)
+        return f"{lhs_sql} {connection.operators['icontains'] % rhs_sql}", params
+
+    def as_postgresql(self, compiler, connection):
+        lhs_sql, params = self.process_lhs(compiler, connection)
+        rhs_sql, rhs_params = self.process_rhs(compiler, connection)
+        params.extend(rhs_params)
+        return f"{lhs_sql} ILIKE {rhs_sql}", params
+
+
+class NormalizedKeyword(Func):
+    """Keyword in lower case with trimmed and collapsed whitespaces, the only
+    normalization of blocked keywords, see blocking.normalize_keywords
+    """
+
+    template = r"LOWER(BTRIM(REGEXP_REPLACE(%(expressions)s, '\s+', ' ', 'g')))"
+    output_field = CharField()
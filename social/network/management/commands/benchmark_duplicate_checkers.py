@@ -0,0 +1,101 @@
+import time
+import uuid
+import random
+
+from django.core.management.base import BaseCommand
+
+from reusable.dedup import (
+    REDIS_CLIENT,
+    KEY_PREFIX,
+    BLOOM_PREFIX,
+    DuplicateChecker,
+    BloomDuplicateChecker,
+)
+
+DAY = 24 * 60 * 60
+# tweet and linkedin ids are about this large
+ID_RANGE = 10**18
+
+
+def chunks(ids, size):
+    for index in range(0, len(ids), size):
+        end = index + size
+        yield ids[index:end]
+
+
+class Command(BaseCommand):
+    help = (
+        "Claims random ids by the exact and bloom duplicate checkers in a "
+        "temporary namespace of the crawlers redis db, compares their memory, "
+        "speed and false positives, then removes the namespaces."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=100000)
+        parser.add_argument("--checks", type=int, default=100000)
+        parser.add_argument("--batch", type=int, default=25)
+        parser.add_argument("--error-rate", type=float, default=0.001)
+        parser.add_argument("--capacity", type=int, default=10000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rand = random.Random(options["seed"])
+        items = rand.sample(range(ID_RANGE), options["items"])
+        # ids of the other half of the range are never claimed
+        checks = [
+            ID_RANGE + item for item in rand.sample(range(ID_RANGE), options["checks"])
+        ]
+        namespace = f"benchmark:{uuid.uuid4().hex[:8]}"
+        checkers = [
+            (KEY_PREFIX, DuplicateChecker(namespace, DAY)),
+            (
+                BLOOM_PREFIX,
+                BloomDuplicateChecker(
+                    namespace,
+                    DAY,
+                    error_rate=options["error_rate"],
+                    capacity=options["capacity"],
+                ),
+            ),
+        ]
+        for prefix, checker in checkers:
+            try:
+                self.run(checker, f"{prefix}:{namespace}:*", items, checks, options)
+            finally:
+                checker.clear()
+
+    def run(self, checker, pattern, items, checks, options):
+        batch = options["batch"]
+        started = time.perf_counter()
+        claimed = 0
+        for chunk in chunks(items, batch):
+            claimed += len(checker.claim(chunk))
+        claim_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        false_positives = 0
+        for chunk in chunks(checks, batch):
+            false_positives += len(chunk) - len(checker.unseen(chunk))
+        check_seconds = time.perf_counter() - started
+
+        missed = sum(len(checker.unseen(chunk)) for chunk in chunks(items, batch))
+        keys = list(REDIS_CLIENT.scan_iter(match=pattern, count=1000))
+        pipe = REDIS_CLIENT.pipeline(transaction=False)
+        for key in keys:
+            pipe.memory_usage(key)
+        memory = sum(size or 0 for size in pipe.execute())
+
+        batches = max(len(items) // batch, 1)
+        self.stdout.write(
+            f"{type(checker).__name__}: {len(keys)} keys, {memory / 1024:.1f}KiB, "
+            f"{memory / max(len(items), 1):.2f} bytes per id"
+        )
+        self.stdout.write(
+            f"  claim: {claim_seconds * 1000 / batches:.2f}ms per batch of {batch}, "
+            f"{len(items) - claimed} ids wrongly seen while claiming"
+        )
+        self.stdout.write(
+            f"  check: {check_seconds:.3f}s, false positive rate "
+            f"{false_positives / max(len(checks), 1):.5f} "
+            f"(configured {options['error_rate']}), {missed} claimed ids not seen"
+        )
@@ -0,0 +1,130 @@
+import time
+import random
+from itertools import accumulate
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from network.sketches import CountMinSketch, SKETCH_DEPTH, SKETCH_WIDTH
+from network.utils import KEYWORD_NUMBER
+
+
+class StoredSketch:
+    """Stand-in for a KeywordSketch row, so sketches go through serialization"""
+
+    def __init__(self, sketch):
+        self.table = sketch.dumps()
+        self.total = sketch.total
+        self.heavy_hitters = dict(sketch.heavy_hitters)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares exact and Count-Min sketch top keywords on synthetic zipf "
+        "distributed keywords. It does not touch the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--buckets", type=int, default=12)
+        parser.add_argument("--channels", type=int, default=50)
+        parser.add_argument("--occurrences", type=int, default=2000)
+        parser.add_argument("--vocabulary", type=int, default=50000)
+        parser.add_argument("--skew", type=float, default=1.1)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--width", type=int, default=SKETCH_WIDTH)
+        parser.add_argument("--depth", type=int, default=SKETCH_DEPTH)
+
+    def handle(self, *args, **options):
+        rand = random.Random(options["seed"])
+        vocabulary = [f"keyword{index}" for index in range(options["vocabulary"])]
+        weights = list(
+            accumulate(
+                1 / (rank ** options["skew"]) for rank in range(1, len(vocabulary) + 1)
+            )
+        )
+        streams = {}
+        for bucket in range(options["buckets"]):
+            for channel in range(options["channels"]):
+                # every channel has its own favourite keywords
+                shift = rand.randrange(len(vocabulary))
+                streams[(bucket, channel)] = [
+                    vocabulary[(index + shift) % len(vocabulary)]
+                    for index in rand.choices(
+                        range(len(vocabulary)),
+                        cum_weights=weights,
+                        k=options["occurrences"],
+                    )
+                ]
+
+        exact, exact_seconds, exact_rows = self.run_exact(streams)
+        approx, approx_seconds, sketch_bytes = self.run_approx(
+            streams, options["width"], options["depth"]
+        )
+
+        recalls, errors, in_bound = [], [], 0
+        reported = 0
+        for bucket, exact_counter in exact.items():
+            exact_top = {word for word, _ in exact_counter.most_common(KEYWORD_NUMBER)}
+            sketch = approx[bucket]
+            approx_top = sketch.top(KEYWORD_NUMBER)
+            recalls.append(
+                len(exact_top & {item["keyword"] for item in approx_top})
+                / max(len(exact_top), 1)
+            )
+            bound = sketch.error_bounds()["max_overestimate"]
+            for item in approx_top:
+                error = item["count"] - exact_counter[item["keyword"]]
+                errors.append(error / max(exact_counter[item["keyword"]], 1))
+                in_bound += error <= bound
+                reported += 1
+
+        self.stdout.write(f"buckets x channels: {len(streams)}")
+        self.stdout.write(
+            f"exact : {exact_seconds:.3f}s, {exact_rows} (bucket, channel, keyword) rows"
+        )
+        self.stdout.write(
+            f"approx: {approx_seconds:.3f}s, {sketch_bytes} bytes of stored sketches"
+        )
+        self.stdout.write(
+            f"top-{KEYWORD_NUMBER} recall: {sum(recalls) / len(recalls):.3f}"
+        )
+        self.stdout.write(
+            f"relative overestimate: mean {sum(errors) / len(errors):.4f}, "
+            f"max {max(errors):.4f}"
+        )
+        self.stdout.write(f"counts within reported bound: {in_bound}/{reported}")
+
+    @staticmethod
+    def run_exact(streams):
+        counters = {key: Counter(words) for key, words in streams.items()}
+        rows = sum(len(counter) for counter in counters.values())
+        started = time.perf_counter()
+        merged = {}
+        for (bucket, _), counter in counters.items():
+            merged.setdefault(bucket, Counter()).update(counter)
+        for counter in merged.values():
+            counter.most_common(KEYWORD_NUMBER)
+        return merged, time.perf_counter() - started, rows
+
+    @staticmethod
+    def run_approx(streams, width, depth):
+        stored = {}
+        for key, words in streams.items():
+            sketch = CountMinSketch(width, depth)
+            for word, count in Counter(words).items():
+                sketch.add(word, count)
+            stored[key] = StoredSketch(sketch)
+        size = sum(len(item.table) for item in stored.values())
+        started = time.perf_counter()
+        merged = {}
+        for (bucket, _), item in stored.items():
+            sketch = CountMinSketch.loads(
+                item.table, item.total, item.heavy_hitters, width, depth
+            )
+            if bucket in merged:
+                merged[bucket].merge(sketch)
+            else:
+                merged[bucket] = sketch
+        for sketch in merged.values():
+            sketch.top(KEYWORD_NUMBER)
+        return merged, time.perf_counter() - started, size
@@ -0,0 +1,151 @@
+import time
+
+from django.db import connection, transaction
+from django.core.management.base import BaseCommand, CommandError
+
+TABLE = "benchmark_post_search"
+# persian and english words, earlier words are more frequent
+VOCABULARY = [
+    "ایران",
+    "تهران",
+    "بانک",
+    "دلار",
+    "بورس",
+    "قیمت",
+    "خودرو",
+    "انتخابات",
+    "مجلس",
+    "دولت",
+    "نفت",
+    "طلا",
+    "سکه",
+    "تورم",
+    "اقتصاد",
+    "ورزش",
+    "فوتبال",
+    "استقلال",
+    "پرسپولیس",
+    "هوش‌مصنوعی",
+    "the",
+    "market",
+    "price",
+    "bitcoin",
+    "election",
+    "football",
+    "python",
+    "django",
+    "postgres",
+    "inflation",
+    "oil",
+    "gold",
+    "linkedin",
+    "telegram",
+    "twitter",
+    "developer",
+    "remote",
+    "startup",
+    "security",
+    "kubernetes",
+]
+# (operator, words) of searches that are measured
+SEARCHES = [
+    ("and", ["تهران"]),
+    ("and", ["بورس", "دلار"]),
+    ("or", ["پرسپولیس", "استقلال"]),
+    ("and", ["kubernetes", "remote"]),
+    ("or", ["postgres", "django", "python"]),
+    ("and", ["ناموجود"]),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures search on post bodies with and without the trigram index on a "
+        "synthetic temporary table. Post table is not touched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=5_000_000)
+        parser.add_argument("--words", type=int, default=30)
+        parser.add_argument("--skew", type=float, default=3.0)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("benchmark needs the postgres database")
+        with connection.cursor() as cursor:
+            self.create_table(cursor, options)
+            for operator, words in SEARCHES:
+                sql, params = self.search_sql(operator, words)
+                with transaction.atomic():
+                    indexed, count = self.measure(cursor, sql, params)
+                    cursor.execute("SET LOCAL enable_bitmapscan = off")
+                    cursor.execute("SET LOCAL enable_indexscan = off")
+                    scanned, _ = self.measure(cursor, sql, params)
+                self.stdout.write(
+                    f"{operator} {','.join(words)}: {count} posts, "
+                    f"trigram index {indexed * 1000:.1f}ms, "
+                    f"sequential scan {scanned * 1000:.1f}ms"
+                )
+            cursor.execute(f"DROP TABLE {TABLE}")
+
+    def create_table(self, cursor, options):
+        started = time.perf_counter()
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        cursor.execute(f"CREATE TEMPORARY TABLE {TABLE} (id serial, body text)")
+        # random() ^ skew picks words with a zipf like distribution
+        cursor.execute(
+            f"""
+            INSERT INTO {TABLE} (body)
+            SELECT array_to_string(
+                ARRAY(
+                    SELECT (%(vocabulary)s::text[])[
+                        1 + floor(random() ^ %(skew)s * %(size)s)::int
+                    ]
+                    FROM generate_series(1, %(words)s)
+                    WHERE post IS NOT NULL
+                ),
+                ' '
+            )
+            FROM generate_series(1, %(posts)s) AS post
+            """,
+            {
+                "vocabulary": VOCABULARY,
+                "skew": options["skew"],
+                "size": len(VOCABULARY),
+                "words": options["words"],
+                "posts": options["posts"],
+            },
+        )
+        self.stdout.write(
+            f"inserted {options['posts']} posts in {time.perf_counter() - started:.1f}s"
+        )
+        started = time.perf_counter()
+        cursor.execute(
+            f"CREATE INDEX {TABLE}_body_trgm ON {TABLE} USING gin (body gin_trgm_ops)"
+        )
+        cursor.execute(f"ANALYZE {TABLE}")
+        self.stdout.write(
+            f"built trigram index in {time.perf_counter() - started:.1f}s"
+        )
+
+    @staticmethod
+    def search_sql(operator, words):
+        """Builds the same where clause as get_search_modified_qs
+
+        Args:
+            operator (str): and or or
+            words (list): searched words
+
+        Returns:
+            tuple: sql and its params
+        """
+        where = f" {operator.upper()} ".join(["body LIKE %s"] * len(words))
+        params = [f"%{word}%" for word in words]
+        return f"SELECT count(*) FROM {TABLE} WHERE {where}", params
+
+    @staticmethod
+    def measure(cursor, sql, params):
+        started = time.perf_counter()
+        cursor.execute(sql, params)
+        count = cursor.fetchone()[0]
+        return time.perf_counter() - started, count
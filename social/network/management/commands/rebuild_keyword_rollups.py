@@ -0,0 +1,32 @@
+from django.utils import timezone
+from django.core.management.base import BaseCommand, CommandError
+
+from network import rollups, sketches
+from network.management.commands.rebuild_post_rollups import parse_date_time
+
+
+class Command(BaseCommand):
+    help = "Rebuilds hourly, daily and monthly keyword rollups of a date range"
+
+    def add_arguments(self, parser):
+        parser.add_argument("start", type=parse_date_time, help="e.g. 2023-01-01")
+        parser.add_argument(
+            "end",
+            type=parse_date_time,
+            nargs="?",
+            default=None,
+            help="e.g. 2023-02-01, defaults to now",
+        )
+
+    def handle(self, *args, **options):
+        end = options["end"] or timezone.localtime()
+        if options["start"] > end:
+            raise CommandError("start must be before end")
+        try:
+            result = rollups.rebuild_keyword_rollups(options["start"], end)
+        except sketches.SketchesBusy as error:
+            raise CommandError(
+                "keyword sketches are being merged, try again later"
+            ) from error
+        for interval, count in result.items():
+            self.stdout.write(f"{interval}: {count} rollup rows rebuilt")
@@ -0,0 +1,46 @@
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.core.management.base import BaseCommand, CommandError
+
+from network import rollups
+
+
+def parse_date_time(value):
+    """Parses a date (2023-01-31) or datetime (2023-01-31 12:00) in local time
+
+    Args:
+        value (str): date or datetime string
+
+    Returns:
+        datetime: aware datetime
+    """
+    if len(value) == 10:
+        value = f"{value} 00:00"
+    date_time = parse_datetime(value)
+    if date_time is None:
+        raise CommandError(f"invalid date: {value}")
+    if timezone.is_naive(date_time):
+        date_time = timezone.make_aware(date_time)
+    return date_time
+
+
+class Command(BaseCommand):
+    help = "Rebuilds hourly, daily and monthly post rollups of a date range from posts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("start", type=parse_date_time, help="e.g. 2023-01-01")
+        parser.add_argument(
+            "end",
+            type=parse_date_time,
+            nargs="?",
+            default=None,
+            help="e.g. 2023-02-01, defaults to now",
+        )
+
+    def handle(self, *args, **options):
+        end = options["end"] or timezone.localtime()
+        if options["start"] > end:
+            raise CommandError("start must be before end")
+        result = rollups.rebuild_post_rollups(options["start"], end)
+        for interval, count in result.items():
+            self.stdout.write(f"{interval}: {count} rollup rows rebuilt")
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from network import blocking
+from reusable.models import get_network_model
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes stored keywords that match blocked keywords after normalization "
+        "(case and whitespaces) and removes them from keyword rollups"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "keywords",
+            nargs="*",
+            help="blocked keywords to purge, defaults to all blocked keywords",
+        )
+        parser.add_argument("--dry-run", action="store_true")
+        parser.add_argument("--batch-size", type=int, default=blocking.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        keywords = options["keywords"] or list(
+            get_network_model("BlockedKeyword").objects.values_list(
+                "keyword", flat=True
+            )
+        )
+        counts = blocking.purge_keywords(
+            keywords,
+            dry_run=options["dry_run"],
+            batch_size=options["batch_size"],
+            progress=lambda deleted, total: self.stdout.write(
+                f"deleted {deleted} of {total}"
+            ),
+        )
+        for keyword, count in sorted(counts.items(), key=lambda item: -item[1]):
+            self.stdout.write(f"{keyword}: {count}")
+        verb = "match" if options["dry_run"] else "deleted"
+        self.stdout.write(f"{sum(counts.values())} keywords {verb}")
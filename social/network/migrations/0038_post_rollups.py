@@ -0,0 +1,139 @@
+# Generated by Django 4.2 on 2026-10-18 09:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("network", "0037_delete_outputchannel"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PostMonthlyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                (
+                    "main_category_title",
+                    models.CharField(blank=True, default="", max_length=50),
+                ),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "channel",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="network.channel",
+                    ),
+                ),
+                (
+                    "network",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="network.network",
+                    ),
+                ),
+            ],
+            options={
+                "abstract": False,
+                "unique_together": {
+                    ("bucket", "channel", "network", "main_category_title")
+                },
+            },
+        ),
+        migrations.CreateModel(
+            name="PostHourlyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                (
+                    "main_category_title",
+                    models.CharField(blank=True, default="", max_length=50),
+                ),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "channel",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="network.channel",
+                    ),
+                ),
+                (
+                    "network",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="network.network",
+                    ),
+                ),
+            ],
+            options={
+                "abstract": False,
+                "unique_together": {
+                    ("bucket", "channel", "network", "main_category_title")
+                },
+            },
+        ),
+        migrations.CreateModel(
+            name="PostDailyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                (
+                    "main_category_title",
+                    models.CharField(blank=True, default="", max_length=50),
+                ),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "channel",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="network.channel",
+                    ),
+                ),
+                (
+                    "network",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="network.network",
+                    ),
+                ),
+            ],
+            options={
+                "abstract": False,
+                "unique_together": {
+                    ("bucket", "channel", "network", "main_category_title")
+                },
+            },
+        ),
+    ]
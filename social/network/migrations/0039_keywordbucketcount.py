@@ -0,0 +1,70 @@
+# Generated by Django 4.2 on 2026-10-18 09:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("network", "0038_post_rollups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="KeywordBucketCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "interval",
+                    models.CharField(
+                        choices=[
+                            ("hourly", "hourly"),
+                            ("daily", "daily"),
+                            ("monthly", "monthly"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                ("keyword", models.CharField(max_length=100)),
+                ("ignored", models.BooleanField(default=False)),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "channel",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="network.channel",
+                    ),
+                ),
+                (
+                    "network",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="network.network",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="keywordbucketcount",
+            index=models.Index(
+                fields=["keyword", "ignored"], name="network_key_keyword_6aa03e_idx"
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="keywordbucketcount",
+            unique_together={
+                ("interval", "bucket", "channel", "network", "keyword", "ignored")
+            },
+        ),
+    ]
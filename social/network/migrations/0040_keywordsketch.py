@@ -0,0 +1,61 @@
+# Generated by Django 4.2 on 2026-10-18 09:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("network", "0039_keywordbucketcount"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="KeywordSketch",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "interval",
+                    models.CharField(
+                        choices=[
+                            ("hourly", "hourly"),
+                            ("daily", "daily"),
+                            ("monthly", "monthly"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                ("total", models.BigIntegerField(default=0)),
+                ("table", models.BinaryField()),
+                ("heavy_hitters", models.JSONField(default=dict)),
+                (
+                    "channel",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="network.channel",
+                    ),
+                ),
+                (
+                    "network",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="network.network",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("interval", "bucket", "channel")},
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # indexes are built concurrently, so posts are not locked while building
+    atomic = False
+
+    dependencies = [
+        ("network", "0040_keywordsketch"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name="post",
+            index=GinIndex(
+                fields=["body"],
+                name="network_post_body_trgm",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+    ]
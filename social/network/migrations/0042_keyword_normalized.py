@@ -0,0 +1,22 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import network.lookups
+
+
+class Migration(migrations.Migration):
+    # indexes are built concurrently, so keywords are not locked while building
+    atomic = False
+
+    dependencies = [
+        ("network", "0041_post_body_trgm"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="keyword",
+            index=models.Index(
+                network.lookups.NormalizedKeyword("keyword"),
+                name="network_keyword_normalized",
+            ),
+        ),
+    ]
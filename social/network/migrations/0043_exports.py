@@ -0,0 +1,55 @@
+# Generated by Django 4.2 on 2026-10-18 09:45
+
+from django.db import migrations, models
+import network.models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("network", "0042_keyword_normalized"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PostExport",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("deleted_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "format",
+                    models.CharField(
+                        choices=[("xlsx", "xlsx"), ("csv", "csv")],
+                        default="xlsx",
+                        max_length=5,
+                    ),
+                ),
+                ("filters", models.JSONField(blank=True, default=dict)),
+                (
+                    "file",
+                    models.FileField(
+                        blank=True, null=True, upload_to=network.models.post_export_path
+                    ),
+                ),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+        migrations.AddField(
+            model_name="channellistexport",
+            name="format",
+            field=models.CharField(
+                choices=[("xlsx", "xlsx"), ("csv", "csv")], default="xlsx", max_length=5
+            ),
+        ),
+    ]
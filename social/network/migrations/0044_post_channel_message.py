@@ -0,0 +1,23 @@
+import django.db.models.fields.json
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # indexes are built concurrently, so posts are not locked while building
+    atomic = False
+
+    dependencies = [
+        ("network", "0043_exports"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="post",
+            index=models.Index(
+                models.F("channel"),
+                django.db.models.fields.json.KeyTransform("message_id", "data"),
+                name="network_post_channel_message",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import network.lookups
+
+
+class Migration(migrations.Migration):
+    # indexes are built concurrently, so rollups are not locked while building
+    atomic = False
+
+    dependencies = [
+        ("network", "0044_post_channel_message"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="keywordbucketcount",
+            index=models.Index(
+                network.lookups.NormalizedKeyword("keyword"),
+                name="network_kwbucket_normalized",
+            ),
+        ),
+    ]
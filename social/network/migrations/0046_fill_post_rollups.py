@@ -0,0 +1,57 @@
+# Generated by Django 4.2 on 2026-10-18 14:05
+
+from django.db import migrations
+from django.db.models import Count, Value
+from django.db.models.functions import Coalesce, TruncDay, TruncHour, TruncMonth
+
+ROLLUPS = (
+    ("PostHourlyRollup", TruncHour),
+    ("PostDailyRollup", TruncDay),
+    ("PostMonthlyRollup", TruncMonth),
+)
+BATCH_SIZE = 1000
+
+
+def fill_post_rollups(apps, schema_editor):
+    """Counts posts that were saved before post rollups were added, statics read
+    rollups since then
+    """
+    post_model = apps.get_model("network", "Post")
+    for model_name, trunc in ROLLUPS:
+        model = apps.get_model("network", model_name)
+        model.objects.all().delete()
+        rows = (
+            post_model.objects.filter(channel__isnull=False)
+            .annotate(
+                bucket=trunc("created_at"),
+                category_title=Coalesce("main_category_title", Value("")),
+            )
+            .values("bucket", "channel_id", "channel__network_id", "category_title")
+            .annotate(count=Count("id"))
+            .order_by()
+        )
+        batch = []
+        for row in rows.iterator():
+            batch.append(
+                model(
+                    bucket=row["bucket"],
+                    channel_id=row["channel_id"],
+                    network_id=row["channel__network_id"],
+                    main_category_title=row["category_title"],
+                    count=row["count"],
+                )
+            )
+            if len(batch) >= BATCH_SIZE:
+                model.objects.bulk_create(batch)
+                batch = []
+        model.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("network", "0045_keywordbucketcount_normalized"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_post_rollups, migrations.RunPython.noop),
+    ]
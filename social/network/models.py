@@ -3,6 +3,9 @@ from django.conf import settings
 from django.utils import timezone
 from django.utils.html import format_html
 from django.db import models, transaction
+from django.db.models import F
+from django.db.models.fields.json import KeyTransform
+from django.contrib.postgres.indexes import GinIndex
 from django.core.validators import MinValueValidator
 from django.template.defaultfilters import truncatechars
 
@@ -10,7 +13,8 @@ from reusable.models import BaseModel
 from reusable.admins import url_to_edit_object
 from twitter import tasks as twi_tasks
 from linkedin import tasks as lin_tasks
-from . import tasks
+from . import tasks, rollups
+from .lookups import NormalizedKeyword
 
 
 def channel_list_export_path(_instance, filename):
@@ -24,6 +28,17 @@ def channel_list_export_path(_instance, filename):
     )
 
 
+def post_export_path(_instance, filename):
+    ext = filename.split(".")[-1].lower()
+    return path.join(
+        ".",
+        "static",
+        "export",
+        "post",
+        f"{int(timezone.now().timestamp())}.{ext}",
+    )
+
+
 class Tag(BaseModel):
     name = models.CharField(max_length=100, unique=True)
 
@@ -112,6 +127,22 @@ class Post(BaseModel):
     main_category_title = models.CharField(max_length=50, null=True, blank=True)
     ner = models.JSONField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # serves body LIKE/ILIKE '%word%' of search in persian and english
+            GinIndex(
+                name="network_post_body_trgm",
+                fields=["body"],
+                opclasses=["gin_trgm_ops"],
+            ),
+            # serves lookups of telegram posts by data__message_id in a channel
+            models.Index(
+                F("channel"),
+                KeyTransform("message_id", "data"),
+                name="network_post_channel_message",
+            ),
+        ]
+
     @property
     def admin_link(self):
         url = url_to_edit_object(self)
@@ -140,15 +171,41 @@ class Post(BaseModel):
                 self.views_count = self.views_count or 0
                 self.share_count = self.share_count or 0
                 if settings.ENVIRONMENT == settings.PRODUCTION:
-                    transaction.on_commit(lambda: tasks.extract_keywords.delay(self.pk))
-                    transaction.on_commit(lambda: tasks.extract_ner.delay(self.pk))
-                    transaction.on_commit(
-                        lambda: tasks.extract_sentiment.delay(self.pk)
-                    )
-                    transaction.on_commit(
-                        lambda: tasks.extract_categories.delay(self.pk)
-                    )
+                    transaction.on_commit(lambda: tasks.enqueue_enrichment([self.pk]))
             super().save(*args, **kwargs)
+            if created:
+                rollups.add_posts_to_rollups([self])
+
+
+class PostRollup(models.Model):
+    """Number of posts of a channel in a time bucket per main category.
+    Posts without category are counted under an empty title.
+    """
+
+    bucket = models.DateTimeField()
+    channel = models.ForeignKey(Channel, on_delete=models.CASCADE, related_name="+")
+    network = models.ForeignKey(Network, on_delete=models.CASCADE, related_name="+")
+    main_category_title = models.CharField(max_length=50, blank=True, default="")
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+        unique_together = ("bucket", "channel", "network", "main_category_title")
+
+    def __str__(self):
+        return f"({self.pk} - {self.bucket} - {self.channel_id} - {self.count})"
+
+
+class PostHourlyRollup(PostRollup):
+    pass
+
+
+class PostDailyRollup(PostRollup):
+    pass
+
+
+class PostMonthlyRollup(PostRollup):
+    pass
 
 
 class Keyword(BaseModel):
@@ -161,10 +218,76 @@ class Keyword(BaseModel):
     keyword = models.CharField(max_length=100)
     ignored = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # finds keywords of blocked keywords without scanning the table
+            models.Index(
+                NormalizedKeyword("keyword"), name="network_keyword_normalized"
+            ),
+        ]
+
     def __str__(self):
         return f"({self.pk} - {self.keyword})"
 
 
+class KeywordBucketCount(models.Model):
+    """Number of keywords of a channel in a time bucket.
+    Ignored keywords are counted in separate rows.
+    """
+
+    HOURLY = "hourly"
+    DAILY = "daily"
+    MONTHLY = "monthly"
+    INTERVAL_CHOICES = ((HOURLY, HOURLY), (DAILY, DAILY), (MONTHLY, MONTHLY))
+    interval = models.CharField(choices=INTERVAL_CHOICES, max_length=10)
+    bucket = models.DateTimeField()
+    channel = models.ForeignKey(Channel, on_delete=models.CASCADE, related_name="+")
+    network = models.ForeignKey(Network, on_delete=models.CASCADE, related_name="+")
+    keyword = models.CharField(max_length=100)
+    ignored = models.BooleanField(default=False)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = (
+            "interval",
+            "bucket",
+            "channel",
+            "network",
+            "keyword",
+            "ignored",
+        )
+        indexes = [
+            models.Index(fields=("keyword", "ignored")),
+            # finds rollups of blocked keywords without scanning the table
+            models.Index(
+                NormalizedKeyword("keyword"), name="network_kwbucket_normalized"
+            ),
+        ]
+
+    def __str__(self):
+        return f"({self.pk} - {self.bucket} - {self.keyword} - {self.count})"
+
+
+class KeywordSketch(models.Model):
+    """Count-Min sketch of not ignored keywords of a channel in a time bucket"""
+
+    interval = models.CharField(
+        choices=KeywordBucketCount.INTERVAL_CHOICES, max_length=10
+    )
+    bucket = models.DateTimeField()
+    channel = models.ForeignKey(Channel, on_delete=models.CASCADE, related_name="+")
+    network = models.ForeignKey(Network, on_delete=models.CASCADE, related_name="+")
+    total = models.BigIntegerField(default=0)
+    table = models.BinaryField()
+    heavy_hitters = models.JSONField(default=dict)
+
+    class Meta:
+        unique_together = ("interval", "bucket", "channel")
+
+    def __str__(self):
+        return f"({self.pk} - {self.interval} - {self.bucket} - {self.channel_id})"
+
+
 class Backup(BaseModel):
     link = models.CharField(max_length=300, null=True, blank=True)
     PROCESSING = "PROCESSING"
@@ -191,7 +314,17 @@ class Config(BaseModel):
     crawl_linkedin_feed = models.BooleanField(default=False)
 
 
-class ChannelListExport(BaseModel):
+class BaseExport(BaseModel):
+    XLSX = "xlsx"
+    CSV = "csv"
+    FORMAT_CHOICES = ((XLSX, XLSX), (CSV, CSV))
+    format = models.CharField(choices=FORMAT_CHOICES, max_length=5, default=XLSX)
+
+    class Meta:
+        abstract = True
+
+
+class ChannelListExport(BaseExport):
     file = models.FileField(upload_to=channel_list_export_path, null=True, blank=True)
 
     def save(self, *args, **kwargs):
@@ -202,12 +335,59 @@ class ChannelListExport(BaseModel):
             super().save(*args, **kwargs)
 
 
+class PostExport(BaseExport):
+    """Export of posts that match filters of PostFilter,
+    e.g. {"channels": "1,2", "date_after": "2023-01-01"}
+    """
+
+    filters = models.JSONField(default=dict, blank=True)
+    file = models.FileField(upload_to=post_export_path, null=True, blank=True)
+
+    def __str__(self):
+        return f"({self.pk} - {self.created_at})"
+
+    def save(self, *args, **kwargs):
+        created = self.pk is None
+        with transaction.atomic():
+            if created:
+                transaction.on_commit(lambda: tasks.export_posts.delay(self.pk))
+            super().save(*args, **kwargs)
+
+
 class IgnoredKeyword(BaseModel):
     keyword = models.CharField(max_length=100)
 
     def __str__(self):
         return f"({self.pk} - {self.keyword})"
 
+    def save(self, *args, **kwargs):
+        old_keyword = None
+        if self.pk is not None:
+            old_keyword = (
+                IgnoredKeyword.objects.filter(pk=self.pk)
+                .values_list("keyword", flat=True)
+                .first()
+            )
+        with transaction.atomic():
+            if old_keyword != self.keyword:
+                keyword = self.keyword
+                if old_keyword is not None:
+                    transaction.on_commit(
+                        lambda: tasks.set_keyword_ignored.delay(old_keyword, False)
+                    )
+                transaction.on_commit(
+                    lambda: tasks.set_keyword_ignored.delay(keyword, True)
+                )
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        keyword = self.keyword
+        with transaction.atomic():
+            transaction.on_commit(
+                lambda: tasks.set_keyword_ignored.delay(keyword, False)
+            )
+            return super().delete(*args, **kwargs)
+
 
 class BlockedKeyword(BaseModel):
     keyword = models.CharField(max_length=100)
@@ -215,6 +395,21 @@ class BlockedKeyword(BaseModel):
     def __str__(self):
         return f"({self.pk} - {self.keyword})"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            keyword = self.keyword
+            previous = (
+                BlockedKeyword.objects.filter(pk=self.pk)
+                .values_list("keyword", flat=True)
+                .first()
+            )
+            # other edits do not block anything new
+            if keyword != previous:
+                transaction.on_commit(
+                    lambda: tasks.apply_blocked_keyword.delay(keyword)
+                )
+            super().save(*args, **kwargs)
+
 
 class Log(models.Model):
     time = models.DateTimeField(auto_now_add=True)
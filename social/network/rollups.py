@@ -0,0 +1,342 @@
+from collections import Counter
+from dateutil.relativedelta import relativedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Coalesce, TruncDay, TruncHour, TruncMonth
+from django.utils import timezone
+
+from reusable.models import bulk_increment, get_network_model
+from network import sketches
+
+# interval -> (rollup model name, truncate function, bucket length)
+POST_ROLLUPS = {
+    "hourly": ("PostHourlyRollup", TruncHour, timezone.timedelta(hours=1)),
+    "daily": ("PostDailyRollup", TruncDay, timezone.timedelta(days=1)),
+    "monthly": ("PostMonthlyRollup", TruncMonth, relativedelta(months=1)),
+}
+POST_ROLLUP_FIELDS = ("bucket", "channel", "network", "main_category_title")
+# keys of postgres advisory locks of post rollups, increments share the lock of an
+# interval and a rebuild of the interval takes it alone
+POST_ROLLUP_LOCKS = {"hourly": 7301, "daily": 7302, "monthly": 7303}
+KEYWORD_ROLLUP_FIELDS = (
+    "interval",
+    "bucket",
+    "channel",
+    "network",
+    "keyword",
+    "ignored",
+)
+
+
+def bucket_start(interval, value):
+    """Truncates a datetime to the start of its bucket in local time.
+    It matches the buckets that Trunc functions of the database return.
+
+    Args:
+        interval (str): one of hourly, daily or monthly
+        value (datetime): a datetime inside the bucket
+
+    Returns:
+        datetime: start of the bucket
+    """
+    value = timezone.localtime(value).replace(minute=0, second=0, microsecond=0)
+    if interval == "hourly":
+        return value
+    value = value.replace(hour=0)
+    if interval == "daily":
+        return value
+    return value.replace(day=1)
+
+
+def get_post_rollup_model(interval):
+    return get_network_model(POST_ROLLUPS[interval][0])
+
+
+def post_rollup_keys(post, category_title):
+    """Yields rollup rows that a post is counted in
+
+    Args:
+        post (Post): post object
+        category_title (str): main category title that post is counted under
+
+    Yields:
+        tuple: interval, key of the rollup row
+    """
+    for interval in POST_ROLLUPS:
+        yield interval, (
+            bucket_start(interval, post.created_at),
+            post.channel_id,
+            post.channel.network_id,
+            category_title or "",
+        )
+
+
+def lock_post_rollups(intervals, shared=True):
+    """Takes advisory locks of post rollups of intervals until the transaction
+    ends, so an increment is not lost by a rebuild of the same rollups
+
+    Args:
+        intervals (list): hourly, daily or monthly
+        shared (bool, optional): increments share the lock. Defaults to True.
+    """
+    function = "pg_advisory_xact_lock_shared" if shared else "pg_advisory_xact_lock"
+    with connection.cursor() as cursor:
+        # always in the same order, so increments and rebuilds do not deadlock
+        for interval in POST_ROLLUPS:
+            if interval in intervals:
+                cursor.execute(f"SELECT {function}(%s)", [POST_ROLLUP_LOCKS[interval]])
+
+
+def apply_post_rollup_deltas(deltas):
+    deltas = {interval: counter for interval, counter in deltas.items() if counter}
+    if not deltas:
+        return
+    with transaction.atomic():
+        lock_post_rollups(deltas)
+        for interval, counter in deltas.items():
+            bulk_increment(get_post_rollup_model(interval), POST_ROLLUP_FIELDS, counter)
+
+
+def add_posts_to_rollups(posts):
+    """Increments rollups for newly inserted posts.
+    Posts without a channel are not rolled up.
+
+    Args:
+        posts (iterable): Post objects
+    """
+    deltas = {interval: Counter() for interval in POST_ROLLUPS}
+    for post in posts:
+        if post.channel_id is None:
+            continue
+        for interval, key in post_rollup_keys(post, post.main_category_title):
+            deltas[interval][key] += 1
+    apply_post_rollup_deltas(deltas)
+
+
+def move_post_categories(moves):
+    """Moves posts from their old category rollup rows to their current category rows
+
+    Args:
+        moves (list): (post, old main_category_title) of posts that their
+        main_category_title is changed
+    """
+    deltas = {interval: Counter() for interval in POST_ROLLUPS}
+    for post, old_category_title in moves:
+        if post.channel_id is None:
+            continue
+        for interval, key in post_rollup_keys(post, old_category_title):
+            deltas[interval][key] -= 1
+        for interval, key in post_rollup_keys(post, post.main_category_title):
+            deltas[interval][key] += 1
+    apply_post_rollup_deltas(deltas)
+
+
+def remove_posts_from_rollups(posts):
+    """Decrements rollups of deleted posts. Rows are only updated, rows of a
+    deleted channel are deleted with it.
+
+    Args:
+        posts (iterable): deleted Post objects
+    """
+    deltas = {interval: Counter() for interval in POST_ROLLUPS}
+    for post in posts:
+        if post.channel_id is None:
+            continue
+        for interval in POST_ROLLUPS:
+            key = (
+                bucket_start(interval, post.created_at),
+                post.channel_id,
+                post.main_category_title or "",
+            )
+            deltas[interval][key] += 1
+    deltas = {interval: counter for interval, counter in deltas.items() if counter}
+    if not deltas:
+        return
+    with transaction.atomic():
+        lock_post_rollups(deltas)
+        for interval, counter in deltas.items():
+            model = get_post_rollup_model(interval)
+            for (bucket, channel_id, category_title), count in sorted(counter.items()):
+                model.objects.filter(
+                    bucket=bucket,
+                    channel_id=channel_id,
+                    main_category_title=category_title,
+                ).update(count=F("count") - count)
+
+
+def rebuild_post_rollups(start, end):
+    """Rebuilds rollups of all buckets that overlap the given range from posts.
+    Posts of an interval are counted while its increments wait for the rebuild.
+
+    Args:
+        start (datetime): start of the range
+        end (datetime): end of the range
+
+    Returns:
+        dict: interval -> number of rebuilt rollup rows
+    """
+    post_model = get_network_model("Post")
+    result = {}
+    for interval, (model_name, trunc, length) in POST_ROLLUPS.items():
+        model = get_network_model(model_name)
+        range_start = bucket_start(interval, start)
+        range_end = bucket_start(interval, end) + length
+        with transaction.atomic():
+            lock_post_rollups([interval], shared=False)
+            rows = (
+                post_model.objects.filter(
+                    created_at__gte=range_start,
+                    created_at__lt=range_end,
+                    channel__isnull=False,
+                )
+                .annotate(
+                    bucket=trunc("created_at"),
+                    category_title=Coalesce("main_category_title", Value("")),
+                )
+                .values("bucket", "channel_id", "channel__network_id", "category_title")
+                .annotate(count=Count("id"))
+                .order_by()
+            )
+            deltas = Counter()
+            for row in rows.iterator():
+                key = (
+                    row["bucket"],
+                    row["channel_id"],
+                    row["channel__network_id"],
+                    row["category_title"],
+                )
+                deltas[key] += row["count"]
+            model.objects.filter(bucket__gte=range_start, bucket__lt=range_end).delete()
+            bulk_increment(model, POST_ROLLUP_FIELDS, deltas)
+        result[interval] = len(deltas)
+    return result
+
+
+def add_keywords_to_rollups(keywords):
+    """Increments keyword rollups for newly inserted keywords.
+    Keywords of posts without a channel are not rolled up.
+
+    Args:
+        keywords (list): Keyword objects with their posts
+    """
+    deltas = Counter()
+    for keyword in keywords:
+        post = keyword.post
+        if post.channel_id is None:
+            continue
+        for interval in POST_ROLLUPS:
+            key = (
+                interval,
+                bucket_start(interval, keyword.created_at),
+                post.channel_id,
+                post.channel.network_id,
+                keyword.keyword,
+                keyword.ignored,
+            )
+            deltas[key] += 1
+    bulk_increment(
+        get_network_model("KeywordBucketCount"), KEYWORD_ROLLUP_FIELDS, deltas
+    )
+    sketches.queue_keyword_deltas(
+        {key[:-1]: delta for key, delta in deltas.items() if not key[-1]}
+    )
+
+
+def set_keyword_rollups_ignored(keyword, ignored):
+    """Moves counts of a keyword between its ignored and not ignored rollup rows
+
+    Args:
+        keyword (str): the keyword
+        ignored (bool): new ignored flag of the keyword
+    """
+    model = get_network_model("KeywordBucketCount")
+    with transaction.atomic():
+        rows = model.objects.select_for_update().filter(
+            keyword=keyword, ignored=not ignored
+        )
+        deltas = Counter()
+        for interval, bucket, channel_id, network_id, count in rows.values_list(
+            "interval", "bucket", "channel_id", "network_id", "count"
+        ):
+            key = (interval, bucket, channel_id, network_id, keyword, ignored)
+            deltas[key] += count
+        bulk_increment(model, KEYWORD_ROLLUP_FIELDS, deltas)
+        rows.delete()
+        sign = -1 if ignored else 1
+        sketches.queue_keyword_deltas(
+            {key[:-1]: sign * delta for key, delta in deltas.items()}
+        )
+
+
+def remove_keyword_from_rollups(keyword):
+    """Deletes rollup rows of a keyword and removes it from sketches
+
+    Args:
+        keyword (str): the keyword
+    """
+    model = get_network_model("KeywordBucketCount")
+    with transaction.atomic():
+        rows = model.objects.select_for_update().filter(keyword=keyword)
+        deltas = {
+            (interval, bucket, channel_id, network_id, keyword): -count
+            for interval, bucket, channel_id, network_id, count in rows.filter(
+                ignored=False
+            ).values_list("interval", "bucket", "channel_id", "network_id", "count")
+        }
+        rows.delete()
+        sketches.queue_keyword_deltas(deltas)
+
+
+def rebuild_keyword_rollups(start, end):
+    """Rebuilds keyword rollups of all buckets that overlap the given range
+
+    Args:
+        start (datetime): start of the range
+        end (datetime): end of the range
+
+    Returns:
+        dict: interval -> number of rebuilt rollup rows
+    """
+    keyword_model = get_network_model("Keyword")
+    model = get_network_model("KeywordBucketCount")
+    result = {}
+    for interval, (_, trunc, length) in POST_ROLLUPS.items():
+        range_start = bucket_start(interval, start)
+        range_end = bucket_start(interval, end) + length
+        rows = (
+            keyword_model.objects.filter(
+                created_at__gte=range_start,
+                created_at__lt=range_end,
+                post__channel__isnull=False,
+            )
+            .annotate(bucket=trunc("created_at"))
+            .values(
+                "bucket",
+                "post__channel_id",
+                "post__channel__network_id",
+                "keyword",
+                "ignored",
+            )
+            .annotate(count=Count("id"))
+            .order_by()
+        )
+        deltas = Counter()
+        for row in rows.iterator():
+            key = (
+                interval,
+                row["bucket"],
+                row["post__channel_id"],
+                row["post__channel__network_id"],
+                row["keyword"],
+                row["ignored"],
+            )
+            deltas[key] += row["count"]
+        with transaction.atomic():
+            model.objects.filter(
+                interval=interval, bucket__gte=range_start, bucket__lt=range_end
+            ).delete()
+            bulk_increment(model, KEYWORD_ROLLUP_FIELDS, deltas)
+        sketches.rebuild_keyword_sketches(interval, range_start, range_end)
+        result[interval] = len(deltas)
+    return result
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 
-from . import models
+from . import models, filters
 
 
 class NetworkShortSerializer(serializers.ModelSerializer):
@@ -91,6 +91,7 @@ class PostCountInputSerializer(serializers.Serializer):
     date_after = serializers.DateTimeField(required=False, default=None)
     date_before = serializers.DateTimeField(required=False, default=None)
     operator = serializers.CharField(required=False, default="or")
+    approx = serializers.BooleanField(required=False, default=False)
 
     def update(self, _instance, _validated_data):
         pass
@@ -116,3 +117,18 @@ class BackupSerializer(serializers.ModelSerializer):
             "created_at",
             "updated_at",
         )
+
+
+class PostExportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = models.PostExport
+        fields = ("id", "format", "filters", "file", "created_at")
+        read_only_fields = ("file",)
+
+    def validate_filters(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError("filters must be an object")
+        filterset = filters.PostFilter(value, queryset=models.Post.objects.none())
+        if not filterset.is_valid():
+            raise serializers.ValidationError(filterset.errors)
+        return value
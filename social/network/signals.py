@@ -0,0 +1,14 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from network import models, rollups
+
+
+@receiver(post_delete, sender=models.Post)
+def remove_post_from_rollups(instance, origin=None, **kwargs):
+    """Rollup rows of a deleted channel are deleted with the channel"""
+    deleted = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if deleted is models.Channel:
+        return
+    rollups.remove_posts_from_rollups([instance])
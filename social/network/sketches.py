@@ -0,0 +1,333 @@
+import json
+import math
+import time
+import uuid
+import zlib
+import hashlib
+import logging
+from array import array
+from contextlib import contextmanager
+from datetime import datetime
+from collections import Counter, defaultdict
+
+import redis
+from django.db import transaction
+from django.db.models import Q
+
+from reusable.models import get_network_model
+
+logger = logging.getLogger(__name__)
+
+# same db as enrichment queue, db 5 and db 15 are flushed by other jobs
+REDIS_CLIENT = redis.Redis(host="social_redis", port=6379, db=6)
+# sketch and keyword -> delta of its count, not merged into stored sketches yet
+DELTAS_KEY = "keyword_sketches:deltas"
+# deltas that a merge took, they are merged again if that merge failed
+MERGING_KEY = "keyword_sketches:merging"
+MERGE_LOCK_KEY = "keyword_sketches:merge_lock"
+MERGE_LOCK_TTL = 10 * 60
+# a rebuild holds the merge lock REBUILD_LOCK_TTL seconds at most and waits for
+# a running merge REBUILD_LOCK_WAIT seconds at most
+REBUILD_LOCK_TTL = 60 * 60
+REBUILD_LOCK_WAIT = 2 * 60
+
+SKETCH_WIDTH = 2048
+SKETCH_DEPTH = 4
+HEAVY_HITTERS_SIZE = 64
+# hourly buckets are cheap enough to be read exactly from keyword rollups
+SKETCH_INTERVALS = ("daily", "monthly")
+
+
+class CountMinSketch:
+    """Count-Min sketch of keyword frequencies plus a list of heavy hitters.
+    Estimates never under count. With probability 1 - delta they over count by
+    at most epsilon * total. Sketches of same size are mergeable by adding tables.
+    """
+
+    def __init__(self, width=SKETCH_WIDTH, depth=SKETCH_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.table = array("i", bytes(4 * width * depth))
+        self.total = 0
+        self.heavy_hitters = {}
+
+    @property
+    def epsilon(self):
+        return math.e / self.width
+
+    @property
+    def delta(self):
+        return math.exp(-self.depth)
+
+    def indexes(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [
+            row * self.width + (first + row * second) % self.width
+            for row in range(self.depth)
+        ]
+
+    def estimate(self, item):
+        return min(self.table[index] for index in self.indexes(item))
+
+    def add(self, item, count=1):
+        """Adds (or with a negative count removes) occurrences of an item
+
+        Args:
+            item (str): the item (keyword)
+            count (int, optional): number of occurrences. Defaults to 1.
+        """
+        indexes = self.indexes(item)
+        for index in indexes:
+            self.table[index] += count
+        self.total += count
+        self.track(item, min(self.table[index] for index in indexes))
+
+    def track(self, item, estimate):
+        if estimate <= 0:
+            self.heavy_hitters.pop(item, None)
+            return
+        self.heavy_hitters[item] = estimate
+        if len(self.heavy_hitters) > HEAVY_HITTERS_SIZE:
+            smallest = min(self.heavy_hitters, key=self.heavy_hitters.get)
+            del self.heavy_hitters[smallest]
+
+    def merge(self, other):
+        """Adds another sketch of the same size into this sketch
+
+        Args:
+            other (CountMinSketch): the other sketch
+        """
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError("sketches with different sizes are not mergeable")
+        for index, value in enumerate(other.table):
+            if value:
+                self.table[index] += value
+        self.total += other.total
+        for item in set(self.heavy_hitters) | set(other.heavy_hitters):
+            self.track(item, self.estimate(item))
+
+    def top(self, number):
+        items = sorted(self.heavy_hitters.items(), key=lambda item: (-item[1], item[0]))
+        return [{"keyword": item, "count": count} for item, count in items[:number]]
+
+    def error_bounds(self):
+        return {
+            "epsilon": self.epsilon,
+            "delta": self.delta,
+            "total": self.total,
+            "max_overestimate": math.ceil(self.epsilon * self.total),
+        }
+
+    def dumps(self):
+        return zlib.compress(self.table.tobytes())
+
+    @classmethod
+    def loads(cls, data, total, heavy_hitters, width=SKETCH_WIDTH, depth=SKETCH_DEPTH):
+        sketch = cls(width, depth)
+        sketch.table = array("i")
+        sketch.table.frombytes(zlib.decompress(data))
+        sketch.total = total
+        sketch.heavy_hitters = dict(heavy_hitters)
+        return sketch
+
+
+def load_sketch(keyword_sketch):
+    return CountMinSketch.loads(
+        bytes(keyword_sketch.table),
+        keyword_sketch.total,
+        keyword_sketch.heavy_hitters,
+    )
+
+
+def add_to_keyword_sketches(deltas):
+    """Applies keyword count changes to stored sketches. Each sketch is locked,
+    read and written once, by one query for all of them. Rows of intervals
+    without sketches are skipped.
+
+    Args:
+        deltas (dict): maps (interval, bucket, channel_id, network_id, keyword) to delta
+    """
+    grouped, networks = defaultdict(dict), {}
+    for (interval, bucket, channel_id, network_id, keyword), delta in deltas.items():
+        if interval in SKETCH_INTERVALS and delta:
+            grouped[(interval, bucket, channel_id)][keyword] = delta
+            networks[channel_id] = network_id
+    if not grouped:
+        return
+    model = get_network_model("KeywordSketch")
+    empty = CountMinSketch().dumps()
+    lookup = Q()
+    for interval, bucket, channel_id in grouped:
+        lookup |= Q(interval=interval, bucket=bucket, channel_id=channel_id)
+    with transaction.atomic():
+        model.objects.bulk_create(
+            [
+                model(
+                    interval=interval,
+                    bucket=bucket,
+                    channel_id=channel_id,
+                    network_id=networks[channel_id],
+                    table=empty,
+                )
+                for interval, bucket, channel_id in grouped
+            ],
+            ignore_conflicts=True,
+        )
+        # ordered to lock rows in the same order as concurrent writers
+        keyword_sketches = list(
+            model.objects.select_for_update().filter(lookup).order_by("pk")
+        )
+        for keyword_sketch in keyword_sketches:
+            sketch = load_sketch(keyword_sketch)
+            key = (
+                keyword_sketch.interval,
+                keyword_sketch.bucket,
+                keyword_sketch.channel_id,
+            )
+            for keyword, delta in grouped[key].items():
+                sketch.add(keyword, delta)
+            keyword_sketch.table = sketch.dumps()
+            keyword_sketch.total = sketch.total
+            keyword_sketch.heavy_hitters = sketch.heavy_hitters
+        model.objects.bulk_update(
+            keyword_sketches, ["table", "total", "heavy_hitters"], batch_size=100
+        )
+
+
+def queue_keyword_deltas(deltas):
+    """Queues keyword count changes after the current transaction commits. They
+    are summed in redis and merge_keyword_deltas applies them to stored sketches,
+    so saving keywords of a post does not rewrite its sketches.
+
+    Args:
+        deltas (dict): maps (interval, bucket, channel_id, network_id, keyword) to delta
+    """
+    fields = Counter()
+    for (interval, bucket, channel_id, network_id, keyword), delta in deltas.items():
+        if interval in SKETCH_INTERVALS and delta:
+            field = [interval, bucket.isoformat(), channel_id, network_id, keyword]
+            fields[json.dumps(field)] += delta
+    if not fields:
+        return
+
+    def push():
+        pipe = REDIS_CLIENT.pipeline()
+        for field, delta in fields.items():
+            pipe.hincrby(DELTAS_KEY, field, delta)
+        try:
+            pipe.execute()
+        except redis.RedisError:
+            # counts are exact in keyword rollups, sketches can be rebuilt
+            logger.exception("%s keyword sketch deltas were not queued", len(fields))
+
+    transaction.on_commit(push)
+
+
+class SketchesBusy(Exception):
+    """Another merge or rebuild holds the merge lock"""
+
+
+@contextmanager
+def merge_lock(ttl=MERGE_LOCK_TTL, wait=0):
+    """Holds the merge lock, so one merge or rebuild changes sketches at a time
+
+    Args:
+        ttl (int, optional): seconds the lock is held at most.
+        wait (int, optional): seconds to wait for the lock. Defaults to 0.
+
+    Raises:
+        SketchesBusy: the lock is not taken in wait seconds
+    """
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + wait
+    while not REDIS_CLIENT.set(MERGE_LOCK_KEY, token, nx=True, ex=ttl):
+        if time.monotonic() >= deadline:
+            raise SketchesBusy()
+        time.sleep(1)
+    try:
+        yield
+    finally:
+        if REDIS_CLIENT.get(MERGE_LOCK_KEY) == token.encode():
+            REDIS_CLIENT.delete(MERGE_LOCK_KEY)
+
+
+def take_keyword_deltas():
+    """Returns queued deltas and deltas of a failed merge, they stay in
+    MERGING_KEY until they are applied. Call it while holding the merge lock.
+    """
+    if not REDIS_CLIENT.exists(MERGING_KEY):
+        try:
+            REDIS_CLIENT.rename(DELTAS_KEY, MERGING_KEY)
+        except redis.ResponseError:
+            # no delta is queued
+            return {}
+    deltas = {}
+    for field, delta in REDIS_CLIENT.hgetall(MERGING_KEY).items():
+        interval, bucket, channel_id, network_id, keyword = json.loads(field)
+        key = (interval, datetime.fromisoformat(bucket), channel_id, network_id)
+        deltas[(*key, keyword)] = int(delta)
+    return deltas
+
+
+def merge_keyword_deltas():
+    """Applies queued keyword count changes to stored sketches in bulk. Only one
+    merge runs at a time, deltas of a failed merge are merged by the next one.
+
+    Returns:
+        int: number of merged deltas, None if another merge is running
+    """
+    try:
+        with merge_lock():
+            deltas = take_keyword_deltas()
+            add_to_keyword_sketches(deltas)
+            REDIS_CLIENT.delete(MERGING_KEY)
+            return len(deltas)
+    except SketchesBusy:
+        return None
+
+
+def rebuild_keyword_sketches(interval, start, end):
+    """Rebuilds sketches of an interval in a range from keyword rollups, holding
+    the merge lock. Queued deltas of the range are dropped since rollups count
+    them, deltas of other ranges are merged. Deltas that are queued while
+    rollups are read may be counted twice, so sketches still never under count.
+
+    Args:
+        interval (str): one of hourly, daily or monthly
+        start (datetime): start bucket of the range (inclusive)
+        end (datetime): end of the range (exclusive)
+
+    Raises:
+        SketchesBusy: a merge or rebuild holds the lock for REBUILD_LOCK_WAIT seconds
+    """
+    if interval not in SKETCH_INTERVALS:
+        return
+    model = get_network_model("KeywordSketch")
+    rollup_model = get_network_model("KeywordBucketCount")
+    with merge_lock(ttl=REBUILD_LOCK_TTL, wait=REBUILD_LOCK_WAIT):
+        deltas = take_keyword_deltas()
+        add_to_keyword_sketches(
+            {
+                key: delta
+                for key, delta in deltas.items()
+                if key[0] != interval or not start <= key[1] < end
+            }
+        )
+        REDIS_CLIENT.delete(MERGING_KEY)
+        rows = rollup_model.objects.filter(
+            interval=interval,
+            bucket__gte=start,
+            bucket__lt=end,
+            ignored=False,
+            count__gt=0,
+        ).values_list(
+            "interval", "bucket", "channel_id", "network_id", "keyword", "count"
+        )
+        deltas = {tuple(row[:-1]): row[-1] for row in rows.iterator()}
+        with transaction.atomic():
+            model.objects.filter(
+                interval=interval, bucket__gte=start, bucket__lt=end
+            ).delete()
+            add_to_keyword_sketches(deltas)
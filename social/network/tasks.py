@@ -1,43 +1,19 @@
-from io import BytesIO
 import subprocess
-import requests
 
 from django.conf import settings
-from django.db import transaction
 from django.utils import timezone
-from django.core.files.base import File
 from celery import Task
 from celery import shared_task
 from celery.utils.log import get_task_logger
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, Border, Side
 
 from twitter import tasks as twi_tasks
 from linkedin import tasks as lin_tasks
 from reusable.models import get_network_model
+from network import rollups, enrichment, blocking, exports, sketches
 
 
 logger = get_task_logger(__name__)
 
-NER_KEY_MAPPING = {
-    "date": "تاریخ",
-    "time": "زمان",
-    "event": "رویداد",
-    "money": "مالی",
-    "person": "شخص",
-    "percent": "درصد",
-    "product": "محصول",
-    "facility": "تسهیلات",
-    "location": "مکان",
-    "organization": "سازمان",
-    "FAC": "سازه",
-    "ORG": "سازمان",
-    "GPE": "مکان",
-    "LOC": "مکان",
-    "EVENT": "رویداد",
-    "MONEY": "مالی",
-}
-
 
 class BaseTaskWithRetry(Task):
     """A retry policy class for failed tasks
@@ -56,116 +32,102 @@ class BaseTaskWithRetry(Task):
         pass
 
 
-@shared_task(base=BaseTaskWithRetry)
-def extract_keywords(post_id):
-    """We extract keywords for a post by using external service.
-    We call an external api by post body
-    We also consider ignored and blocked words
-    We will delete blocked words
-    We will ignore ignored words (we still save those into db)
+def enqueue_enrichment(post_ids):
+    """Queues new posts for enrichment. Posts are enriched in batches
+    when a batch is full or a few seconds after the first post of a batch.
 
     Args:
-        post_id (int): id of the post
+        post_ids (list): ids of new posts
     """
-    post_model = get_network_model("Post")
-    channel_model = get_network_model("Channel")
-    ignored_model = get_network_model("IgnoredKeyword")
-    blocked_model = get_network_model("BlockedKeyword")
-    keyword_model = get_network_model("Keyword")
+    batch_full, schedule = enrichment.push_pending(post_ids)
+    if batch_full:
+        flush_enrichment_queue.delay()
+    elif schedule:
+        flush_enrichment_queue.apply_async(countdown=enrichment.BATCH_WAIT)
 
-    post = post_model.objects.get(id=post_id)
-    ignored_keywords = list(ignored_model.objects.values_list("keyword", flat=True))
-    blocked_keywords = list(blocked_model.objects.values_list("keyword", flat=True))
 
-    endpoint = None
-    if post.channel.language == channel_model.PERSIAN:
-        endpoint = "http://persian_analyzer_api/v1/app/keyword/"
-    if post.channel.language == channel_model.ENGLISH:
-        endpoint = "http://analyzer_api/api/v1/keyword/"
+@shared_task()
+def flush_enrichment_queue():
+    """Splits pending posts into batches and dispatches a task per batch.
+    It also runs periodically to pick posts that no flush was scheduled for.
+    """
+    while post_ids := enrichment.pop_pending():
+        try:
+            enrich_posts.delay(post_ids)
+        except Exception:
+            # e.g. the broker is down, the next flush dispatches them
+            enrichment.restore_pending(post_ids)
+            raise
 
-    resp = requests.post(endpoint, {"text": post.body}, timeout=5).json()
-    objs = []
-    words = resp["keywords"]
-    if "keyphrases" in resp:
-        words += resp["keyphrases"]
-    for keyword in words:
-        if keyword not in blocked_keywords:
-            ignored = keyword in ignored_keywords
-            objs.append(keyword_model(post=post, keyword=keyword, ignored=ignored))
 
-    keyword_model.objects.bulk_create(objs)
+@shared_task()
+def enrich_posts(post_ids, analyzers=enrichment.ANALYZERS, attempt=1):
+    """We extract keywords, net entities, sentiment and categories of a batch of
+    posts by calling external analyzers concurrently, then we store all results
+    at once. Failed calls are retried later for the failed posts only.
+
+    Args:
+        post_ids (list): ids of the posts
+        analyzers (list, optional): analyzers to run. Defaults to all of them.
+        attempt (int, optional): number of the attempt. Defaults to 1.
+    """
+    failed = enrichment.enrich(post_ids, analyzers)
+    for analyzer, failed_ids in failed.items():
+        if attempt >= enrichment.MAX_ATTEMPTS:
+            logger.error(f"{analyzer} of posts {failed_ids} failed, giving up")
+            continue
+        enrich_posts.apply_async(
+            (failed_ids, [analyzer], attempt + 1),
+            countdown=enrichment.RETRY_DELAY * attempt,
+        )
+
+
+@shared_task()
+def merge_keyword_sketches():
+    """Applies keyword count changes that were queued since the last run to the
+    stored keyword sketches. This is a periodic task.
+    """
+    sketches.merge_keyword_deltas()
 
 
 @shared_task(base=BaseTaskWithRetry)
-def extract_ner(post_id):
-    """We extract net entities by using an external service.
-    We call an external api and send post's body to it and then
-    Store result to db.
+def extract_keywords(post_id):
+    """Extracts keywords of a single post, see enrich_posts
 
     Args:
         post_id (int): id of the post
     """
-    post_model = get_network_model("Post")
-    channel_model = get_network_model("Channel")
+    enrich_posts([post_id], [enrichment.KEYWORDS])
+
+
+@shared_task(base=BaseTaskWithRetry)
+def extract_ner(post_id):
+    """Extracts net entities of a single post, see enrich_posts
 
-    with transaction.atomic():
-        post = post_model.objects.select_for_update().get(id=post_id)
-        endpoint = None
-        if post.channel.language == channel_model.PERSIAN:
-            endpoint = "http://persian_analyzer_api/v1/app/ner/"
-        if post.channel.language == channel_model.ENGLISH:
-            endpoint = "http://analyzer_api/api/v1/ner/"
-        resp = requests.post(endpoint, {"text": post.body}, timeout=5).json()
-        temp = {}
-        for key, _ in NER_KEY_MAPPING.items():
-            if key in resp:
-                temp[NER_KEY_MAPPING[key]] = list(set(resp.pop(key)))
-        post.ner = temp
-        post.save()
+    Args:
+        post_id (int): id of the post
+    """
+    enrich_posts([post_id], [enrichment.NER])
 
 
 @shared_task(base=BaseTaskWithRetry)
 def extract_sentiment(post_id):
-    """We get sentiment by using external api.
-    We send body of a post to the api
+    """Gets sentiment of a single post, see enrich_posts
 
     Args:
         post_id (int): id of the post
     """
-    post_model = get_network_model("Post")
-
-    with transaction.atomic():
-        post = post_model.objects.select_for_update().get(id=post_id)
-        resp = requests.post(
-            "http://persian_analyzer_api/v1/app/sentiment/",
-            {"text": post.body},
-            timeout=5,
-        ).json()
-        post.sentiment = resp
-        post.save()
+    enrich_posts([post_id], [enrichment.SENTIMENT])
 
 
 @shared_task(base=BaseTaskWithRetry)
 def extract_categories(post_id):
-    """We get categories of a post by using external api.
-    We send the body of a post to the api and get result in shape of category_a: 20%
+    """Gets categories of a single post, see enrich_posts
 
     Args:
         post_id (int): id of the post
     """
-    post_model = get_network_model("Post")
-
-    with transaction.atomic():
-        post = post_model.objects.select_for_update().get(id=post_id)
-        resp = requests.post(
-            "http://persian_analyzer_api/v1/app/classification/",
-            {"text": post.body},
-            timeout=5,
-        ).json()
-        sorted_result = sorted(resp, key=lambda k: k["score"], reverse=True)
-        post.category = sorted_result
-        post.main_category_title = sorted_result[0]["label"]
-        post.save()
+    enrich_posts([post_id], [enrichment.CATEGORIES])
 
 
 @shared_task()
@@ -241,70 +203,86 @@ def take_backup(backup_id):
 
 @shared_task()
 def export_channel_list(export_id):
-    """This function create a list of channel in a excel file.
+    """This function create a list of channel in a excel or csv file.
     User can download that file.
 
     Args:
         export_id (int): This is the id of the report.
         (Admin first create report row. then we run this task.)
     """
-    channels = get_network_model("Channel").objects.all()
-    workbook = Workbook()
-    worksheet = workbook.active
-    worksheet.freeze_panes = worksheet["B2"]
-    worksheet.title = "Channel List Report"
-    fields_name = ["Number", "Name", "Network", "Status"]
-
-    for col_num, column_title in enumerate(fields_name, start=1):
-        cell = worksheet.cell(row=1, column=col_num)
-        cell.font = Font(bold=True)
-        cell.alignment = Alignment(horizontal="center")
-        cell.border = Border(bottom=Side(border_style="medium", color="FF000000"))
-        cell.value = column_title
-
-    for row_index, channel in enumerate(channels, start=2):
-        guest_fields = [
-            row_index - 1,
-            channel.name,
-            channel.network.name,
-            channel.status,
-        ]
-        for col_index, column in enumerate(guest_fields, start=1):
-            cell = worksheet.cell(row=row_index, column=col_index)
-            cell.font = Font(bold=True)
-            cell.alignment = Alignment(horizontal="center")
-            cell.value = column
-
-    virtual_workbook = BytesIO()
-    workbook.save(virtual_workbook)
     export = get_network_model("ChannelListExport").objects.get(pk=export_id)
-    export.file.save("excel.xlsx", File(virtual_workbook))
-    export.save()
+    exports.export_channels(export)
+
+
+@shared_task()
+def export_posts(export_id):
+    """Exports posts that match filters of the export to an excel or csv file
+
+    Args:
+        export_id (int): id of the post export
+    """
+    from network.filters import PostFilter  # filters import models of this app
+
+    export = get_network_model("PostExport").objects.get(pk=export_id)
+    filterset = PostFilter(
+        export.filters, queryset=get_network_model("Post").objects.all()
+    )
+    if not filterset.is_valid():
+        logger.error(f"invalid filters of post export {export_id}: {filterset.errors}")
+        return
+    queryset = filterset.qs
+    if "tags" in export.filters:
+        # a channel with several of the tags would repeat its posts
+        queryset = queryset.distinct()
+    exports.export_posts(export, queryset)
 
 
 @shared_task()
-def remove_blocked_keywords():
-    """This function retrieve list of block words then
-    by using them, delete blocked keywords.
+def remove_blocked_keywords(dry_run=False):
+    """Deletes stored keywords that match any blocked keyword after
+    normalization (case and whitespaces) in batches in the database.
+
+    Args:
+        dry_run (bool, optional): only count matching keywords. Defaults to False.
+
+    Returns:
+        dict: stored form of keyword -> number of matching keyword rows
     """
     blocked_model = get_network_model("BlockedKeyword")
+
+    blocked_keywords = blocked_model.objects.values_list("keyword", flat=True)
+    return blocking.purge_keywords(blocked_keywords, dry_run)
+
+
+@shared_task()
+def set_keyword_ignored(keyword, ignored):
+    """Sets ignored flag of stored keywords and their rollups.
+    It runs when an ignored keyword is added, edited or removed.
+
+    Args:
+        keyword (str): the keyword
+        ignored (bool): new ignored flag
+    """
+    ignored_model = get_network_model("IgnoredKeyword")
     keyword_model = get_network_model("Keyword")
 
-    blocked_keywords = list(blocked_model.objects.values_list("keyword", flat=True))
-
-    # for performance consideration, we loop over them in batch mode
-    first_id = keyword_model.objects.first().id
-    last_id = keyword_model.objects.last().id
-    batch_size = 10000
-    current_counter = first_id
-
-    while current_counter < last_id:
-        for item in keyword_model.objects.filter(
-            id__gte=current_counter, id__lte=current_counter + batch_size
-        ):
-            if item.keyword in blocked_keywords:
-                item.delete()
-        current_counter += batch_size
+    if not ignored and ignored_model.objects.filter(keyword=keyword).exists():
+        return
+    keyword_model.objects.filter(keyword=keyword).exclude(ignored=ignored).update(
+        ignored=ignored
+    )
+    rollups.set_keyword_rollups_ignored(keyword, ignored)
+
+
+@shared_task()
+def apply_blocked_keyword(keyword):
+    """Deletes stored keywords of a newly blocked keyword and removes them from
+    keyword rollups. Only rows of this keyword are touched.
+
+    Args:
+        keyword (str): the blocked keyword
+    """
+    blocking.purge_keywords([keyword])
 
 
 @shared_task()
@@ -10,8 +10,14 @@ router.register("post", views.PostViewSet, basename="post")
 router.register("backup", views.BackupViewSet, basename="backup")
 router.register("network", views.NetworkViewSet, basename="network")
 router.register("channel", views.ChannelViewSet, basename="channel")
+router.register("post_export", views.PostExportViewSet, basename="post-export")
 urlpatterns = [
     path("test_error/", views.TestErrorView.as_view()),
+    path(
+        "analyzer_cache/",
+        views.AnalyzerCacheStatsAPIView.as_view(),
+        name="analyzer-cache",
+    ),
     path(
         "count_post/",
         cache_page(20 * 60)(views.PostCountAPIView.as_view()),
@@ -1,14 +1,18 @@
 from operator import or_
 from operator import and_
+from datetime import datetime
 from functools import reduce
 from dateutil.relativedelta import relativedelta
 
 from django.utils import timezone
-from django.db.models import Count, Q
-from django.db.models.functions import TruncDate, TruncHour, TruncMonth
+from django.db.models import Count, F, Q, Sum, Window
+from django.db.models.functions import RowNumber, TruncDate, TruncHour, TruncMonth
 
-from network.models import Network, Channel
+from network.models import Network, Channel, KeywordBucketCount, KeywordSketch
+from network import filters, rollups, sketches
 
+# params that post rollups can not answer, statics of them are built from posts
+ROLLUP_UNSUPPORTED_PARAMS = ("search", "max_id")
 KEYWORD_NUMBER = 20
 CATEGORY_NUMBER = 5
 CHANNEL_NUMBER = 5
@@ -22,6 +26,7 @@ def get_search_modified_qs(apiview, queryset, operator):
             if "search" in apiview.request.GET:
                 words = apiview.request.GET["search"].split(",")
                 words = [word for word in words if len(word) > 1]
+                # body LIKE '%word%' is served by the trigram index of post body
                 if operator == "and":
                     queryset = queryset.filter(
                         reduce(and_, [Q(body__contains=word) for word in words])
@@ -68,127 +73,161 @@ def monthly_iterate(start, finish):
     return result
 
 
-def category_statics(cat_query):
-    cat_query = (
-        cat_query.values("main_category_title")
-        .annotate(count=Count("main_category_title"))
-        .order_by("-count")
-    )
-    categories = []
-    categories_posts = 0
-    for category in cat_query[: min(CATEGORY_NUMBER, len(cat_query))]:
-        categories.append(
-            {
-                "category": category["main_category_title"],
-                "count": category["count"],
-            }
-        )
-        categories_posts += category["count"]
-    return categories_posts, categories
+# interval -> (bucket name, truncate function, bucket iterator, default span)
+STATICS_INTERVALS = {
+    "hourly": ("hour", TruncHour, hourly_iterate, timezone.timedelta(hours=12)),
+    "daily": ("day", TruncDate, daily_iterate, timezone.timedelta(days=7)),
+    "monthly": ("month", TruncMonth, monthly_iterate, relativedelta(months=7)),
+}
 
 
-def get_hourly_statics(queryset, search_excluded_qs, start, end):
-    result = []
-    end = end or (start - timezone.timedelta(hours=12))
-    queryset = queryset.filter(created_at__gte=start, created_at__lte=end)
-    s_e_qs = search_excluded_qs.filter(created_at__gte=start, created_at__lte=end)
-    queryset = (
-        queryset.annotate(hour=TruncHour("created_at"))
-        .values("hour")
+def bucket_key(interval, value):
+    """Normalizes a bucket value so database buckets and iterated buckets match.
+    Database may return dates, local datetimes or utc datetimes for a bucket.
+
+    Args:
+        interval (str): one of hourly, daily or monthly
+        value (date|datetime): start of the bucket
+
+    Returns:
+        hashable: key of the bucket
+    """
+    if isinstance(value, datetime):
+        value = timezone.localtime(value)
+    if interval == "hourly":
+        return value
+    if interval == "daily":
+        return value.date() if isinstance(value, datetime) else value
+    return (value.year, value.month)
+
+
+def top_categories(categories):
+    """Picks the most frequent categories of a bucket
+
+    Args:
+        categories (list): list of {"category", "count"} dicts of a bucket
+
+    Returns:
+        tuple: sum of posts of the picked categories, picked categories
+    """
+    categories = sorted(categories, key=lambda item: item["count"], reverse=True)
+    categories = categories[:CATEGORY_NUMBER]
+    return sum(category["count"] for category in categories), categories
+
+
+def get_statics_rows(queryset, search_excluded_qs, interval, start, end):
+    """Runs the grouped queries that statics of all buckets are built from.
+    Number of queries does not depend on number of buckets, networks or channels.
+
+    Args:
+        queryset (queryset): search filtered posts
+        search_excluded_qs (queryset): posts without search filter
+        interval (str): one of hourly, daily or monthly
+        start (datetime): start of the range
+        end (datetime): end of the range
+
+    Returns:
+        tuple: rows grouped by (bucket, category) and rows grouped by (bucket, channel)
+    """
+    trunc = STATICS_INTERVALS[interval][1]
+    category_rows = (
+        queryset.filter(created_at__gte=start, created_at__lte=end)
+        .annotate(bucket=trunc("created_at"))
+        .values("bucket", "main_category_title")
+        .annotate(count=Count("id"), category_count=Count("main_category_title"))
+        .order_by()
+    )
+    channel_rows = (
+        search_excluded_qs.filter(created_at__gte=start, created_at__lte=end)
+        .annotate(bucket=trunc("created_at"))
+        .values("bucket", "channel_id")
         .annotate(count=Count("id"))
-        .order_by("hour")
+        .order_by()
     )
-    s_e_qs = s_e_qs.annotate(hour=TruncHour("created_at"))
-    for hour in hourly_iterate(start, end):
-        count = queryset.filter(hour__hour=hour.hour, hour__day=hour.day).first()
-        count = count["count"] if count else 0
-        total_count = s_e_qs.filter(hour__hour=hour.hour, hour__day=hour.day).count()
-        temp_result = {"hour": hour, "count": count, "total_count": total_count}
-        cat_query = queryset.filter(hour__hour=hour.hour, hour__day=hour.day)
-        (
-            temp_result["categories_posts"],
-            temp_result["categories"],
-        ) = category_statics(cat_query)
-        networks = {}
-        for network in Network.objects.all():
-            networks[network.name] = s_e_qs.filter(
-                hour__hour=hour.hour, hour__day=hour.day, channel__network=network
-            ).count()
-        temp_result["networks"] = networks
-        channels = {}
-        for channel in Channel.objects.all():
-            channels[channel.name] = s_e_qs.filter(
-                hour__hour=hour.hour, hour__day=hour.day, channel=channel
-            ).count()
-        temp_result["channels"] = channels
-        result.append(temp_result)
-    return result
+    return category_rows, channel_rows
 
 
-def get_daily_statics(queryset, search_excluded_qs, start, end):
+def pivot_statics(interval, start, end, category_rows, channel_rows):
+    """Pivots grouped rows into the statics list of the count apis.
+
+    Args:
+        interval (str): one of hourly, daily or monthly
+        start (datetime): start of the range
+        end (datetime): end of the range
+        category_rows (iterable): rows of bucket, main_category_title and counts
+        channel_rows (iterable): rows of bucket, channel_id, count
+
+    Returns:
+        list: statics of each bucket
+    """
+    name, _, iterate, _ = STATICS_INTERVALS[interval]
+    counts, categories, total_counts, channel_counts = {}, {}, {}, {}
+    for row in category_rows:
+        key = bucket_key(interval, row["bucket"])
+        counts[key] = counts.get(key, 0) + row["count"]
+        categories.setdefault(key, []).append(
+            {"category": row["main_category_title"], "count": row["category_count"]}
+        )
+    for row in channel_rows:
+        key = bucket_key(interval, row["bucket"])
+        total_counts[key] = total_counts.get(key, 0) + row["count"]
+        bucket_channels = channel_counts.setdefault(key, {})
+        bucket_channels[row["channel_id"]] = (
+            bucket_channels.get(row["channel_id"], 0) + row["count"]
+        )
+
+    networks = list(Network.objects.values_list("id", "name"))
+    channels = list(Channel.objects.values_list("id", "name", "network_id"))
     result = []
-    end = end or (start - timezone.timedelta(days=7))
-    queryset = queryset.filter(created_at__gte=start, created_at__lte=end)
-    s_e_qs = search_excluded_qs.filter(created_at__gte=start, created_at__lte=end)
-    queryset = (
-        queryset.annotate(day=TruncDate("created_at"))
-        .values("day")
-        .annotate(count=Count("id"))
-        .order_by("day")
-    )
-    s_e_qs = s_e_qs.annotate(day=TruncDate("created_at"))
-    for day in daily_iterate(start, end):
-        count = queryset.filter(day__month=day.month, day__day=day.day).first()
-        count = count["count"] if count else 0
-        total_count = s_e_qs.filter(day__month=day.month, day__day=day.day).count()
-        temp_result = {"day": day, "count": count, "total_count": total_count}
-        cat_query = queryset.filter(day__month=day.month, day__day=day.day)
+    for bucket in iterate(start, end):
+        key = bucket_key(interval, bucket)
+        temp_result = {
+            name: bucket,
+            "count": counts.get(key, 0),
+            "total_count": total_counts.get(key, 0),
+        }
         (
             temp_result["categories_posts"],
             temp_result["categories"],
-        ) = category_statics(cat_query)
-        for network in Network.objects.all():
-            temp_result[network.name] = s_e_qs.filter(
-                day__month=day.month, day__day=day.day, channel__network=network
-            ).count()
+        ) = top_categories(categories.get(key, []))
+        bucket_channels = channel_counts.get(key, {})
+        network_counts = {}
+        for channel_id, _, network_id in channels:
+            network_counts[network_id] = network_counts.get(
+                network_id, 0
+            ) + bucket_channels.get(channel_id, 0)
+        networks_result = {
+            network_name: network_counts.get(network_id, 0)
+            for network_id, network_name in networks
+        }
+        if interval == "hourly":
+            temp_result["networks"] = networks_result
+            temp_result["channels"] = {
+                channel_name: bucket_channels.get(channel_id, 0)
+                for channel_id, channel_name, _ in channels
+            }
+        else:
+            temp_result.update(networks_result)
         result.append(temp_result)
     return result
 
 
+def get_hourly_statics(queryset, search_excluded_qs, start, end):
+    end = end or (start - STATICS_INTERVALS["hourly"][3])
+    rows = get_statics_rows(queryset, search_excluded_qs, "hourly", start, end)
+    return pivot_statics("hourly", start, end, *rows)
+
+
+def get_daily_statics(queryset, search_excluded_qs, start, end):
+    end = end or (start - STATICS_INTERVALS["daily"][3])
+    rows = get_statics_rows(queryset, search_excluded_qs, "daily", start, end)
+    return pivot_statics("daily", start, end, *rows)
+
+
 def get_monthly_statics(queryset, search_excluded_qs, start, end):
-    result = []
-    end = end or (start - relativedelta(months=7))
-    queryset = queryset.filter(created_at__gte=start, created_at__lte=end)
-    s_e_qs = search_excluded_qs.filter(created_at__gte=start, created_at__lte=end)
-    queryset = (
-        queryset.annotate(month=TruncMonth("created_at"))
-        .values("month")
-        .annotate(count=Count("id"))
-        .order_by("month")
-    )
-    s_e_qs = s_e_qs.annotate(month=TruncMonth("created_at"))
-    for month in monthly_iterate(start, end):
-        count = queryset.filter(
-            month__year=month.year, month__month=month.month
-        ).first()
-        count = count["count"] if count else 0
-        total_count = s_e_qs.filter(
-            month__year=month.year, month__month=month.month
-        ).count()
-        temp_result = {"month": month, "count": count, "total_count": total_count}
-        cat_query = queryset.filter(month__year=month.year, month__month=month.month)
-        (
-            temp_result["categories_posts"],
-            temp_result["categories"],
-        ) = category_statics(cat_query)
-        for network in Network.objects.all():
-            temp_result[network.name] = s_e_qs.filter(
-                month__year=month.year,
-                month__month=month.month,
-                channel__network=network,
-            ).count()
-        result.append(temp_result)
-    return result
+    end = end or (start - STATICS_INTERVALS["monthly"][3])
+    rows = get_statics_rows(queryset, search_excluded_qs, "monthly", start, end)
+    return pivot_statics("monthly", start, end, *rows)
 
 
 def get_count_statics(queryset, search_excluded_qs, interval, start=None, end=None):
@@ -202,80 +241,194 @@ def get_count_statics(queryset, search_excluded_qs, interval, start=None, end=No
     return result
 
 
-def get_keyword_statics(queryset, interval, start=None, end=None):
-    result = []
-    if interval == "hourly":
-        start = start or timezone.localtime()
-        end = end or (start - timezone.timedelta(hours=12))
-        queryset = queryset.filter(created_at__gte=start, created_at__lte=end).annotate(
-            hour=TruncHour("created_at")
+def rollups_applicable(params):
+    return not any(param in params for param in ROLLUP_UNSUPPORTED_PARAMS)
+
+
+def get_rollup_count_statics(params, interval, start=None, end=None):
+    """Same as get_count_statics but reads counts from post rollups.
+    Buckets at the edges of the range are counted completely.
+
+    Args:
+        params (QueryDict): request query params (filters of PostFilter)
+        interval (str): one of hourly, daily or monthly
+        start (datetime, optional): start of the range. Defaults to None.
+        end (datetime, optional): end of the range. Defaults to None.
+
+    Returns:
+        list: statics of each bucket
+    """
+    if interval not in STATICS_INTERVALS:
+        return []
+    end = end or (start - STATICS_INTERVALS[interval][3])
+    queryset = filters.RollupFilter(
+        params,
+        queryset=rollups.get_post_rollup_model(interval).objects.filter(
+            bucket__gte=rollups.bucket_start(interval, start),
+            bucket__lte=end,
+            count__gt=0,
+        ),
+    ).qs
+    category_rows = [
+        {
+            "bucket": row["bucket"],
+            "main_category_title": row["main_category_title"] or None,
+            "count": row["count"],
+            "category_count": row["count"] if row["main_category_title"] else 0,
+        }
+        for row in queryset.values("bucket", "main_category_title")
+        .annotate(count=Sum("count"))
+        .order_by()
+    ]
+    channel_rows = (
+        queryset.values("bucket", "channel_id").annotate(count=Sum("count")).order_by()
+    )
+    return pivot_statics(interval, start, end, category_rows, channel_rows)
+
+
+def top_keyword_rows(rows):
+    """Keeps the most frequent keywords of each bucket by a window function
+
+    Args:
+        rows (queryset): values of bucket, keyword and count grouped by bucket, keyword
+
+    Returns:
+        queryset: at most KEYWORD_NUMBER rows per bucket
+    """
+    return rows.annotate(
+        rank=Window(
+            expression=RowNumber(),
+            partition_by=F("bucket"),
+            order_by=(F("count").desc(), F("keyword").asc()),
         )
-        for hour in hourly_iterate(start, end):
-            temp = queryset.filter(hour__hour=hour.hour, hour__day=hour.day)
-            temp = (
-                temp.values("keyword")
-                .annotate(count=Count("keyword"))
-                .order_by("-count")
-            )
-            keywords = []
-            for keyword in temp[: min(KEYWORD_NUMBER, len(temp))]:
-                keywords.append(
-                    {"keyword": keyword["keyword"], "count": keyword["count"]}
-                )
-            result.append(
-                {
-                    "hour": hour,
-                    "keywords": keywords,
-                }
-            )
-    elif interval == "daily":
-        start = start or timezone.localtime()
-        end = end or (start - timezone.timedelta(days=7))
-        queryset = queryset.filter(created_at__gte=start, created_at__lte=end).annotate(
-            day=TruncDate("created_at")
+    ).filter(rank__lte=KEYWORD_NUMBER)
+
+
+def pivot_keyword_statics(interval, start, end, keyword_rows):
+    """Pivots top keyword rows into the keyword statics list
+
+    Args:
+        interval (str): one of hourly, daily or monthly
+        start (datetime): start of the range
+        end (datetime): end of the range
+        keyword_rows (iterable): rows of bucket, keyword, count
+
+    Returns:
+        list: keywords of each bucket
+    """
+    name, _, iterate, _ = STATICS_INTERVALS[interval]
+    keywords = {}
+    for row in keyword_rows:
+        keywords.setdefault(bucket_key(interval, row["bucket"]), []).append(
+            {"keyword": row["keyword"], "count": row["count"]}
         )
-        for day in daily_iterate(start, end):
-            temp = queryset.filter(day__month=day.month, day__day=day.day)
-            temp = (
-                temp.values("keyword")
-                .annotate(count=Count("keyword"))
-                .order_by("-count")
-            )
-            keywords = []
-            for keyword in temp[: min(KEYWORD_NUMBER, len(temp))]:
-                keywords.append(
-                    {"keyword": keyword["keyword"], "count": keyword["count"]}
-                )
-            result.append(
-                {
-                    "day": day,
-                    "keywords": keywords,
-                }
-            )
-    elif interval == "monthly":
-        start = start or timezone.localtime()
-        end = end or (start - relativedelta(months=7))
-        queryset = queryset.filter(created_at__gte=start, created_at__lte=end).annotate(
-            month=TruncMonth("created_at")
+    result = []
+    for bucket in iterate(start, end):
+        bucket_keywords = keywords.get(bucket_key(interval, bucket), [])
+        bucket_keywords.sort(key=lambda item: item["count"], reverse=True)
+        result.append({name: bucket, "keywords": bucket_keywords})
+    return result
+
+
+def get_keyword_statics(queryset, interval, start=None, end=None):
+    if interval not in STATICS_INTERVALS:
+        return []
+    start = start or timezone.localtime()
+    end = end or (start - STATICS_INTERVALS[interval][3])
+    rows = (
+        queryset.filter(created_at__gte=start, created_at__lte=end)
+        .annotate(bucket=STATICS_INTERVALS[interval][1]("created_at"))
+        .values("bucket", "keyword")
+        .annotate(count=Count("keyword"))
+        .order_by()
+    )
+    return pivot_keyword_statics(interval, start, end, top_keyword_rows(rows))
+
+
+def get_rollup_keyword_statics(
+    params, interval, start=None, end=None, include_ignored=False
+):
+    """Same as get_keyword_statics but reads counts from keyword rollups.
+    Buckets at the edges of the range are counted completely.
+
+    Args:
+        params (QueryDict): request query params (filters of KeywordFilter)
+        interval (str): one of hourly, daily or monthly
+        start (datetime, optional): start of the range. Defaults to None.
+        end (datetime, optional): end of the range. Defaults to None.
+        include_ignored (bool, optional): count ignored keywords. Defaults to False.
+
+    Returns:
+        list: keywords of each bucket
+    """
+    if interval not in STATICS_INTERVALS:
+        return []
+    start = start or timezone.localtime()
+    end = end or (start - STATICS_INTERVALS[interval][3])
+    queryset = KeywordBucketCount.objects.filter(
+        interval=interval,
+        bucket__gte=rollups.bucket_start(interval, start),
+        bucket__lte=end,
+        count__gt=0,
+    )
+    if not include_ignored:
+        queryset = queryset.filter(ignored=False)
+    rows = (
+        filters.RollupFilter(params, queryset=queryset)
+        .qs.values("bucket", "keyword")
+        .annotate(count=Sum("count"))
+        .order_by()
+    )
+    return pivot_keyword_statics(interval, start, end, top_keyword_rows(rows))
+
+
+def get_sketch_keyword_statics(params, interval, start=None, end=None):
+    """Approximate version of get_rollup_keyword_statics that merges Count-Min
+    sketches of channels in each bucket. Each bucket reports its error bounds.
+    Hourly statics are exact because hourly buckets have no sketches.
+
+    Args:
+        params (QueryDict): request query params (filters of KeywordFilter)
+        interval (str): one of hourly, daily or monthly
+        start (datetime, optional): start of the range. Defaults to None.
+        end (datetime, optional): end of the range. Defaults to None.
+
+    Returns:
+        list: keywords and error bounds of each bucket
+    """
+    if interval not in sketches.SKETCH_INTERVALS:
+        return get_rollup_keyword_statics(params, interval, start, end)
+    start = start or timezone.localtime()
+    end = end or (start - STATICS_INTERVALS[interval][3])
+    filtered = filters.RollupFilter(
+        params,
+        queryset=KeywordSketch.objects.filter(
+            interval=interval,
+            bucket__gte=rollups.bucket_start(interval, start),
+            bucket__lte=end,
+        ),
+    ).qs
+    merged = {}
+    for keyword_sketch in KeywordSketch.objects.filter(
+        pk__in=filtered.values("pk")
+    ).iterator():
+        key = bucket_key(interval, keyword_sketch.bucket)
+        sketch = sketches.load_sketch(keyword_sketch)
+        if key in merged:
+            merged[key].merge(sketch)
+        else:
+            merged[key] = sketch
+    name = STATICS_INTERVALS[interval][0]
+    result = []
+    for bucket in STATICS_INTERVALS[interval][2](start, end):
+        sketch = merged.get(bucket_key(interval, bucket), sketches.CountMinSketch())
+        result.append(
+            {
+                name: bucket,
+                "keywords": sketch.top(KEYWORD_NUMBER),
+                "error": sketch.error_bounds(),
+            }
         )
-        for month in monthly_iterate(start, end):
-            temp = queryset.filter(month__year=month.year, month__month=month.month)
-            temp = (
-                temp.values("keyword")
-                .annotate(count=Count("keyword"))
-                .order_by("-count")
-            )
-            keywords = []
-            for keyword in temp[: min(KEYWORD_NUMBER, len(temp))]:
-                keywords.append(
-                    {"keyword": keyword["keyword"], "count": keyword["count"]}
-                )
-            result.append(
-                {
-                    "month": month,
-                    "keywords": keywords,
-                }
-            )
     return result
 
 
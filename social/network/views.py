@@ -2,6 +2,7 @@ import logging
 
 from django.utils import timezone
 from rest_framework.views import APIView
+from rest_framework.response import Response
 from rest_framework.generics import ListAPIView
 from rest_framework import filters as rf_filters
 from rest_framework.viewsets import ModelViewSet
@@ -9,6 +10,7 @@ from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
 
 from . import models, serializers, filters, utils
+from .analyzer_cache import ANALYZER_CACHE
 
 logger = logging.getLogger(__name__)
 
@@ -61,7 +63,7 @@ class PostViewSet(ModelViewSet):
     pagination_class = ListPagination
     filter_backends = [
         DjangoFilterBackend,
-        rf_filters.SearchFilter,
+        filters.PostSearchFilter,
         rf_filters.OrderingFilter,
     ]
     search_fields = ["body"]
@@ -81,15 +83,19 @@ class PostCountAPIView(ListAPIView):
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
         response = super().list(request)
-        qs = self.filter_queryset(self.get_queryset())
-        search_excluded_qs = utils.get_search_excluded_qs(self)
-        response.data["statics"] = utils.get_count_statics(
-            qs,
-            search_excluded_qs,
-            data["type"],
-            data["date_after"],
-            data["date_before"],
-        )
+        if utils.rollups_applicable(request.GET):
+            response.data["statics"] = utils.get_rollup_count_statics(
+                request.GET, data["type"], data["date_after"], data["date_before"]
+            )
+        else:
+            search_excluded_qs = utils.get_search_excluded_qs(self)
+            response.data["statics"] = utils.get_count_statics(
+                self.filter_queryset(self.get_queryset()),
+                search_excluded_qs,
+                data["type"],
+                data["date_after"],
+                data["date_before"],
+            )
         today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
         response.data["today_posts"] = (
             self.get_queryset().filter(created_at__gte=today).count()
@@ -131,20 +137,34 @@ class SearchCountAPIView(ListAPIView):
         data = serializer.validated_data
         response = super().list(request)
         qs = self.filter_queryset(self.get_queryset())
-        search_excluded_qs = utils.get_search_excluded_qs(self)
-        response.data["statics"] = utils.get_count_statics(
-            qs,
-            search_excluded_qs,
-            data["type"],
-            data["date_after"],
-            data["date_before"],
-        )
-        response.data["keyword_statics"] = utils.get_keyword_statics(
-            models.Keyword.objects.filter(post__in=qs),
-            data["type"],
-            data["date_after"],
-            data["date_before"],
-        )
+        if utils.rollups_applicable(request.GET):
+            response.data["statics"] = utils.get_rollup_count_statics(
+                request.GET, data["type"], data["date_after"], data["date_before"]
+            )
+        else:
+            search_excluded_qs = utils.get_search_excluded_qs(self)
+            response.data["statics"] = utils.get_count_statics(
+                qs,
+                search_excluded_qs,
+                data["type"],
+                data["date_after"],
+                data["date_before"],
+            )
+        if utils.rollups_applicable(request.GET):
+            response.data["keyword_statics"] = utils.get_rollup_keyword_statics(
+                request.GET,
+                data["type"],
+                data["date_after"],
+                data["date_before"],
+                include_ignored=True,
+            )
+        else:
+            response.data["keyword_statics"] = utils.get_keyword_statics(
+                models.Keyword.objects.filter(post__in=qs),
+                data["type"],
+                data["date_after"],
+                data["date_before"],
+            )
         temp = utils.get_channels_statistics(qs)
         temp["all_enabled_channels_count"] = models.Channel.objects.filter(
             status=True
@@ -169,9 +189,13 @@ class KeywordAPIView(ListAPIView):
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
         response = super().list(request)
-        queryset = self.filter_queryset(self.get_queryset())
-        response.data["statics"] = utils.get_keyword_statics(
-            queryset, data["type"], data["date_after"], data["date_before"]
+        get_statics = (
+            utils.get_sketch_keyword_statics
+            if data["approx"]
+            else utils.get_rollup_keyword_statics
+        )
+        response.data["statics"] = get_statics(
+            request.GET, data["type"], data["date_after"], data["date_before"]
         )
         return response
 
@@ -184,6 +208,18 @@ class BackupViewSet(ModelViewSet):
     filterset_fields = ["type", "status"]
 
 
+class AnalyzerCacheStatsAPIView(APIView):
+    def get(self, _request):
+        return Response(ANALYZER_CACHE.stats())
+
+
+class PostExportViewSet(ModelViewSet):
+    queryset = models.PostExport.objects.order_by("-id")
+    serializer_class = serializers.PostExportSerializer
+    pagination_class = ListPagination
+    http_method_names = ["get", "post", "head", "options"]
+
+
 class TestErrorView(APIView):
     def get(self, _request):
         logger.error("Logger error executed for test purposes!")
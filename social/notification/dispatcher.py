@@ -0,0 +1,214 @@
+import json
+import time
+import uuid
+import logging
+
+import httpx
+import redis
+
+from notification import models, utils
+from reusable.cache import LocalCache
+
+logger = logging.getLogger(__name__)
+
+# same db as enrichment queue, db 5 and db 15 are flushed by other jobs
+REDIS_CLIENT = redis.Redis(host="social_redis", port=6379, db=6)
+QUEUE_KEY = "notification:queue:{chat}"
+# chat -> time its next message is due
+READY_KEY = "notification:ready"
+# chat -> theoretical arrival time of its rate limiter
+TAT_KEY = "notification:tat"
+LOCK_KEY = "notification:dispatcher"
+SCHEDULED_KEY = "notification:scheduled"
+LOCK_TTL = 60
+# a dispatcher sends for RUN_TIME seconds, then it is scheduled again
+RUN_TIME = 50
+SCHEDULE_TTL = 5
+IDLE_WAIT = 1
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 30
+# telegram allows about 30 messages a second by a bot, 20 messages a minute to
+# a group or channel and one message a second to a private chat
+GLOBAL_INTERVAL = 1 / 30
+GROUP_INTERVAL = 60 / 20
+GROUP_BURST = 1
+PRIVATE_INTERVAL = 1
+PRIVATE_BURST = 1
+# bot and channel records are cached in process for RECORDS_TTL seconds
+RECORDS_TTL = 300
+RECORDS = LocalCache(size=256, ttl=RECORDS_TTL)
+
+
+def get_bot_token():
+    token = RECORDS.get("bot")
+    if token is None:
+        bot = models.TelegramBot.objects.last()
+        token = bot.telegram_token if bot is not None else ""
+        RECORDS.set("bot", token)
+    return token or None
+
+
+def get_channel_chat(channel_pk):
+    """Returns username of an output channel, cached for RECORDS_TTL seconds"""
+    key = f"channel:{channel_pk}"
+    chat = RECORDS.get(key)
+    if chat is None:
+        chat = models.Channel.objects.values_list("username", flat=True).get(
+            pk=channel_pk
+        )
+        RECORDS.set(key, chat)
+    return chat
+
+
+def get_account_chats():
+    """Returns chat ids of telegram accounts, cached for RECORDS_TTL seconds"""
+    chats = RECORDS.get("accounts")
+    if chats is None:
+        chats = list(models.TelegramAccount.objects.values_list("chat_id", flat=True))
+        RECORDS.set("accounts", chats)
+    return chats
+
+
+def get_limits(chat):
+    """Returns interval and burst of messages to a chat, chat ids of users are
+    positive numbers and groups or channels have negative ids or usernames
+    """
+    if chat.isdigit():
+        return PRIVATE_INTERVAL, PRIVATE_BURST
+    return GROUP_INTERVAL, GROUP_BURST
+
+
+def enqueue(chat, text):
+    """Adds a message to the queue of a chat
+
+    Args:
+        chat (str): chat id or username
+        text (str): html text of the message
+
+    Returns:
+        bool: whether a dispatcher should be started
+    """
+    pipe = REDIS_CLIENT.pipeline()
+    pipe.rpush(QUEUE_KEY.format(chat=chat), json.dumps({"text": text, "attempt": 1}))
+    pipe.zadd(READY_KEY, {chat: time.time()}, nx=True)
+    pipe.set(SCHEDULED_KEY, 1, nx=True, ex=SCHEDULE_TTL)
+    return bool(pipe.execute()[-1])
+
+
+def allowed_at(chat):
+    """Returns the time a message to chat is allowed, a generic cell rate
+    algorithm that is a token bucket of burst tokens refilled every interval
+    """
+    interval, burst = get_limits(chat)
+    tat = float(REDIS_CLIENT.hget(TAT_KEY, chat) or 0)
+    return tat - (burst - 1) * interval
+
+
+def consume(chat, now):
+    interval, _ = get_limits(chat)
+    tat = max(float(REDIS_CLIENT.hget(TAT_KEY, chat) or 0), now) + interval
+    REDIS_CLIENT.hset(TAT_KEY, chat, tat)
+
+
+def block(chat, seconds):
+    """Allows no message to chat for seconds, e.g. telegram asked to retry after"""
+    interval, burst = get_limits(chat)
+    REDIS_CLIENT.hset(TAT_KEY, chat, time.time() + seconds + (burst - 1) * interval)
+
+
+def reschedule(chat, at):
+    queue = QUEUE_KEY.format(chat=chat)
+    if not REDIS_CLIENT.llen(queue):
+        REDIS_CLIENT.zrem(READY_KEY, chat)
+        # a message may be queued between the two calls
+        if not REDIS_CLIENT.llen(queue):
+            return
+    REDIS_CLIENT.zadd(READY_KEY, {chat: at})
+
+
+def send_next(chat):
+    """Sends the first message of a chat and schedules the next one"""
+    queue = QUEUE_KEY.format(chat=chat)
+    raw = REDIS_CLIENT.lpop(queue)
+    if raw is None:
+        reschedule(chat, time.time())
+        return
+    message = json.loads(raw)
+    token = get_bot_token()
+    try:
+        if token is None:
+            raise ValueError("no telegram bot is defined")
+        response = utils.telegram_bot_send_text(token, chat, message["text"])
+    except (httpx.HTTPError, ValueError) as error:
+        if message["attempt"] >= MAX_ATTEMPTS:
+            logger.error("message to %s is dropped: %s", chat, error)
+            reschedule(chat, allowed_at(chat))
+            return
+        logger.warning("message to %s failed, it is retried: %s", chat, error)
+        REDIS_CLIENT.lpush(
+            queue, json.dumps({**message, "attempt": message["attempt"] + 1})
+        )
+        reschedule(chat, time.time() + RETRY_DELAY * message["attempt"])
+        return
+
+    retry_after = (response.get("parameters") or {}).get("retry_after")
+    if retry_after:
+        # rate limited messages are sent again in their order
+        REDIS_CLIENT.lpush(queue, raw)
+        block(chat, retry_after)
+    elif response.get("ok"):
+        consume(chat, time.time())
+    else:
+        logger.error(
+            "message to %s was not sent: %s\n\nmessage was: %s",
+            chat,
+            response.get("description"),
+            message["text"],
+        )
+    reschedule(chat, allowed_at(chat))
+
+
+def seconds_to_next():
+    """Returns seconds until the next due message, None if no message is queued"""
+    first = REDIS_CLIENT.zrange(READY_KEY, 0, 0, withscores=True)
+    if not first:
+        return None
+    return max(first[0][1] - time.time(), 0)
+
+
+def dispatch(run_time=RUN_TIME):
+    """Sends due messages of all chats within the limits of each chat and of the
+    bot for run_time seconds. Only one dispatcher runs at a time.
+
+    Returns:
+        float: seconds until the next due message, None if no message is
+        queued or another dispatcher is running
+    """
+    token = uuid.uuid4().hex
+    if not REDIS_CLIENT.set(LOCK_KEY, token, nx=True, ex=LOCK_TTL):
+        return None
+    try:
+        deadline = time.monotonic() + run_time
+        next_send = 0
+        while time.monotonic() < deadline:
+            REDIS_CLIENT.expire(LOCK_KEY, LOCK_TTL)
+            now = time.time()
+            due = REDIS_CLIENT.zrangebyscore(READY_KEY, "-inf", now, start=0, num=1)
+            if not due:
+                wait = seconds_to_next()
+                if wait is None:
+                    return None
+                time.sleep(min(wait, IDLE_WAIT))
+                continue
+            chat = due[0].decode()
+            chat_allowed_at = allowed_at(chat)
+            if chat_allowed_at > now:
+                REDIS_CLIENT.zadd(READY_KEY, {chat: chat_allowed_at})
+                continue
+            time.sleep(max(next_send - time.monotonic(), 0))
+            next_send = time.monotonic() + GLOBAL_INTERVAL
+            send_next(chat)
+        return seconds_to_next()
+    finally:
+        if REDIS_CLIENT.get(LOCK_KEY) == token.encode():
+            REDIS_CLIENT.delete(LOCK_KEY)
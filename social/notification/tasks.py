@@ -1,57 +1,45 @@
-import traceback
-import importlib
-
 from celery import shared_task
 from celery.utils.log import get_task_logger
 
-from . import models, utils
+from . import dispatcher
 
 logger = get_task_logger(__name__)
 
 
+def notify(chat, message):
+    if dispatcher.enqueue(chat, message):
+        dispatch_notifications.delay()
+
+
 @shared_task()
 def send_telegram_message(message):
-    """This function gets a string message and sends it to all defined accounts.
+    """This function gets a string message and queues it for all defined accounts.
 
     Args:
         message (str): text message
-
-    Raises:
-        Exception: if sending message was not successful.
     """
-    bot = models.TelegramBot.objects.last()
-    accounts = models.TelegramAccount.objects.all()
-    for account in accounts:
-        resp = utils.telegram_bot_send_text(
-            bot.telegram_token, account.chat_id, message
-        )
-        if not resp["ok"]:
-            logger.error("%s\n\n%s", traceback.format_exc(), resp["description"])
+    for chat in dispatcher.get_account_chats():
+        notify(chat, message)
 
 
 @shared_task()
 def send_message_to_telegram_channel(message, channel_pk):
-    """This function gets a string message and sends it to specific channel.
+    """This function gets a string message and queues it for specific channel.
+    Messages are sent by dispatch_notifications, so crawlers do not wait for
+    telegram or its rate limits.
 
     Args:
         message (str): text message
         channel_pk (int): id of destination channel (Channel)
+    """
+    notify(dispatcher.get_channel_chat(channel_pk), message)
+
 
-    Raises:
-        Exception: if sending message was not successful.
+@shared_task()
+def dispatch_notifications():
+    """Sends queued messages within telegram rate limits. It also runs periodically
+    to pick messages that no dispatcher was started for.
     """
-    channel_model_module = importlib.import_module("notification.models")
-    channel_class = channel_model_module.Channel
-
-    bot = models.TelegramBot.objects.last()
-    channel_output = channel_class.objects.get(pk=channel_pk)
-    resp = utils.telegram_bot_send_text(
-        bot.telegram_token, channel_output.username, message
-    )
-    if not resp["ok"]:
-        logger.error(
-            "%s\n\nmessage was: %s\n\n%s",
-            traceback.format_exc(),
-            message,
-            resp["description"],
-        )
+    wait = dispatcher.dispatch()
+    if wait is not None:
+        dispatch_notifications.apply_async(countdown=wait)
@@ -1,19 +1,42 @@
-import requests
+import os
+
+import httpx
+
+TELEGRAM_API = "https://api.telegram.org/bot{token}/sendMessage"
+TELEGRAM_TIMEOUT = 10
+# per process state, celery workers fork after this module is imported
+_STATE = {"pid": None}
 
 
 def telegram_text_purify(text: str):
     return text.replace("#", "-").replace("&", "-")
 
 
+def get_client():
+    """Returns the http client of the process, its connections are kept alive"""
+    if _STATE["pid"] != os.getpid():
+        _STATE.update(pid=os.getpid(), client=httpx.Client(timeout=TELEGRAM_TIMEOUT))
+    return _STATE["client"]
+
+
 def telegram_bot_send_text(token, chat_id, message):
-    send_text = (
-        "https://api.telegram.org/bot"
-        + token
-        + "/sendMessage?chat_id="
-        + chat_id
-        + "&text="
-        + message
-        + "&parse_mode=html"
+    """Sends a message to a chat by a bot
+
+    Args:
+        token (str): token of the bot
+        chat_id (str): id or username of the chat
+        message (str): html text
+
+    Raises:
+        httpx.HTTPError: the request failed
+        ValueError: the response is not json
+
+    Returns:
+        dict: response of telegram, "ok" is False for errors and
+        parameters.retry_after is set when the chat is rate limited
+    """
+    response = get_client().post(
+        TELEGRAM_API.format(token=token),
+        data={"chat_id": chat_id, "text": message, "parse_mode": "html"},
     )
-    response = requests.get(send_text, timeout=10)
     return response.json()
@@ -0,0 +1,84 @@
+import json
+import time
+from pathlib import Path
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+
+class ParserBenchmarkCommand(BaseCommand):
+    """Base of commands that benchmark lxml parsers of an app, see reusable.parsing.
+    Subclasses set app, snapshots and captured.
+    """
+
+    help = (
+        "Parses stored html snapshots of crawled pages by the lxml parsers, "
+        "compares results with the expected ones and measures parse time. "
+        "It needs no browser or network."
+    )
+    # app that keeps the snapshots in its snapshots directory
+    app = None
+    # snapshot in snapshots directory of the app, parser
+    snapshots = ()
+    # prefix of pages saved in CRAWLER_SNAPSHOT_DIR -> parser
+    captured = {}
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=50)
+        parser.add_argument(
+            "--update",
+            action="store_true",
+            help="write current results as the expected ones",
+        )
+        parser.add_argument(
+            "--captured",
+            help="also parse pages saved in this directory (CRAWLER_SNAPSHOT_DIR)",
+        )
+
+    def handle(self, *args, **options):
+        mismatches = []
+        app = self.app
+        for name, parse in self.snapshots:
+            path = Path(apps.get_app_config(app).path) / "snapshots" / name
+            source = path.read_text(encoding="utf-8")
+            result, seconds = self.measure(parse, source, options["repeat"])
+            expected_path = path.with_name(f"{path.stem}.{parse.__name__}.json")
+            if options["update"]:
+                expected_path.write_text(
+                    json.dumps(result, ensure_ascii=False, indent=2) + "\n",
+                    encoding="utf-8",
+                )
+                status = "updated"
+            elif json.loads(expected_path.read_text(encoding="utf-8")) == result:
+                status = "ok"
+            else:
+                status = "MISMATCH"
+                mismatches.append(f"{app}/{name} {parse.__name__}")
+            self.report(f"{app}/{name} {parse.__name__}", result, seconds, status)
+
+        if options["captured"]:
+            for path in sorted(Path(options["captured"]).glob("*.html")):
+                prefix = path.stem.rsplit("-", 3)[0]
+                if prefix not in self.captured:
+                    continue
+                source = path.read_text(encoding="utf-8")
+                result, seconds = self.measure(
+                    self.captured[prefix], source, options["repeat"]
+                )
+                self.report(path.name, result, seconds, "captured")
+
+        if mismatches:
+            raise CommandError(f"parsers changed results of: {', '.join(mismatches)}")
+
+    @staticmethod
+    def measure(parse, source, repeat):
+        started = time.perf_counter()
+        for _ in range(max(repeat, 1)):
+            result = parse(source)
+        return result, (time.perf_counter() - started) / max(repeat, 1)
+
+    def report(self, name, result, seconds, status):
+        items = len(result) if isinstance(result, list) else 1
+        self.stdout.write(
+            f"{name}: {items} items, {seconds * 1000:.2f}ms per page, {status}"
+        )
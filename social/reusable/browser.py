@@ -1,23 +1,62 @@
-import time
+from pathlib import Path
 
-SCROLL_PAUSE_TIME = 2
+from django.conf import settings
+from django.utils import timezone
 
+from reusable.waits import wait_for, height_changed
 
-def scroll(driver, counter):
-    """Scroll browser for counter times
+# seconds to wait for new content after a scroll, the page ends when none arrives
+SCROLL_TIMEOUT = 4
+LXML = "lxml"
+
+
+def scroll(driver, counter, enough=None):
+    """Scroll browser for at most counter times. After each scroll it waits
+    until new content is loaded instead of a fixed pause and it stops when no
+    new content arrives or enough items are loaded.
 
     Args:
         driver (webdriver): webdriver object
         counter (int): specify number of scrolls
+        enough (callable, optional): gets the driver and returns True when
+            enough items are loaded, e.g. unseen posts
     """
 
     last_height = driver.execute_script("return document.body.scrollHeight")
-    scroll_counter = 0
-    while True:
+    for _ in range(counter + 1):
+        if enough is not None and enough(driver):
+            break
         driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(SCROLL_PAUSE_TIME)
-        new_height = driver.execute_script("return document.body.scrollHeight")
-        scroll_counter += 1
-        if new_height == last_height or scroll_counter > counter:
+        new_height = wait_for(
+            driver, height_changed(last_height), SCROLL_TIMEOUT, "new content"
+        )
+        if new_height is None:
             break
         last_height = new_height
+
+
+def parses_page_source():
+    """Whether crawlers parse page sources by lxml instead of reading pages by
+    javascript in the browser (CRAWLER_PAGE_PARSER setting)
+    """
+    return settings.CRAWLER_PAGE_PARSER == LXML
+
+
+def page_source(driver, name):
+    """Returns html of the current page in one round trip. It is saved to
+    CRAWLER_SNAPSHOT_DIR when the setting is set.
+
+    Args:
+        driver (webdriver): webdriver object
+        name (str): name of the page, prefix of the snapshot file
+
+    Returns:
+        str: html of the page
+    """
+    source = driver.page_source
+    if settings.CRAWLER_SNAPSHOT_DIR:
+        directory = Path(settings.CRAWLER_SNAPSHOT_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        stamp = timezone.localtime().strftime("%Y%m%d-%H%M%S-%f")
+        (directory / f"{name}-{stamp}.html").write_text(source, encoding="utf-8")
+    return source
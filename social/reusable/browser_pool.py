@@ -0,0 +1,390 @@
+import os
+import time
+import uuid
+import logging
+import threading
+import traceback
+from contextlib import contextmanager
+
+import redis
+from urllib3.exceptions import MaxRetryError
+from django.conf import settings
+from celery.signals import worker_process_shutdown
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
+
+logger = logging.getLogger(__name__)
+
+SELENIUM_HUB = "http://social_firefox:4444/wd/hub"
+# db 5 is flushed by linkedin duplicate checker and db 15 by views cache
+REDIS_CLIENT = redis.Redis(host="social_redis", port=6379, db=6)
+SLOTS_KEY = "browser:slots"
+# set while a lease is waiting for capacity, workers then close their idle sessions
+WANTED_KEY = "browser:wanted"
+# a slot is held as long as its session is open (leased or idle), the reaper of
+# its worker extends it. Slots of crashed workers expire, the grid kills their
+# sessions after its own timeout.
+SLOT_TTL = 10 * 60
+# idle sessions are closed before the grid session timeout (300s) kills them
+IDLE_TIMEOUT = 4 * 60
+MAX_AGE = 60 * 60
+LEASE_TIMEOUT = 60
+LEASE_POLL = 2
+REAP_INTERVAL = 10
+
+# KEYS[1]: slots, ARGV: now, expires at, token, network, capacity, network capacity
+ACQUIRE_SCRIPT = """
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", ARGV[1])
+local members = redis.call("ZRANGE", KEYS[1], 0, -1)
+if #members >= tonumber(ARGV[5]) then
+    return 0
+end
+local prefix = ARGV[4] .. ":"
+local used = 0
+for _, member in ipairs(members) do
+    if string.sub(member, 1, #prefix) == prefix then
+        used = used + 1
+    end
+end
+if used >= tonumber(ARGV[6]) then
+    return 0
+end
+redis.call("ZADD", KEYS[1], ARGV[2], ARGV[3])
+return 1
+"""
+
+
+class BrowserUnavailable(Exception):
+    """No browser session could be leased in time"""
+
+
+class SessionSlots:
+    """Counts open browser sessions of all workers against the grid capacity.
+    Every session holds a slot, a member of a sorted set scored by its expiry.
+    """
+
+    def __init__(self, client=REDIS_CLIENT, key=SLOTS_KEY, ttl=SLOT_TTL):
+        self.client = client
+        self.key = key
+        self.ttl = ttl
+        self.script = client.register_script(ACQUIRE_SCRIPT)
+
+    def acquire(self, network, capacity, network_capacity, token=None):
+        """Takes a slot if the grid and the network have free capacity
+
+        Args:
+            token (str, optional): token of a lost slot of an open session.
+
+        Returns:
+            str: token of the slot, None if there is no free slot
+        """
+        token = token or f"{network}:{uuid.uuid4().hex}"
+        now = time.time()
+        args = [now, now + self.ttl, token, network, capacity, network_capacity]
+        if self.script(keys=[self.key], args=args):
+            return token
+        return None
+
+    def refresh(self, *tokens):
+        """Extends slots that are still held, an expired slot is not taken again
+
+        Returns:
+            int: number of extended slots
+        """
+        if not tokens:
+            return 0
+        expires_at = time.time() + self.ttl
+        return self.client.zadd(
+            self.key, dict.fromkeys(tokens, expires_at), xx=True, ch=True
+        )
+
+    def release(self, token):
+        self.client.zrem(self.key, token)
+
+    def usage(self):
+        """Returns number of open sessions of each network"""
+        self.client.zremrangebyscore(self.key, "-inf", time.time())
+        result = {}
+        for member in self.client.zrange(self.key, 0, -1):
+            network = member.decode().split(":")[0]
+            result[network] = result.get(network, 0) + 1
+        return result
+
+
+SLOTS = SessionSlots()
+
+
+def create_driver():
+    """Opens a new session on the selenium grid
+
+    Raises:
+        BrowserUnavailable: the grid did not create the session
+
+    Returns:
+        WebDriver: webdriver browser
+    """
+    try:
+        return webdriver.Remote(
+            SELENIUM_HUB,
+            DesiredCapabilities.FIREFOX,
+            options=webdriver.FirefoxOptions(),
+        )
+    except (WebDriverException, MaxRetryError) as error:
+        logger.info("Error: %s\n\n%s", error, traceback.format_exc())
+        raise BrowserUnavailable(str(error)) from error
+
+
+def is_healthy(driver):
+    try:
+        driver.execute_script("return document.readyState")
+        return True
+    except WebDriverException:
+        return False
+
+
+def quit_driver(driver):
+    try:
+        driver.quit()
+    except WebDriverException:
+        logger.info("quitting a dead browser session failed", exc_info=True)
+
+
+class Session:
+    def __init__(self, driver, token):
+        self.driver = driver
+        self.token = token
+        self.uses = 0
+        self.created_at = time.monotonic()
+        self.released_at = self.created_at
+
+
+class BrowserPool:
+    """Keeps warm, authenticated browser sessions of a network and leases them
+    to tasks. Sessions are reused by the tasks of a worker process, they are
+    health checked before each lease and recycled after
+    BROWSER_SESSION_MAX_USES leases.
+    Open sessions of all workers are limited by the grid capacity
+    (BROWSER_MAX_SESSIONS) and by the capacity of the network.
+
+    Args:
+        network (str): name of the network, e.g. linkedin
+        warm_up (callable): gets a new driver and prepares it, e.g. loads cookies
+        capacity (int, optional): max open sessions of the network. Defaults to
+            the grid capacity.
+    """
+
+    def __init__(self, network, warm_up, capacity=None):
+        self.network = network
+        self.warm_up = warm_up
+        self.capacity = capacity
+        self.idle = []
+        self.leased = set()
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        POOLS.append(self)
+
+    def check_fork(self):
+        # celery workers fork after pools are created, sessions of the parent
+        # belong to it
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.idle = []
+            self.leased = set()
+
+    def get_capacity(self):
+        grid_capacity = settings.BROWSER_MAX_SESSIONS
+        return grid_capacity, min(self.capacity or grid_capacity, grid_capacity)
+
+    def is_expired(self, session):
+        now = time.monotonic()
+        return (
+            session.uses >= settings.BROWSER_SESSION_MAX_USES
+            or now - session.created_at > MAX_AGE
+            or now - session.released_at > IDLE_TIMEOUT
+        )
+
+    def close(self, session):
+        quit_driver(session.driver)
+        SLOTS.release(session.token)
+
+    def keep_slot(self, session):
+        """Extends the slot of a session, or takes it again if it expired while
+        the session was open, e.g. redis was down
+
+        Returns:
+            bool: whether the session holds a slot
+        """
+        if SLOTS.refresh(session.token):
+            return True
+        logger.warning("slot of a %s browser session expired", self.network)
+        return (
+            SLOTS.acquire(self.network, *self.get_capacity(), token=session.token)
+            is not None
+        )
+
+    def refresh_slots(self):
+        """Extends slots of open sessions of the pool, leases may last longer
+        than SLOT_TTL
+        """
+        with self.lock:
+            self.check_fork()
+            tokens = [session.token for session in self.idle]
+            tokens += [session.token for session in self.leased]
+        SLOTS.refresh(*tokens)
+
+    def take_idle(self):
+        """Returns a healthy idle session, expired and broken ones are closed"""
+        while True:
+            with self.lock:
+                self.check_fork()
+                if not self.idle:
+                    return None
+                session = self.idle.pop()
+            if (
+                not self.is_expired(session)
+                and is_healthy(session.driver)
+                and self.keep_slot(session)
+            ):
+                return session
+            self.close(session)
+
+    def open(self):
+        """Opens and warms up a new session if a slot is free
+
+        Returns:
+            Session: the new session, None if there is no free slot
+        """
+        token = SLOTS.acquire(self.network, *self.get_capacity())
+        if token is None:
+            close_idle_sessions(exclude=self)
+            token = SLOTS.acquire(self.network, *self.get_capacity())
+            if token is None:
+                return None
+        try:
+            driver = create_driver()
+        except BrowserUnavailable:
+            SLOTS.release(token)
+            raise
+        try:
+            self.warm_up(driver)
+        except Exception:
+            quit_driver(driver)
+            SLOTS.release(token)
+            raise
+        logger.info("opened a %s browser session", self.network)
+        return Session(driver, token)
+
+    def acquire(self, timeout=LEASE_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        while True:
+            session = self.take_idle() or self.open()
+            if session is not None:
+                with self.lock:
+                    self.leased.add(session)
+                start_reaper()
+                return session
+            REDIS_CLIENT.set(WANTED_KEY, self.network, ex=REAP_INTERVAL * 2)
+            if time.monotonic() >= deadline:
+                raise BrowserUnavailable(
+                    f"no free browser session for {self.network} in {timeout}s"
+                )
+            time.sleep(LEASE_POLL)
+
+    def release(self, session, broken=False):
+        with self.lock:
+            self.leased.discard(session)
+        session.uses += 1
+        session.released_at = time.monotonic()
+        if broken or self.is_expired(session) or not self.keep_slot(session):
+            self.close(session)
+            return
+        with self.lock:
+            self.idle.append(session)
+
+    @contextmanager
+    def lease(self, timeout=LEASE_TIMEOUT):
+        """Leases a session for a with block and returns it to the pool after.
+        The session is discarded if the block fails with a webdriver error.
+
+        Args:
+            timeout (int, optional): seconds to wait for a free session.
+
+        Raises:
+            BrowserUnavailable: no session was free in time
+
+        Yields:
+            WebDriver: webdriver browser
+        """
+        session = self.acquire(timeout)
+        try:
+            yield session.driver
+        except WebDriverException:
+            self.release(session, broken=True)
+            raise
+        except BaseException:
+            self.release(session, broken=not is_healthy(session.driver))
+            raise
+        self.release(session)
+
+    def close_idle(self, expired_only=False):
+        """Closes idle sessions of the pool
+
+        Args:
+            expired_only (bool, optional): keep sessions that can be reused.
+        """
+        with self.lock:
+            self.check_fork()
+            sessions = [
+                session
+                for session in self.idle
+                if not expired_only or self.is_expired(session)
+            ]
+            self.idle = [session for session in self.idle if session not in sessions]
+        for session in sessions:
+            self.close(session)
+        return len(sessions)
+
+
+POOLS = []
+# per process reaper thread, see start_reaper
+_REAPER = {"pid": None}
+
+
+def reap():
+    while True:
+        time.sleep(REAP_INTERVAL)
+        try:
+            wanted = REDIS_CLIENT.exists(WANTED_KEY)
+        except redis.RedisError:
+            wanted = False
+        for pool in POOLS:
+            try:
+                pool.close_idle(expired_only=not wanted)
+                pool.refresh_slots()
+            except redis.RedisError:
+                logger.warning("reaping browser sessions failed", exc_info=True)
+
+
+def start_reaper():
+    """Starts a thread that closes idle sessions of this process when they expire
+    or when a lease of another worker is waiting for capacity. Otherwise idle
+    sessions of a worker that gets no tasks would hold their slots. It also
+    extends slots of open sessions, so a long lease keeps its slot.
+    """
+    if _REAPER["pid"] != os.getpid():
+        _REAPER["pid"] = os.getpid()
+        threading.Thread(target=reap, name="browser-reaper", daemon=True).start()
+
+
+def close_idle_sessions(exclude=None):
+    """Closes idle sessions of other pools of this process to free their slots"""
+    for pool in POOLS:
+        if pool is not exclude:
+            pool.close_idle()
+
+
+@worker_process_shutdown.connect
+def close_all_sessions(*_args, **_kwargs):
+    for pool in POOLS:
+        pool.close_idle()
@@ -0,0 +1,45 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+
+WHITESPACES = re.compile(r"\s+")
+
+
+def normalize(text):
+    return WHITESPACES.sub(" ", text).strip()
+
+
+class LocalCache:
+    """Thread safe in-process LRU cache with expiry
+
+    Args:
+        size (int): items that are kept at most, least recently used ones are
+        dropped first
+        ttl (float): seconds an item is kept
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self.items[key]
+                return None
+            self.items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = (value, time.monotonic() + self.ttl)
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
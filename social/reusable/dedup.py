@@ -0,0 +1,372 @@
+import math
+import time
+import hashlib
+
+import redis
+from django.conf import settings
+
+# db of the crawlers duplicate keys, before namespaces keys were raw ids
+REDIS_CLIENT = redis.Redis(host="social_redis", port=6379, db=5)
+KEY_PREFIX = "seen"
+BLOOM_PREFIX = "bloom"
+CLEAR_BATCH = 1000
+# a bloom seen-set is rotated BLOOM_GENERATIONS times in its ttl
+BLOOM_GENERATIONS = 4
+# each slice of a scalable filter holds twice the ids of the slice before it,
+# with half of its false positive rate. Redis bitmaps have at most 2^32 bits.
+BLOOM_MAX_SLICES = 16
+BLOOM_MAX_BITS = 2**32
+# a bloom checker leases an id by an exact key for LEASE_TTL seconds, it is added
+# to the filter when it is processed
+LEASE_TTL = 60 * 60
+
+# KEYS: keys of ids then their legacy keys, ARGV[1]: ttl, ARGV[2]: claim or not
+# returns 1 for ids that were not seen. Ids seen by a legacy key get a new key.
+CHECK_SCRIPT = """
+local count = #KEYS / 2
+local result = {}
+for i = 1, count do
+    local key, legacy = KEYS[i], KEYS[count + i]
+    local exists = redis.call("EXISTS", key) == 1
+    local seen = exists or (legacy ~= "" and redis.call("EXISTS", legacy) == 1)
+    if not exists and ARGV[2] == "1" then
+        redis.call("SET", key, "", "EX", ARGV[1])
+    end
+    result[i] = seen and 0 or 1
+end
+return result
+"""
+
+# KEYS: generation keys of the filter, the current one first, then two fallback
+# keys of each id, its exact key first. ARGV: mode, expire time of the current
+# generation, number of generations, number of slices, lease ttl, (capacity,
+# bits, hashes) of slices then two hashes of each id. Modes are CHECK, CLAIM,
+# LEASE (unseen ids get their exact key) and FINISH (leased ids are added and
+# their exact key is deleted). Slices of a generation are bitmaps
+# <generation>:<n>, the generation key is a hash of slice number -> count of ids.
+BLOOM_SCRIPT = """
+local mode, expire_at = ARGV[1], ARGV[2]
+local generations, slice_count = tonumber(ARGV[3]), tonumber(ARGV[4])
+local lease_ttl = ARGV[5]
+local slices = {}
+for s = 1, slice_count do
+    local offset = 5 + (s - 1) * 3
+    slices[s] = {
+        capacity = tonumber(ARGV[offset + 1]),
+        bits = tonumber(ARGV[offset + 2]),
+        hashes = tonumber(ARGV[offset + 3]),
+    }
+end
+local first_hash = 6 + slice_count * 3
+
+local function contains(generation, h1, h2)
+    for s = 1, redis.call("HLEN", generation) do
+        local slice, found = slices[s], true
+        for j = 0, slice.hashes - 1 do
+            local bit = (h1 + j * h2) % slice.bits
+            if redis.call("GETBIT", generation .. ":" .. s, bit) == 0 then
+                found = false
+                break
+            end
+        end
+        if found then
+            return true
+        end
+    end
+    return false
+end
+
+local function add(generation, h1, h2)
+    local s = redis.call("HLEN", generation)
+    if s == 0 or (
+        tonumber(redis.call("HGET", generation, s)) >= slices[s].capacity
+        and s < slice_count
+    ) then
+        s = s + 1
+    end
+    local slice = slices[s]
+    for j = 0, slice.hashes - 1 do
+        redis.call("SETBIT", generation .. ":" .. s, (h1 + j * h2) % slice.bits, 1)
+    end
+    redis.call("HINCRBY", generation, s, 1)
+    redis.call("EXPIREAT", generation, expire_at)
+    redis.call("EXPIREAT", generation .. ":" .. s, expire_at)
+end
+
+local result = {}
+for i = 1, (#ARGV - first_hash + 1) / 2 do
+    local h1 = tonumber(ARGV[first_hash + (i - 1) * 2])
+    local h2 = tonumber(ARGV[first_hash + (i - 1) * 2 + 1])
+    local exact = KEYS[generations + (i - 1) * 2 + 1]
+    local seen = false
+    if mode == "FINISH" then
+        redis.call("DEL", exact)
+    else
+        for f = 1, 2 do
+            local key = KEYS[generations + (i - 1) * 2 + f]
+            if key ~= "" and redis.call("EXISTS", key) == 1 then
+                seen = true
+            end
+        end
+    end
+    for g = 1, generations do
+        if not seen and contains(KEYS[g], h1, h2) then
+            seen = true
+        end
+    end
+    if not seen and (mode == "CLAIM" or mode == "FINISH") then
+        add(KEYS[1], h1, h2)
+    elseif not seen and mode == "LEASE" then
+        redis.call("SET", exact, "", "EX", lease_ttl)
+    end
+    result[i] = seen and 0 or 1
+end
+return result
+"""
+
+
+def unlink_matching(client, pattern, exclude=()):
+    """Deletes keys matching pattern. Keys are scanned and deleted in batches,
+    so redis is not blocked on large namespaces.
+
+    Args:
+        exclude (tuple, optional): prefixes (bytes) of keys that are kept
+
+    Returns:
+        int: number of deleted keys
+    """
+    counter, batch = 0, []
+    for key in client.scan_iter(match=pattern, count=CLEAR_BATCH):
+        if key.startswith(exclude):
+            continue
+        batch.append(key)
+        if len(batch) >= CLEAR_BATCH:
+            counter += client.unlink(*batch)
+            batch = []
+    if batch:
+        counter += client.unlink(*batch)
+    return counter
+
+
+class DuplicateChecker:
+    """Remembers ids of crawled items of a source (e.g. linkedin jobs) for ttl
+    seconds. All ids of a page are checked and claimed atomically in one call,
+    so when two crawls see the same item only one of them gets it as new.
+
+    Args:
+        namespace (str): name of the source, keys are seen:<namespace>:<id>
+        ttl (int): seconds an id is remembered
+        legacy_key (callable, optional): key of an id before namespaces, ids
+            with a legacy key are seen too until legacy keys expire
+        client (Redis, optional): redis client
+    """
+
+    def __init__(self, namespace, ttl, legacy_key=None, client=REDIS_CLIENT):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.legacy_key = legacy_key
+        self.client = client
+        self.script = client.register_script(CHECK_SCRIPT)
+
+    def key(self, item_id):
+        return f"{KEY_PREFIX}:{self.namespace}:{item_id}"
+
+    def check(self, item_ids, claim):
+        item_ids = list(dict.fromkeys(item_ids))
+        if not item_ids:
+            return []
+        keys = [self.key(item_id) for item_id in item_ids]
+        if self.legacy_key is None:
+            keys += [""] * len(item_ids)
+        else:
+            keys += [self.legacy_key(item_id) for item_id in item_ids]
+        result = self.script(keys=keys, args=[self.ttl, int(claim)])
+        return [item_id for item_id, unseen in zip(item_ids, result) if unseen]
+
+    def claim(self, item_ids):
+        """Marks ids as seen
+
+        Args:
+            item_ids (list): ids of items of a page
+
+        Returns:
+            list: ids that were not seen before, in order of item_ids
+        """
+        return self.check(item_ids, claim=True)
+
+    def unseen(self, item_ids):
+        """Returns ids that are not seen without marking them"""
+        return self.check(item_ids, claim=False)
+
+    def lease(self, item_ids):
+        """Claims ids of items before processing them, ids that could not be
+        processed are released and processed ones are finished. Here a lease is
+        a claim.
+
+        Returns:
+            list: ids that were not seen or leased before, in order of item_ids
+        """
+        return self.claim(item_ids)
+
+    def finish(self, item_ids):
+        """Marks processed leased ids as seen, leases of this checker are claims"""
+
+    def release(self, item_ids):
+        """Forgets ids, e.g. claimed items that could not be processed"""
+        if item_ids:
+            self.client.delete(*[self.key(item_id) for item_id in item_ids])
+
+    def clear(self):
+        """Forgets all ids of the namespace
+
+        Returns:
+            int: number of deleted keys
+        """
+        return unlink_matching(self.client, f"{KEY_PREFIX}:{self.namespace}:*")
+
+
+def bloom_slices(capacity, error_rate):
+    """Sizes of slices of a scalable bloom filter. Slice n holds capacity * 2^n
+    ids with error_rate / 2^n false positives, so the filter stays under
+    2 * error_rate however many slices it grows.
+
+    Args:
+        capacity (int): ids of the first slice
+        error_rate (float): false positive rate of the first slice
+
+    Returns:
+        list: (capacity, bits, hashes) of slices
+    """
+    slices = []
+    for number in range(BLOOM_MAX_SLICES):
+        ids = capacity * 2**number
+        rate = error_rate / 2**number
+        bits = math.ceil(-ids * math.log(rate) / math.log(2) ** 2)
+        if bits > BLOOM_MAX_BITS:
+            break
+        slices.append((ids, bits, math.ceil(math.log2(1 / rate))))
+    return slices
+
+
+class BloomDuplicateChecker(DuplicateChecker):
+    """Seen-set of a source kept in time rotated scalable bloom filters, so memory
+    grows with ids per period instead of one key per id. Ids are added to the
+    current generation and a generation expires ttl after its period, so an id is
+    remembered at least ttl seconds. Unseen ids may be reported as seen with about
+    error_rate probability, seen ids are never reported as unseen.
+
+    Ids that have a key of the exact checker or a legacy key are seen too, so
+    switching backends does not send items again.
+
+    Args:
+        namespace (str): name of the source
+        ttl (int): seconds an id is remembered
+        legacy_key (callable, optional): key of an id before namespaces
+        error_rate (float, optional): false positive rate of the seen-set
+        capacity (int, optional): ids of the first slice of each generation
+        client (Redis, optional): redis client
+    """
+
+    def __init__(
+        self,
+        namespace,
+        ttl,
+        legacy_key=None,
+        error_rate=0.001,
+        capacity=10000,
+        client=REDIS_CLIENT,
+    ):
+        super().__init__(namespace, ttl, legacy_key, client)
+        self.period = math.ceil(ttl / BLOOM_GENERATIONS)
+        # generations that may hold live ids share the error rate, slices
+        # of a generation add up to twice the rate of the first one
+        live = BLOOM_GENERATIONS + 1
+        self.slices = bloom_slices(capacity, error_rate / live / 2)
+        self.script = client.register_script(BLOOM_SCRIPT)
+
+    def generation_key(self, generation):
+        return f"{BLOOM_PREFIX}:{self.namespace}:{generation}"
+
+    @staticmethod
+    def hashes(item_id):
+        digest = hashlib.blake2b(str(item_id).encode(), digest_size=8).digest()
+        return int.from_bytes(digest[:4], "little"), (
+            int.from_bytes(digest[4:], "little") | 1
+        )
+
+    def check(self, item_ids, claim):
+        return self.run(item_ids, "CLAIM" if claim else "CHECK")
+
+    def run(self, item_ids, mode):
+        item_ids = list(dict.fromkeys(item_ids))
+        if not item_ids:
+            return []
+        current = int(time.time()) // self.period
+        keys = [
+            self.generation_key(generation)
+            for generation in range(current, current - BLOOM_GENERATIONS - 1, -1)
+        ]
+        args = [mode, (current + 1) * self.period + self.ttl]
+        args += [len(keys), len(self.slices), LEASE_TTL]
+        args += [size for slice_sizes in self.slices for size in slice_sizes]
+        for item_id in item_ids:
+            legacy = self.legacy_key(item_id) if self.legacy_key else ""
+            keys += [self.key(item_id), legacy]
+            args += self.hashes(item_id)
+        result = self.script(keys=keys, args=args)
+        return [item_id for item_id, unseen in zip(item_ids, result) if unseen]
+
+    def lease(self, item_ids):
+        """Claims ids by their exact key for LEASE_TTL seconds, so ids that
+        could not be processed are released, see finish
+        """
+        return self.run(item_ids, "LEASE")
+
+    def finish(self, item_ids):
+        """Adds processed leased ids to the filter and deletes their lease"""
+        self.run(item_ids, "FINISH")
+
+    def release(self, item_ids):
+        """Forgets leased ids. Ids can not be removed from a bloom filter, so
+        claimed ids stay seen.
+        """
+        super().release(item_ids)
+
+    def clear(self):
+        # keys of the exact checker count as seen too
+        return super().clear() + unlink_matching(
+            self.client, f"{BLOOM_PREFIX}:{self.namespace}:*"
+        )
+
+
+def clear_legacy_keys(client=REDIS_CLIENT):
+    """Deletes keys from before namespaces, i.e. all keys of the db except seen
+    and bloom keys, so their ids are not seen by legacy_key anymore
+
+    Returns:
+        int: number of deleted keys
+    """
+    namespaced = (f"{KEY_PREFIX}:".encode(), f"{BLOOM_PREFIX}:".encode())
+    return unlink_matching(client, "*", exclude=namespaced)
+
+
+def get_duplicate_checker(namespace, ttl, legacy_key=None):
+    """Returns the duplicate checker of CRAWLER_DEDUP_BACKEND for a source
+
+    Args:
+        namespace (str): name of the source, e.g. linkedin:job
+        ttl (int): seconds an id is remembered
+        legacy_key (callable, optional): key of an id before namespaces
+
+    Returns:
+        DuplicateChecker: exact checker, or bloom checker if backend is "bloom"
+    """
+    if settings.CRAWLER_DEDUP_BACKEND == "bloom":
+        return BloomDuplicateChecker(
+            namespace,
+            ttl,
+            legacy_key,
+            error_rate=settings.CRAWLER_DEDUP_ERROR_RATE,
+            capacity=settings.CRAWLER_DEDUP_CAPACITY,
+        )
+    return DuplicateChecker(namespace, ttl, legacy_key)
@@ -0,0 +1,131 @@
+import re
+import hashlib
+import logging
+
+import redis
+from langdetect import DetectorFactory, detect
+from langdetect.lang_detect_exception import LangDetectException
+
+from reusable.cache import LocalCache, normalize
+
+logger = logging.getLogger(__name__)
+
+# langdetect picks random n-grams unless seeded, so a text could get different
+# languages in different calls
+DetectorFactory.seed = 0
+
+# same db as analyzer cache, db 5 and db 15 are flushed by other jobs
+REDIS_CLIENT = redis.Redis(host="social_redis", port=6379, db=6)
+KEY_PREFIX = "language"
+CACHE_TTL = 30 * 24 * 3600
+LOCAL = LocalCache(size=4096, ttl=CACHE_TTL)
+# langdetect reads at most SAMPLE_SIZE characters taken from a few windows
+SAMPLE_SIZE = 1500
+SAMPLE_WINDOWS = 3
+LETTER = re.compile(r"[^\W\d_]")
+WORD = re.compile(r"[^\W\d_]+")
+# a script that only one language is written in decides it when SCRIPT_SHARE of
+# letters are in that script
+SCRIPT_SHARE = 0.9
+SCRIPTS = {
+    "ko": re.compile(r"[\uac00-\ud7af\u1100-\u11ff\u3130-\u318f]"),
+    "el": re.compile(r"[\u0370-\u03ff\u1f00-\u1fff]"),
+    "he": re.compile(r"[\u0590-\u05ff]"),
+    "th": re.compile(r"[\u0e00-\u0e7f]"),
+}
+# english prose has about a third of its words in ENGLISH_WORDS, other latin
+# languages have a few percent of them
+ENGLISH_WORDS = frozenset(
+    "the and to of a in for with you we our is are on as will be this your an or "
+    "at by that from have has who it can all about their they not us".split()
+)
+ENGLISH_SHARE = 0.25
+ENGLISH_MIN_WORDS = 20
+
+
+def sample(text, size=SAMPLE_SIZE, windows=SAMPLE_WINDOWS):
+    """Returns evenly spaced windows of a long text, so detection time does not
+    grow with the text while its beginning, middle and end are all read
+    """
+    if len(text) <= size:
+        return text
+    width = size // windows
+    step = (len(text) - width) // (windows - 1)
+    samples = []
+    for start in range(0, step * windows, step):
+        end = start + width
+        samples.append(text[start:end])
+    return " ".join(samples)
+
+
+def detect_by_script(text):
+    letters = len(LETTER.findall(text))
+    if not letters:
+        return None
+    for language, pattern in SCRIPTS.items():
+        if len(pattern.findall(text)) >= SCRIPT_SHARE * letters:
+            return language
+    return None
+
+
+def detect_english(text):
+    words = WORD.findall(text.lower())
+    if len(words) < ENGLISH_MIN_WORDS:
+        return None
+    letters = LETTER.findall(text)
+    # a few accented letters are fine, e.g. résumé
+    if sum(not letter.isascii() for letter in letters) > 0.05 * len(letters):
+        return None
+    english = sum(word in ENGLISH_WORDS for word in words)
+    return "en" if english >= ENGLISH_SHARE * len(words) else None
+
+
+def identify(text):
+    """Detects language of a normalized text, obvious cases are decided by its
+    script or english words and the rest by langdetect on a sample
+
+    Returns:
+        str: language code, empty if the language can not be detected
+    """
+    text = sample(text)
+    language = detect_by_script(text) or detect_english(text)
+    if language is not None:
+        return language
+    try:
+        return detect(text)
+    except LangDetectException:
+        return ""
+
+
+def detect_language(text):
+    """Detects language of a text. Results are cached by hash of the text in
+    process and in redis, so reposted jobs are not detected again. Redis errors
+    are logged and treated as misses.
+
+    Args:
+        text (str): the text, e.g. a job description
+
+    Returns:
+        str: language code like "en", None if it can not be detected
+    """
+    text = normalize(text or "")
+    if not text:
+        return None
+    key = f"{KEY_PREFIX}:{hashlib.sha1(text.encode()).hexdigest()}"
+    language = LOCAL.get(key)
+    if language is None:
+        try:
+            cached = REDIS_CLIENT.get(key)
+        except redis.RedisError:
+            logger.warning("language cache is not available", exc_info=True)
+            cached = None
+        if cached is not None:
+            language = cached.decode()
+        else:
+            language = identify(text)
+            try:
+                REDIS_CLIENT.set(key, language, ex=CACHE_TTL)
+            except redis.RedisError:
+                logger.warning("language cache is not available", exc_info=True)
+        LOCAL.set(key, language)
+    return language or None
@@ -1,5 +1,6 @@
 import importlib
-from django.db import models
+from django.db import models, connection, transaction
+from django.utils import timezone
 
 
 class BaseModel(models.Model):
@@ -14,3 +15,92 @@ class BaseModel(models.Model):
 def get_network_model(class_name):
     models_module = importlib.import_module("network.models")
     return getattr(models_module, class_name)
+
+
+def bulk_increment(model, key_fields, deltas, batch_size=1000):
+    """Adds deltas to the "count" field of counter rows and creates missing rows.
+    It runs one INSERT ... ON CONFLICT DO UPDATE statement per batch, so the model
+    must have a unique constraint on key_fields.
+    Rows are written in sorted order to avoid deadlocks between concurrent writers.
+
+    Args:
+        model (Model): counter model
+        key_fields (tuple): name of the fields that identify a counter row
+        deltas (dict): maps a tuple of key values to the delta of its count
+        batch_size (int, optional): rows per statement. Defaults to 1000.
+    """
+    rows = sorted(key + (delta,) for key, delta in deltas.items() if delta)
+    if not rows:
+        return
+    meta = getattr(model, "_meta")
+    fields = [meta.get_field(name) for name in key_fields] + [meta.get_field("count")]
+    rows = [
+        [
+            field.get_db_prep_value(value, connection)
+            for field, value in zip(fields, row)
+        ]
+        for row in rows
+    ]
+    quote = connection.ops.quote_name
+    table = quote(meta.db_table)
+    columns = ", ".join(quote(field.column) for field in fields[:-1])
+    count = quote(fields[-1].column)
+    placeholder = f"({', '.join(['%s'] * len(fields))})"
+    with connection.cursor() as cursor:
+        for index in range(0, len(rows), batch_size):
+            end = index + batch_size
+            batch = rows[index:end]
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}, {count}) "
+                f"VALUES {', '.join([placeholder] * len(batch))} "
+                f"ON CONFLICT ({columns}) "
+                f"DO UPDATE SET {count} = {table}.{count} + EXCLUDED.{count}",
+                [value for row in batch for value in row],
+            )
+
+
+def bulk_insert(model, objs, batch_size=1000):
+    """Inserts objects by one INSERT statement per batch like bulk_create, but
+    keeps their created_at, e.g. the time a past message was sent. Objects
+    without created_at are created now. Primary keys of inserted rows are set on
+    the objects.
+
+    Args:
+        model (Model): model of the objects, a subclass of BaseModel
+        objs (list): unsaved objects
+        batch_size (int, optional): rows per statement. Defaults to 1000.
+
+    Returns:
+        list: the objects
+    """
+    now = timezone.now()
+    for obj in objs:
+        obj.created_at = obj.created_at or now
+        obj.updated_at = now
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    columns = ", ".join(quote(field.column) for field in fields)
+    primary_key = quote(model._meta.pk.column)
+    placeholder = f"({', '.join(['%s'] * len(fields))})"
+    with transaction.atomic(savepoint=False), connection.cursor() as cursor:
+        for index in range(0, len(objs), batch_size):
+            end = index + batch_size
+            batch = objs[index:end]
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) "
+                f"VALUES {', '.join([placeholder] * len(batch))} "
+                f"RETURNING {primary_key}",
+                [
+                    field.get_db_prep_save(getattr(obj, field.attname), connection)
+                    for obj in batch
+                    for field in fields
+                ],
+            )
+            # rows are returned in the order of VALUES, as bulk_create expects too
+            for obj, (pk,) in zip(batch, cursor.fetchall()):
+                obj.pk = pk
+                # _state is documented, saving the object again updates it
+                obj._state.adding = False  # pylint: disable=protected-access
+                obj._state.db = connection.alias  # pylint: disable=protected-access
+    return objs
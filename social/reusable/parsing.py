@@ -0,0 +1,109 @@
+import re
+
+from lxml import html as lxml_html
+
+SPACES = re.compile(r"[ \t\r\f\v\xa0]+")
+SKIPPED_TAGS = {"script", "style", "template", "noscript", "head"}
+BLOCK_TAGS = {
+    "address",
+    "article",
+    "aside",
+    "blockquote",
+    "dd",
+    "div",
+    "dl",
+    "dt",
+    "footer",
+    "form",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "header",
+    "hr",
+    "li",
+    "main",
+    "nav",
+    "ol",
+    "p",
+    "pre",
+    "section",
+    "table",
+    "tr",
+    "ul",
+}
+
+
+def parse(source):
+    """Parses html of a page, e.g. driver.page_source
+
+    Args:
+        source (str): html document
+
+    Returns:
+        HtmlElement: root of the document
+    """
+    return lxml_html.document_fromstring(source)
+
+
+def parse_fragment(source):
+    """Parses html of an element, e.g. its outerHTML"""
+    return lxml_html.fragment_fromstring(source)
+
+
+def has_class(name):
+    """XPath condition that matches like By.CLASS_NAME"""
+    return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+
+def first(element, xpath):
+    if element is None:
+        return None
+    found = element.xpath(xpath)
+    return found[0] if found else None
+
+
+def is_hidden(element):
+    style = element.get("style", "").replace(" ", "")
+    return element.get("hidden") is not None or "display:none" in style
+
+
+def collect(element, parts):
+    if not isinstance(element.tag, str) or element.tag in SKIPPED_TAGS:
+        return
+    if is_hidden(element):
+        return
+    if element.tag == "br":
+        parts.append("\n")
+    block = element.tag in BLOCK_TAGS
+    if block:
+        parts.append("\n")
+    if element.text:
+        parts.append(element.text)
+    for child in element:
+        collect(child, parts)
+        if child.tail:
+            parts.append(child.tail)
+    if block:
+        parts.append("\n")
+
+
+def text(element):
+    """Rendered text of an element like WebElement.text: line breaks of br and
+    block elements are kept, other whitespaces collapse and hidden elements,
+    scripts and styles are skipped.
+
+    Args:
+        element (HtmlElement): the element
+
+    Returns:
+        str: text of the element, None for None element
+    """
+    if element is None:
+        return None
+    parts = []
+    collect(element, parts)
+    lines = (SPACES.sub(" ", line).strip() for line in "".join(parts).split("\n"))
+    return "\n".join(line for line in lines if line)
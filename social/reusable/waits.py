@@ -0,0 +1,105 @@
+import time
+import threading
+
+from django.conf import settings
+from celery.utils.log import get_task_logger
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.support.wait import WebDriverWait
+
+logger = get_task_logger(__name__)
+
+POLL_FREQUENCY = 0.25
+
+
+def wait_for(driver, condition, timeout=None, message=""):
+    """Waits until condition returns a truthy value
+
+    Args:
+        driver (webdriver): webdriver object
+        condition (callable): gets the driver and returns a falsy value while
+            the page is not ready
+        timeout (float, optional): seconds to wait. Defaults to CRAWLER_WAIT_TIMEOUT.
+        message (str, optional): logged when the wait times out
+
+    Returns:
+        any: result of the condition, None if it timed out
+    """
+    if timeout is None:
+        timeout = settings.CRAWLER_WAIT_TIMEOUT
+    try:
+        return WebDriverWait(
+            driver,
+            timeout,
+            poll_frequency=POLL_FREQUENCY,
+            ignored_exceptions=(WebDriverException,),
+        ).until(condition)
+    except TimeoutException:
+        logger.info("waiting for %s timed out after %ss", message or condition, timeout)
+        return None
+
+
+class elements_more_than:
+    """Elements of a locator are more than count, i.e. new cards appeared.
+    Returns the elements.
+    """
+
+    def __init__(self, locator, count=0):
+        self.locator = locator
+        self.count = count
+
+    def __call__(self, driver):
+        elements = driver.find_elements(*self.locator)
+        return elements if len(elements) > self.count else False
+
+
+class script_returns:
+    """A script returns a truthy value, e.g. the count of new cards in the page.
+    One round trip is made for each poll.
+    """
+
+    def __init__(self, script, *args):
+        self.script = script
+        self.args = args
+
+    def __call__(self, driver):
+        return driver.execute_script(self.script, *self.args)
+
+
+class height_changed:
+    """Height of the page is not last_height anymore, returns the new height"""
+
+    def __init__(self, last_height):
+        self.last_height = last_height
+
+    def __call__(self, driver):
+        height = driver.execute_script("return document.body.scrollHeight")
+        return height if height != self.last_height else False
+
+
+class Pacer:
+    """Keeps a minimum interval between actions of a site, e.g. clicks. Unlike a
+    fixed sleep, time spent on other work since the last action counts, so it
+    only sleeps for the rest of the interval. Intervals are configured per site
+    and action in CRAWLER_PACING.
+
+    Args:
+        site (str): name of the site, a key of CRAWLER_PACING
+    """
+
+    def __init__(self, site):
+        self.site = site
+        self.last = {}
+        self.lock = threading.Lock()
+
+    def interval(self, action):
+        return settings.CRAWLER_PACING.get(self.site, {}).get(action, 0)
+
+    def pace(self, action):
+        """Sleeps until the interval of action since its last call has passed"""
+        with self.lock:
+            now = time.monotonic()
+            ready_at = self.last.get(action, 0) + self.interval(action)
+            delay = max(ready_at - now, 0)
+            self.last[action] = now + delay
+        if delay:
+            time.sleep(delay)
@@ -27,6 +27,18 @@ app.conf.beat_schedule = {
         "task": "network.tasks.check_channels_crawl",
         "schedule": crontab(minute=0, hour="*/1"),
     },
+    "flush_enrichment_queue": {
+        "task": "network.tasks.flush_enrichment_queue",
+        "schedule": crontab(minute="*/1"),
+    },
+    "merge_keyword_sketches": {
+        "task": "network.tasks.merge_keyword_sketches",
+        "schedule": crontab(minute="*/1"),
+    },
+    "dispatch_notifications": {
+        "task": "notification.tasks.dispatch_notifications",
+        "schedule": crontab(minute="*/1"),
+    },
     "get_linkedin_feed": {
         "task": "linkedin.tasks.get_linkedin_feed",
         "schedule": crontab(minute=0, hour="*/12"),
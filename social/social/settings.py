@@ -138,12 +138,44 @@ LINKEDIN_PASSWORD = env.str("LINKEDIN_PASSWORD")
 # Telegram account auth
 TELEGRAM_API_ID = env.str("TELEGRAM_API_ID")
 TELEGRAM_API_HASH = env.str("TELEGRAM_API_HASH")
+# Posts of new telegram messages are saved together when TELEGRAM_FLUSH_SIZE
+# posts are buffered or every TELEGRAM_FLUSH_INTERVAL milliseconds
+TELEGRAM_FLUSH_SIZE = env.int("TELEGRAM_FLUSH_SIZE", default=100)
+TELEGRAM_FLUSH_INTERVAL = env.int("TELEGRAM_FLUSH_INTERVAL", default=1000)
+# Seconds between statics requests of an account at least, more after flood waits
+TELEGRAM_STATS_INTERVAL = env.float("TELEGRAM_STATS_INTERVAL", default=10)
+# Seconds between requests of 100 past messages, so backfill leaves room for
+# the listener of the account
+TELEGRAM_BACKFILL_WAIT = env.float("TELEGRAM_BACKFILL_WAIT", default=2)
+# Posts of past telegram messages older than TELEGRAM_BACKFILL_ENRICH_DAYS days
+# are saved without enrichment, so a backfill does not flood the analyzers
+TELEGRAM_BACKFILL_ENRICH_DAYS = env.int("TELEGRAM_BACKFILL_ENRICH_DAYS", default=7)
 
 
 # Twitter account auth
 TWITTER_USERNAME = env.str("TWITTER_USERNAME")
 TWITTER_PASSWORD = env.str("TWITTER_PASSWORD")
 
+# Selenium grid, standalone firefox opens one session at a time by default
+BROWSER_MAX_SESSIONS = env.int("BROWSER_MAX_SESSIONS", default=1)
+BROWSER_SESSION_MAX_USES = env.int("BROWSER_SESSION_MAX_USES", default=20)
+# Sessions of the linkedin account that may crawl at the same time
+LINKEDIN_MAX_SESSIONS = env.int("LINKEDIN_MAX_SESSIONS", default=1)
+# "script" reads pages by javascript in the browser, "lxml" parses page sources.
+# Parsed page sources are saved in CRAWLER_SNAPSHOT_DIR, e.g. for parser fixtures.
+CRAWLER_PAGE_PARSER = env.str("CRAWLER_PAGE_PARSER", default="script")
+CRAWLER_SNAPSHOT_DIR = env.str("CRAWLER_SNAPSHOT_DIR", default=None)
+# Seconds crawlers wait for a page event (cards appeared, details loaded) and
+# minimum seconds between actions of each site, e.g. {"linkedin": {"click": 1}}
+CRAWLER_WAIT_TIMEOUT = env.float("CRAWLER_WAIT_TIMEOUT", default=10)
+CRAWLER_PACING = env.json("CRAWLER_PACING", default={"linkedin": {"click": 1}})
+# Seen ids of crawlers are redis keys ("exact") or time rotated bloom filters
+# ("bloom") with CRAWLER_DEDUP_ERROR_RATE false positives, each generation of a
+# filter starts with room for CRAWLER_DEDUP_CAPACITY ids and grows when needed.
+CRAWLER_DEDUP_BACKEND = env.str("CRAWLER_DEDUP_BACKEND", default="exact")
+CRAWLER_DEDUP_ERROR_RATE = env.float("CRAWLER_DEDUP_ERROR_RATE", default=0.001)
+CRAWLER_DEDUP_CAPACITY = env.int("CRAWLER_DEDUP_CAPACITY", default=10000)
+
 
 CACHES = {
     "default": {
@@ -1,10 +1,56 @@
+import time
+import threading
+
 from django.contrib import admin
 
-from . import models
+from . import models, sharding
 from reusable.admins import ReadOnlyAdminDateFieldsMIXIN
 
 
 @admin.register(models.Account)
 class AccountAdmin(ReadOnlyAdminDateFieldsMIXIN):
-    list_display = ("pk", "created_at", "phone_number", "phone_code_hash")
+    list_display = ("pk", "created_at", "phone_number", "phone_code_hash", "shard")
     readonly_fields = ("phone_code_hash",)
+    filter_horizontal = ("channels",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # shard reports of the changelist that the current thread renders
+        self.reports = threading.local()
+
+    def changelist_view(self, request, extra_context=None):
+        # reports of all listeners are read once per page, not once per row. Rows
+        # are rendered after the view returns, so they are kept until the next page
+        self.reports.value = sharding.shard_reports()
+        return super().changelist_view(request, extra_context)
+
+    @admin.display(description="shard")
+    def shard(self, instance):
+        """Channels, lag, statics backlog and flood wait of the listener of the account"""
+        reports = getattr(self.reports, "value", None)
+        if reports is None:
+            reports = sharding.shard_reports()
+        report = reports.get(instance.pk)
+        if report is None or time.time() - report["at"] > sharding.HEARTBEAT_TTL:
+            return "stopped"
+        text = (
+            f"{report['channels']} channels, {report['lag']:.0f}s lag, "
+            f"{report.get('backlog', 0)} due statics"
+        )
+        if report.get("flood_wait_until", 0) > time.time():
+            text += ", in flood wait"
+        return text
+
+
+@admin.register(models.BackfillCheckpoint)
+class BackfillCheckpointAdmin(ReadOnlyAdminDateFieldsMIXIN):
+    list_display = (
+        "pk",
+        "channel",
+        "min_message_id",
+        "max_message_id",
+        "since",
+        "finished",
+        "updated_at",
+    )
+    list_filter = ("finished",)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TelegramConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "telegram"
+
+    def ready(self):
+        from telegram import signals  # noqa: F401
@@ -0,0 +1,175 @@
+import time
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from network import models as net_models
+from telegram import models, ingestion
+
+# same db as enrichment queue, db 5 and db 15 are flushed by other jobs
+REDIS_CLIENT = redis.Redis(host="social_redis", port=6379, db=6)
+# channel -> time it waits for a turn since
+QUEUE_KEY = "telegram:backfill"
+# messages are saved and the checkpoint is moved every CHUNK_SIZE messages
+CHUNK_SIZE = 1000
+# a channel fetches at most TURN_SIZE messages in each direction per turn, then
+# other channels get their turn
+TURN_SIZE = 10000
+
+
+def request(channel_ids, since=None):
+    """Queues backfill of channels. A channel that was backfilled fetches the
+    messages sent after its backfill, and older ones if since is earlier.
+
+    Args:
+        channel_ids (list): primary keys of telegram channels
+        since (datetime, optional): messages sent before since are not fetched.
+        Defaults to all messages.
+
+    Returns:
+        int: number of newly queued channels
+    """
+    if not channel_ids:
+        return 0
+    for channel_id in channel_ids:
+        checkpoint, created = models.BackfillCheckpoint.objects.get_or_create(
+            channel_id=channel_id, defaults={"since": since}
+        )
+        if not created and checkpoint.since is not None:
+            if since is None or since < checkpoint.since:
+                checkpoint.since = since
+                checkpoint.finished = False
+                checkpoint.save()
+    now = time.time()
+    return REDIS_CLIENT.zadd(
+        QUEUE_KEY, {channel_id: now for channel_id in channel_ids}, nx=True
+    )
+
+
+def next_channel(channel_ids):
+    """Returns the channel that waits for a turn the longest
+
+    Args:
+        channel_ids (set): primary keys of channels that may be backfilled
+
+    Returns:
+        int: primary key of the channel, None if no channel is queued
+    """
+    for channel in REDIS_CLIENT.zrange(QUEUE_KEY, 0, -1):
+        if int(channel) in channel_ids:
+            return int(channel)
+    return None
+
+
+def end_turn(channel_id, finished):
+    if finished:
+        REDIS_CLIENT.zrem(QUEUE_KEY, channel_id)
+    else:
+        REDIS_CLIENT.zadd(QUEUE_KEY, {channel_id: time.time()})
+
+
+def pending():
+    return REDIS_CLIENT.zcard(QUEUE_KEY)
+
+
+def get_checkpoint(channel_id):
+    return models.BackfillCheckpoint.objects.get_or_create(channel_id=channel_id)[0]
+
+
+def save_messages(checkpoint, channel, messages):
+    """Saves past messages of a channel by bulk inserts, messages that are saved
+    already are skipped by ingestion.save_posts, then moves the checkpoint. Only
+    messages of the last TELEGRAM_BACKFILL_ENRICH_DAYS days are enriched.
+
+    Args:
+        checkpoint (BackfillCheckpoint): checkpoint of the channel
+        channel (Channel): the channel
+        messages (list): telethon messages
+    """
+    message_ids = [message.id for message in messages]
+    posts = [
+        net_models.Post(
+            body=getattr(message, "message", None) or "",
+            channel=channel,
+            data={"message_id": message.id, "channel_id": message.peer_id.channel_id},
+            views_count=getattr(message, "views", None) or 0,
+            share_count=getattr(message, "forwards", None) or 0,
+            created_at=message.date,
+        )
+        for message in messages
+    ]
+    with transaction.atomic():
+        enrich_since = timezone.now() - timezone.timedelta(
+            days=settings.TELEGRAM_BACKFILL_ENRICH_DAYS
+        )
+        ingestion.save_posts(posts, enrich_since)
+        lowest, highest = min(message_ids), max(message_ids)
+        checkpoint.min_message_id = min(lowest, checkpoint.min_message_id or lowest)
+        checkpoint.max_message_id = max(highest, checkpoint.max_message_id or highest)
+        checkpoint.save()
+
+
+async def save_all(checkpoint, channel, messages, since=None):
+    """Saves messages of an iterator in chunks of CHUNK_SIZE
+
+    Returns:
+        tuple: number of messages and whether a message before since was reached
+    """
+    count, chunk = 0, []
+    reached = False
+    async for message in messages:
+        if since is not None and message.date < since:
+            reached = True
+            break
+        count += 1
+        chunk.append(message)
+        if len(chunk) >= CHUNK_SIZE:
+            await sync_to_async(save_messages)(checkpoint, channel, chunk)
+            chunk = []
+    if chunk:
+        await sync_to_async(save_messages)(checkpoint, channel, chunk)
+    return count, reached
+
+
+async def backfill_channel(client, channel, wait_time):
+    """Fetches messages of a channel that were sent after its checkpoint, then
+    older messages, at most TURN_SIZE messages each. Telethon requests 100
+    messages at a time and waits wait_time seconds between requests, so the
+    listener of the account is not starved.
+
+    Args:
+        client (TelegramClient): connected client of the account
+        channel (Channel): the channel
+        wait_time (float): seconds between requests
+
+    Returns:
+        bool: whether the channel is backfilled, otherwise it needs another turn
+    """
+    checkpoint = await sync_to_async(get_checkpoint)(channel.pk)
+    if checkpoint.max_message_id is not None:
+        # oldest first, so the checkpoint moves up with each chunk
+        newer = client.iter_messages(
+            channel.username,
+            limit=TURN_SIZE,
+            min_id=checkpoint.max_message_id,
+            reverse=True,
+            wait_time=wait_time,
+        )
+        count, _ = await save_all(checkpoint, channel, newer)
+        if count >= TURN_SIZE:
+            return False
+    if not checkpoint.finished:
+        older = client.iter_messages(
+            channel.username,
+            limit=TURN_SIZE,
+            offset_id=checkpoint.min_message_id or 0,
+            wait_time=wait_time,
+        )
+        count, reached = await save_all(checkpoint, channel, older, checkpoint.since)
+        if reached or count < TURN_SIZE:
+            checkpoint.finished = True
+            await sync_to_async(checkpoint.save)()
+    return checkpoint.finished
@@ -0,0 +1,242 @@
+import time
+import uuid
+import asyncio
+import logging
+from collections import defaultdict
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.core.cache import cache
+from django.utils import timezone
+
+from network import models as net_models, rollups, tasks as net_tasks
+from reusable.models import bulk_insert
+from telegram import models, sharding, polling
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "telegram:channels_version"
+# the channel map is loaded again after CHANNELS_TTL seconds even if no channel
+# changed, the version and listeners are checked every VERSION_INTERVAL seconds
+CHANNELS_TTL = 300
+VERSION_INTERVAL = 5
+# posts shorter than MIN_BODY_LENGTH characters without spaces are not saved
+MIN_BODY_LENGTH = 5
+
+
+def channels_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate_channels():
+    """Makes all listeners load their channel map again, e.g. a channel changed"""
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def load_channels(account_id, live, flooded):
+    """Returns active telegram channels that an account saves messages of and
+    those that it joins, see sharding.Shards
+
+    Args:
+        account_id (int): primary key of the account
+        live (list): ids of accounts that channels are shared between
+        flooded (list): ids of accounts in flood wait
+
+    Returns:
+        tuple: channels to save and channels to join by their username
+    """
+    members = defaultdict(set)
+    for channel_id, member_id in models.Account.channels.through.objects.values_list(
+        "channel_id", "account_id"
+    ):
+        members[channel_id].add(member_id)
+    shards = sharding.Shards(live, flooded, members)
+    channels = net_models.Channel.objects.filter(
+        network__name="Telegram", status=True
+    ).only("id", "username", "network_id")
+    saved, joined = {}, {}
+    for channel in channels:
+        saver, joiner = shards.assign(channel.pk)
+        if saver == account_id:
+            saved[channel.username] = channel
+        if joiner == account_id:
+            joined[channel.username] = channel
+    return saved, joined
+
+
+def shard_state():
+    return channels_version(), sharding.live_accounts()
+
+
+def unsaved_posts(posts):
+    """Returns posts that their message is not saved yet, once per message"""
+    channel_ids = {post.channel_id for post in posts}
+    message_ids = {post.data["message_id"] for post in posts}
+    saved = set(
+        net_models.Post.objects.filter(
+            channel_id__in=channel_ids, data__message_id__in=message_ids
+        ).values_list("channel_id", "data__message_id")
+    )
+    unsaved = []
+    for post in posts:
+        key = (post.channel_id, post.data["message_id"])
+        if key not in saved:
+            saved.add(key)
+            unsaved.append(post)
+    return unsaved
+
+
+def save_posts(posts, enrich_since=None):
+    """Inserts posts of messages that are not saved yet by one query, counts them
+    in rollups, queues them for enrichment once and schedules measuring their
+    statics. Saves of the same channels wait for each other, so new and past
+    messages saved at the same time are saved once.
+
+    Args:
+        posts (list): unsaved Post objects, created_at of posts of past messages
+        is the time the message was sent
+        enrich_since (datetime, optional): posts created before it are not
+        enriched. Defaults to all posts.
+
+    Returns:
+        list: saved posts
+    """
+    posts = [
+        post for post in posts if len(post.body.replace(" ", "")) >= MIN_BODY_LENGTH
+    ]
+    if not posts:
+        return []
+    with transaction.atomic():
+        channel_ids = sorted({post.channel_id for post in posts})
+        # locks the channels until the posts are inserted
+        list(
+            net_models.Channel.objects.select_for_update()
+            .filter(pk__in=channel_ids)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        posts = unsaved_posts(posts)
+        if not posts:
+            return []
+        bulk_insert(net_models.Post, posts)
+        rollups.add_posts_to_rollups(posts)
+        if settings.ENVIRONMENT == settings.PRODUCTION:
+            post_ids = [
+                post.pk
+                for post in posts
+                if enrich_since is None or post.created_at >= enrich_since
+            ]
+            transaction.on_commit(lambda: net_tasks.enqueue_enrichment(post_ids))
+    try:
+        polling.schedule_posts(posts)
+    except redis.RedisError:
+        logger.exception("statics of %s telegram posts were not scheduled", len(posts))
+    return posts
+
+
+class ChannelMap:
+    """Telegram channels that the account of a listener saves messages of by
+    username in memory of the listener, so a message is matched to its channel
+    without a query, with the channels it should join. It is loaded again when
+    channels are invalidated, listeners of accounts start, stop or wait for a
+    flood, or every CHANNELS_TTL seconds.
+
+    Args:
+        account_id (int): primary key of the account
+    """
+
+    def __init__(self, account_id):
+        self.account_id = account_id
+        self.channels = {}
+        self.joining = {}
+        self.version = None
+        self.accounts = None
+        self.loaded_at = 0
+
+    def get(self, username):
+        return self.channels.get(username)
+
+    async def refresh(self):
+        version, accounts = await sync_to_async(shard_state)()
+        if (
+            version == self.version
+            and accounts == self.accounts
+            and time.monotonic() - self.loaded_at < CHANNELS_TTL
+        ):
+            return
+        live, flooded = accounts
+        self.channels, self.joining = await sync_to_async(load_channels)(
+            self.account_id, live or [self.account_id], flooded
+        )
+        self.version = version
+        self.accounts = accounts
+        self.loaded_at = time.monotonic()
+
+
+class PostBuffer:
+    """Buffers posts of new messages and saves them by bulk inserts when
+    flush_size posts are buffered or flush_interval seconds after the last flush.
+    Its lag is the seconds between sending the oldest message of the last flush
+    and saving it.
+
+    Args:
+        flush_size (int): posts that are saved together at most
+        flush_interval (float): seconds that a post may wait in the buffer
+    """
+
+    def __init__(self, flush_size, flush_interval):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.posts = []
+        self.oldest = None
+        self.lag = 0
+        self.lock = asyncio.Lock()
+
+    async def add(self, channel, message):
+        """Buffers a message of a channel
+
+        Args:
+            channel (Channel): channel of the message
+            message (Message): telethon message
+        """
+        self.posts.append(
+            net_models.Post(
+                body=message.message or "",
+                channel=channel,
+                data={
+                    "message_id": message.id,
+                    "channel_id": message.peer_id.channel_id,
+                },
+                views_count=0,
+                share_count=0,
+            )
+        )
+        if self.oldest is None or message.date < self.oldest:
+            self.oldest = message.date
+        if len(self.posts) >= self.flush_size:
+            await self.flush()
+
+    async def flush(self):
+        async with self.lock:
+            posts, self.posts = self.posts, []
+            oldest, self.oldest = self.oldest, None
+            for start in range(0, len(posts), self.flush_size):
+                end = start + self.flush_size
+                batch = posts[start:end]
+                try:
+                    await sync_to_async(save_posts)(batch)
+                except Exception:
+                    logger.exception("%s telegram posts were not saved", len(batch))
+            if oldest is not None:
+                self.lag = (timezone.now() - oldest).total_seconds()
+
+    async def keep_flushing(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
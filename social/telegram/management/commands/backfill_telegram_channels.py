@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from network import models as net_models
+from telegram import tasks, backfill
+
+
+class Command(BaseCommand):
+    help = (
+        "Queues fetching past messages of telegram channels. Listeners of the "
+        "accounts that own the channels fetch them and continue from their "
+        "checkpoints if they were backfilled before."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "usernames", nargs="*", help="defaults to all active telegram channels"
+        )
+        parser.add_argument(
+            "--days", type=int, default=None, help="defaults to all messages"
+        )
+
+    def handle(self, *args, **options):
+        channel_ids = None
+        if options["usernames"]:
+            channels = dict(
+                net_models.Channel.objects.filter(
+                    network__name="Telegram", username__in=options["usernames"]
+                ).values_list("username", "pk")
+            )
+            missing = set(options["usernames"]) - set(channels)
+            if missing:
+                raise CommandError(f"unknown channels: {', '.join(sorted(missing))}")
+            channel_ids = list(channels.values())
+        queued = tasks.backfill_telegram(channel_ids, options["days"])
+        self.stdout.write(
+            f"{queued} channels queued, {backfill.pending()} channels wait for backfill"
+        )
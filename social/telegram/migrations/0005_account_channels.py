@@ -0,0 +1,32 @@
+# Generated by Django 4.2 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+def add_joined_channels(apps, schema_editor):
+    """Channels were joined by the only account before accounts shared them"""
+    accounts = list(apps.get_model("telegram", "Account").objects.all()[:2])
+    if len(accounts) != 1:
+        return
+    channel_model = apps.get_model("network", "Channel")
+    accounts[0].channels.add(
+        *channel_model.objects.filter(network__name="Telegram", joined=True)
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("network", "0044_post_channel_message"),
+        ("telegram", "0004_alter_account_phone_number"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="account",
+            name="channels",
+            field=models.ManyToManyField(
+                blank=True, related_name="telegram_accounts", to="network.channel"
+            ),
+        ),
+        migrations.RunPython(add_joined_channels, migrations.RunPython.noop),
+    ]
@@ -6,6 +6,29 @@ from reusable.models import BaseModel
 class Account(BaseModel):
     phone_number = models.CharField(max_length=15)
     phone_code_hash = models.CharField(max_length=100, null=True, blank=True)
+    # channels that the account joined
+    channels = models.ManyToManyField(
+        "network.Channel", related_name="telegram_accounts", blank=True
+    )
 
     def __str__(self):
         return f"({self.pk} - {self.phone_number})"
+
+
+class BackfillCheckpoint(BaseModel):
+    """Range of message ids of a channel that past messages are fetched for, so
+    a backfill continues from where it stopped
+    """
+
+    channel = models.OneToOneField(
+        "network.Channel", on_delete=models.CASCADE, related_name="backfill_checkpoint"
+    )
+    min_message_id = models.BigIntegerField(null=True, blank=True)
+    max_message_id = models.BigIntegerField(null=True, blank=True)
+    # messages sent before since are not fetched, all messages if it is empty
+    since = models.DateTimeField(null=True, blank=True)
+    # messages before min_message_id are fetched
+    finished = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"({self.pk} - {self.channel_id} - {self.finished})"
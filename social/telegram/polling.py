@@ -0,0 +1,152 @@
+import time
+import asyncio
+from collections import defaultdict
+
+import redis
+
+# same db as enrichment queue, db 5 and db 15 are flushed by other jobs
+REDIS_CLIENT = redis.Redis(host="social_redis", port=6379, db=6)
+# channel -> due time of its most stale message
+CHANNELS_KEY = "telegram:statics:channels"
+# "message id:sent time" -> due time of its next measurement
+MESSAGES_KEY = "telegram:statics:{channel}"
+DAY = 24 * 60 * 60
+# statics of a message are measured again after REFRESH_FACTOR of its age, at
+# least MIN_INTERVAL seconds later, until it is MAX_AGE seconds old. So young
+# messages are measured often and a message is measured about 20 times.
+MIN_INTERVAL = 5 * 60
+REFRESH_FACTOR = 0.5
+MAX_AGE = 7 * DAY
+# GetMessagesViewsRequest accepts at most MAX_IDS message ids
+MAX_IDS = 100
+# messages due in BATCH_AHEAD seconds are measured with a due batch of their
+# channel, so fewer requests are sent
+BATCH_AHEAD = 5 * 60
+# sets due time of a channel to due time of its first message, atomically so
+# concurrent schedulers do not leave it outdated
+UPDATE_CHANNEL_SCRIPT = """
+local first = redis.call("ZRANGE", KEYS[1], 0, 0, "WITHSCORES")
+if first[2] then
+    redis.call("ZADD", KEYS[2], first[2], ARGV[1])
+else
+    redis.call("ZREM", KEYS[2], ARGV[1])
+end
+"""
+UPDATE_CHANNEL = REDIS_CLIENT.register_script(UPDATE_CHANNEL_SCRIPT)
+
+
+def refresh_interval(age):
+    """Returns seconds until the next measurement of a message of age seconds"""
+    return max(MIN_INTERVAL, age * REFRESH_FACTOR)
+
+
+def schedule(channel_id, messages, now=None, only_new=False):
+    """Schedules the next measurement of messages of a channel, messages older
+    than MAX_AGE are not measured anymore
+
+    Args:
+        channel_id (int): primary key of the channel
+        messages (list): (message id, sent time as timestamp) of messages
+        now (float, optional): time of the last measurement. Defaults to now.
+        only_new (bool, optional): keep due time of scheduled messages.
+    """
+    now = time.time() if now is None else now
+    key = MESSAGES_KEY.format(channel=channel_id)
+    dues, expired = {}, []
+    for message_id, sent_at in messages:
+        member = f"{message_id}:{int(sent_at)}"
+        age = now - sent_at
+        if age >= MAX_AGE:
+            expired.append(member)
+        else:
+            dues[member] = now + refresh_interval(age)
+    pipe = REDIS_CLIENT.pipeline()
+    if dues:
+        pipe.zadd(key, dues, nx=only_new)
+    if expired:
+        pipe.zrem(key, *expired)
+    pipe.execute()
+    UPDATE_CHANNEL(keys=[key, CHANNELS_KEY], args=[channel_id])
+
+
+def schedule_posts(posts):
+    """Schedules the first measurement of new telegram posts
+
+    Args:
+        posts (list): saved posts with message_id in their data
+    """
+    channels = defaultdict(list)
+    for post in posts:
+        channels[post.channel_id].append(
+            (post.data["message_id"], post.created_at.timestamp())
+        )
+    for channel_id, messages in channels.items():
+        schedule(channel_id, messages)
+
+
+def next_batch(channel_ids, now=None):
+    """Returns messages of the channel that its most stale message waits the
+    longest, with its other messages that are due soon
+
+    Args:
+        channel_ids (set): primary keys of channels that may be measured
+        now (float, optional): Defaults to now.
+
+    Returns:
+        tuple: channel id and (message id, sent time) of at most MAX_IDS
+        messages, most stale first. None if no message is due.
+    """
+    now = time.time() if now is None else now
+    for channel in REDIS_CLIENT.zrangebyscore(CHANNELS_KEY, "-inf", now):
+        channel_id = int(channel)
+        if channel_id not in channel_ids:
+            continue
+        members = REDIS_CLIENT.zrangebyscore(
+            MESSAGES_KEY.format(channel=channel_id),
+            "-inf",
+            now + BATCH_AHEAD,
+            start=0,
+            num=MAX_IDS,
+        )
+        messages = []
+        for member in members:
+            message_id, sent_at = member.decode().split(":")
+            messages.append((int(message_id), int(sent_at)))
+        return channel_id, messages
+    return None
+
+
+def backlog(channel_ids, now=None):
+    """Returns the number of messages of channels that their measurement is due"""
+    now = time.time() if now is None else now
+    pipe = REDIS_CLIENT.pipeline(transaction=False)
+    for channel_id in channel_ids:
+        pipe.zcount(MESSAGES_KEY.format(channel=channel_id), "-inf", now)
+    return sum(pipe.execute())
+
+
+class RequestBudget:
+    """Paces requests of an account. The interval between requests is doubled
+    after a flood wait and shrinks back to interval after successful requests.
+
+    Args:
+        interval (float): seconds between requests at least
+        max_interval (float): seconds between requests at most
+    """
+
+    def __init__(self, interval, max_interval):
+        self.min_interval = interval
+        self.max_interval = max_interval
+        self.interval = interval
+        self.next_request = 0
+
+    async def wait(self):
+        await asyncio.sleep(max(self.next_request - time.monotonic(), 0))
+        self.next_request = time.monotonic() + self.interval
+
+    def succeeded(self):
+        self.interval = max(self.interval * 0.9, self.min_interval)
+
+    def flooded(self, seconds):
+        self.interval = min(self.interval * 2, self.max_interval)
+        self.next_request = time.monotonic() + seconds
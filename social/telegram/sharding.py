@@ -0,0 +1,151 @@
+import time
+import json
+import bisect
+import hashlib
+
+import redis
+
+# same db as enrichment queue, db 5 and db 15 are flushed by other jobs
+REDIS_CLIENT = redis.Redis(host="social_redis", port=6379, db=6)
+# account -> time of the last heartbeat of its listener
+SHARDS_KEY = "telegram:shards"
+# account -> time its flood wait ends, it joins no channel until then
+FLOOD_KEY = "telegram:flood"
+# account -> json of its last report, e.g. channels and lag
+REPORTS_KEY = "telegram:shard_reports"
+# a listener without heartbeat for HEARTBEAT_TTL seconds owns no channel
+HEARTBEAT_TTL = 30
+# points of each account on the ring, more points spread channels more evenly
+REPLICAS = 256
+
+
+def ring_hash(value):
+    digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class HashRing:
+    """Consistent hashing of channels to accounts. When an account is added or
+    removed only the channels of its points move, the rest keep their owner.
+
+    Args:
+        accounts (list): ids of accounts
+        replicas (int, optional): points of each account on the ring.
+    """
+
+    def __init__(self, accounts, replicas=REPLICAS):
+        points = sorted(
+            (ring_hash(f"{account}:{replica}"), account)
+            for account in accounts
+            for replica in range(replicas)
+        )
+        self.hashes = [point for point, _ in points]
+        self.accounts = [account for _, account in points]
+
+    def owner(self, channel_id):
+        """Returns id of the account that owns a channel, None if there is no account"""
+        if not self.accounts:
+            return None
+        index = bisect.bisect(self.hashes, ring_hash(channel_id)) % len(self.hashes)
+        return self.accounts[index]
+
+
+def heartbeat(account_id, report):
+    """Marks the listener of an account alive and saves its report
+
+    Args:
+        account_id (int): primary key of the account
+        report (dict): e.g. number of channels and lag of the listener
+    """
+    now = time.time()
+    pipe = REDIS_CLIENT.pipeline()
+    pipe.zadd(SHARDS_KEY, {account_id: now})
+    pipe.hset(REPORTS_KEY, account_id, json.dumps({**report, "at": now}))
+    pipe.execute()
+
+
+def leave(account_id):
+    """Gives channels of a stopped listener to other listeners"""
+    REDIS_CLIENT.zrem(SHARDS_KEY, account_id)
+
+
+def flood_wait(account_id, seconds):
+    """Gives channels that an account has not joined to other listeners until its
+    flood wait ends, it keeps saving messages of the channels it joined
+    """
+    REDIS_CLIENT.zadd(FLOOD_KEY, {account_id: time.time() + seconds})
+
+
+def live_accounts():
+    """Returns accounts that have a live listener and those of them that are in
+    flood wait
+
+    Returns:
+        tuple: sorted ids of live accounts and sorted ids of flooded accounts
+    """
+    now = time.time()
+    pipe = REDIS_CLIENT.pipeline()
+    pipe.zrangebyscore(SHARDS_KEY, now - HEARTBEAT_TTL, "+inf")
+    pipe.zrangebyscore(FLOOD_KEY, now, "+inf")
+    pipe.zremrangebyscore(FLOOD_KEY, "-inf", now)
+    live, flooded, _ = pipe.execute()
+    live = {int(account) for account in live}
+    flooded = live & {int(account) for account in flooded}
+    return sorted(live), sorted(flooded)
+
+
+class Shards:
+    """Assigns channels to live accounts. A channel is saved by the account that
+    owns it on the ring once that account joined it, until then an account that
+    joined it already keeps saving it, so moving a channel loses no message and
+    channels that are joined are not joined again. Accounts in flood wait join no
+    channel, so a channel that no account joined is given to the ring of the
+    other accounts while its owner is in flood wait.
+
+    Args:
+        live (list): ids of accounts with a live listener
+        flooded (list): ids of live accounts in flood wait
+        members (dict): channel id -> set of ids of accounts that joined it
+    """
+
+    def __init__(self, live, flooded, members):
+        self.live = set(live)
+        self.flooded = set(flooded)
+        self.members = members
+        self.ring = HashRing(sorted(self.live))
+        self.joining_ring = HashRing(sorted(self.live - self.flooded))
+
+    def assign(self, channel_id):
+        """Returns the account that saves messages of a channel and the account
+        that joins it, None if no account joins it now
+        """
+        owner = self.ring.owner(channel_id)
+        members = self.members.get(channel_id, set()) & self.live
+        if owner in members:
+            return owner, None
+        joiner = None if owner in self.flooded else owner
+        if members:
+            # the same member is picked by all listeners
+            member = min(
+                members, key=lambda account: ring_hash(f"{account}:{channel_id}")
+            )
+            return member, joiner
+        if joiner is None:
+            joiner = self.joining_ring.owner(channel_id)
+        return joiner or owner, joiner
+
+
+def shard_reports():
+    """Returns the last report of listeners, with the time their flood wait ends
+
+    Returns:
+        dict: account id -> report
+    """
+    reports = {
+        int(account): json.loads(report)
+        for account, report in REDIS_CLIENT.hgetall(REPORTS_KEY).items()
+    }
+    for account, until in REDIS_CLIENT.zrange(FLOOD_KEY, 0, -1, withscores=True):
+        if int(account) in reports:
+            reports[int(account)]["flood_wait_until"] = until
+    return reports
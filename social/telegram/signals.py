@@ -0,0 +1,22 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from network import models as net_models
+from telegram import models
+from telegram.ingestion import invalidate_channels
+
+
+@receiver(post_save, sender=net_models.Channel)
+@receiver(post_delete, sender=net_models.Channel)
+def invalidate_telegram_channels(instance, **kwargs):
+    """Channel maps of telegram listeners are outdated when a telegram channel
+    changes, e.g. not when a crawl of another network sets last_crawl
+    """
+    if instance.network.name == "Telegram":
+        invalidate_channels()
+
+
+@receiver(m2m_changed, sender=models.Account.channels.through)
+def invalidate_telegram_members(**kwargs):
+    """A channel moves to its owner when the owner joins it"""
+    invalidate_channels()
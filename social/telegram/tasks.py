@@ -1,6 +1,6 @@
-import json
 import asyncio
 import datetime
+from collections import defaultdict
 
 from telethon import TelegramClient, events, functions, errors
 from telethon.tl.functions.channels import (
@@ -12,16 +12,20 @@ from telethon.tl.functions.messages import GetRepliesRequest
 from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.utils import timezone
-from django.core.cache import cache
 from celery import shared_task
 from celery.utils.log import get_task_logger
 
 from network import models as net_models
-from . import models
+from . import models, ingestion, sharding, polling, backfill
 
 logger = get_task_logger(__name__)
 MINUTE = 60
 HOUR = 60 * MINUTE
+STATICS_BATCH_SIZE = 500
+# seconds the statics poller waits when no message is due or polling failed
+POLL_IDLE_WAIT = 10
+# seconds the backfill waits when no channel is queued or backfill failed
+BACKFILL_IDLE_WAIT = MINUTE
 
 
 def get_account_client(account_id):
@@ -35,12 +39,15 @@ def get_account_client(account_id):
         client: connection to the Telegram server
     """
     account = models.Account.objects.get(pk=account_id)
-    client = TelegramClient(
+    return account, account_client(account)
+
+
+def account_client(account):
+    return TelegramClient(
         "/app/telegram_sessions/" + account.phone_number,
         settings.TELEGRAM_API_ID,
         settings.TELEGRAM_API_HASH,
     )
-    return account, client
 
 
 @sync_to_async
@@ -76,46 +83,26 @@ def update_channel_info(channel_username, info):
 
 
 @sync_to_async
-def set_channels_list_async():
-    """This function is used to set a cache value for channels list"""
-    channels = [channel.username for channel in net_models.Channel.objects.all()]
-    if len(channels):
-        cache.set("telegram_channels", json.dumps(channels))
-
-
-@sync_to_async
-def insert_to_db(channel_username, event):
-    """Store received message into db
+def update_message_statics(channel_id, statics):
+    """Updates message statics like views-count, shares-count of a channel by a
+    bulk UPDATE query per STATICS_BATCH_SIZE posts
 
     Args:
-        channel_username (str): username of the channel
-        event (json): event is the received message
+        channel_id (int): primary key of the channel
+        statics (dict): message id -> (views-count, forwards-count)
     """
-    network = net_models.Network.objects.get(name="Telegram")
-    channel = net_models.Channel.objects.get(network=network, username=channel_username)
-    if not channel.status:
-        return
-    message_id = event.message.id
-    channel_id = event.message.peer_id.channel_id
-    text = event.message.message
-    data = {"message_id": message_id, "channel_id": channel_id}
-    net_models.Post.objects.create(body=text, channel=channel, data=data)
-
-
-@shared_task()
-def update_message_statics(channel_username, message_id, views_count, forwards_count):
-    """Updates message statics like views-count, shares-count
-
-    Args:
-        channel_username (str): username of channel
-        message_id (int): id of the message
-        views_count (int): views-count
-        forwards_count (int): forwards-count (or shares-count)
-    """
-    network = net_models.Network.objects.get(name="Telegram")
-    channel = net_models.Channel.objects.get(network=network, username=channel_username)
-    net_models.Post.objects.filter(channel=channel, data__message_id=message_id).update(
-        views_count=views_count or 0, share_count=forwards_count or 0
+    posts = [
+        net_models.Post(
+            pk=pk,
+            views_count=statics[message_id][0] or 0,
+            share_count=statics[message_id][1] or 0,
+        )
+        for pk, message_id in net_models.Post.objects.filter(
+            channel_id=channel_id, data__message_id__in=list(statics)
+        ).values_list("pk", "data__message_id")
+    ]
+    net_models.Post.objects.bulk_update(
+        posts, ["views_count", "share_count"], batch_size=STATICS_BATCH_SIZE
     )
 
 
@@ -165,116 +152,294 @@ def sign_in(account_id, code):
 
 
 @sync_to_async
-def unjoined_channels():
+def unjoined_channels(account_id, channel_ids):
+    """Returns usernames of channels that an account has not joined
+
+    Args:
+        account_id (int): primary key of the account
+        channel_ids (list): primary keys of channels
+    """
     return list(
-        net_models.Channel.objects.filter(
-            network__name="Telegram", joined__isnull=True
-        ).values_list("username", flat=True)
+        net_models.Channel.objects.filter(pk__in=channel_ids)
+        .exclude(telegram_accounts=account_id)
+        .values_list("username", flat=True)
     )
 
 
 @sync_to_async
-def channel_usernames():
-    return list(
-        net_models.Channel.objects.filter(network__name="Telegram")
-        .values_list("username", flat=True)
-        .order_by("-id")
-    )
+def schedule_recent_posts(channel_ids):
+    """Schedules measuring statics of posts of channels that are younger than
+    polling.MAX_AGE and not scheduled yet, e.g. posts saved before a scheduler
+    """
+    since = timezone.now() - timezone.timedelta(seconds=polling.MAX_AGE)
+    messages = defaultdict(list)
+    for channel_id, message_id, created_at in net_models.Post.objects.filter(
+        channel_id__in=channel_ids, created_at__gte=since, data__has_key="message_id"
+    ).values_list("channel_id", "data__message_id", "created_at"):
+        messages[channel_id].append((message_id, created_at.timestamp()))
+    for channel_id, channel_messages in messages.items():
+        polling.schedule(channel_id, channel_messages, only_new=True)
 
 
 @sync_to_async
-def channel_posts(channel_username):
-    channel = net_models.Channel.objects.filter(username=channel_username).first()
-    today = timezone.localtime() - timezone.timedelta(hours=2)
-    posts = channel.posts.filter(created_at__gte=today).order_by("-created_at")
-    post_ids_array = []
-    for post in posts:
-        if post.data and "message_id" in post.data:
-            post_ids_array.append(post.data["message_id"])
-    return post_ids_array
+def account_ids():
+    return list(models.Account.objects.values_list("pk", flat=True))
 
 
 @shared_task()
-def channel_joined(username):
+def channel_joined(username, account_id=None):
     channel = net_models.Channel.objects.filter(
         network__name="Telegram", username=username
     ).first()
     channel.joined = True
     channel.save()
+    if account_id is not None:
+        channel.telegram_accounts.add(account_id)
 
 
-@shared_task()
-def run_telegram(account_id):
-    _, client = get_account_client(account_id)
-    client.start()
+async def listen(account_id):
+    """Listens to new messages of channels that an account owns, joins them and
+    updates statics of their messages. Channels are shared between listeners of
+    accounts by consistent hashing, see sharding.Shards.
+
+    Args:
+        account_id (int): primary key of the account
+    """
+    account = await sync_to_async(models.Account.objects.get)(pk=account_id)
+    client = account_client(account)
+    await client.connect()
+    if not await client.is_user_authorized():
+        logger.warning(f"telegram account {account} is not signed in")
+        await client.disconnect()
+        return
+
+    channels = ingestion.ChannelMap(account_id)
+    buffer = ingestion.PostBuffer(
+        settings.TELEGRAM_FLUSH_SIZE, settings.TELEGRAM_FLUSH_INTERVAL / 1000
+    )
+
+    async def wait_for_flood(error):
+        logger.error(f"Flood wait of account {account_id} for {error.seconds}")
+        sharding.flood_wait(account_id, error.seconds)
+        await asyncio.sleep(error.seconds)
+
+    async def keep_shard():
+        """Reports the listener alive with its channels and lag, then loads the
+        channels that it owns again if they may have changed
+        """
+        while True:
+            try:
+                sharding.heartbeat(
+                    account_id,
+                    {
+                        "channels": len(channels.channels),
+                        "joining": len(channels.joining),
+                        "lag": buffer.lag,
+                        "pending": len(buffer.posts),
+                        "backlog": polling.backlog(
+                            [channel.pk for channel in channels.channels.values()]
+                        ),
+                    },
+                )
+                await channels.refresh()
+            except Exception:
+                logger.exception("telegram channels were not loaded")
+            await asyncio.sleep(ingestion.VERSION_INTERVAL)
 
     async def join_channel(channel_username):
         try:
             channel = await client.get_entity(channel_username)
             await client(JoinChannelRequest(channel))
             print(f"join to {channel_username}")
-            channel_joined.delay(channel_username)
+            channel_joined.delay(channel_username, account_id)
         except errors.FloodWaitError as error:
-            logger.error(f"Flood wait for {error.seconds}")
-            await asyncio.sleep(error.seconds)
+            await wait_for_flood(error)
 
     async def check_channels_must_joined():
         while True:
-            for username in await unjoined_channels():
+            channel_ids = [channel.pk for channel in channels.joining.values()]
+            for username in await unjoined_channels(account_id, channel_ids):
+                # e.g. a flood wait gave the channel to another account
+                if username not in channels.joining:
+                    continue
                 print(f"channel {username} must joined")
                 await join_channel(username)
                 await asyncio.sleep(1 * MINUTE)
             await asyncio.sleep(5 * MINUTE)
 
     async def get_message_statics(channel_username, message_ids):
+        """Returns views-count and forwards-count of at most polling.MAX_IDS
+        messages by one request
+        """
         result = await client(
             functions.messages.GetMessagesViewsRequest(
                 peer=channel_username, id=message_ids, increment=False
             )
         )
-        for index, item in enumerate(result.views):
-            update_message_statics.delay(
-                channel_username, message_ids[index], item.views, item.forwards
-            )
-
-    async def check_channel_posts_statics():
+        return {
+            message_id: (item.views, item.forwards)
+            for message_id, item in zip(message_ids, result.views)
+        }
+
+    async def poll_statics():
+        """Measures statics of messages of the owned channels, most stale first.
+        Requests are paced by the budget of the account.
+        """
+        budget = polling.RequestBudget(settings.TELEGRAM_STATS_INTERVAL, 10 * MINUTE)
+        await schedule_recent_posts(
+            [channel.pk for channel in channels.channels.values()]
+        )
         while True:
-            for username in await channel_usernames():
-                post_ids = await channel_posts(username)
-                if len(post_ids) == 0:
+            owned = {channel.pk: name for name, channel in channels.channels.items()}
+            try:
+                batch = polling.next_batch(set(owned))
+                if batch is None:
+                    await asyncio.sleep(POLL_IDLE_WAIT)
                     continue
-                await get_message_statics(username, post_ids)
-                await asyncio.sleep(2 * MINUTE)
-            await asyncio.sleep(20 * MINUTE)
+                channel_id, messages = batch
+                await budget.wait()
+                try:
+                    statics = await get_message_statics(
+                        owned[channel_id], [message_id for message_id, _ in messages]
+                    )
+                except errors.FloodWaitError as error:
+                    logger.error(
+                        f"Flood wait of account {account_id} for {error.seconds}"
+                    )
+                    sharding.flood_wait(account_id, error.seconds)
+                    budget.flooded(error.seconds)
+                    continue
+                except (errors.RPCError, ValueError) as error:
+                    # e.g. the channel is private now, it is tried again later
+                    logger.error(f"statics of channel {channel_id} failed: {error}")
+                    polling.schedule(channel_id, messages)
+                    continue
+                budget.succeeded()
+                await update_message_statics(channel_id, statics)
+                polling.schedule(channel_id, messages)
+            except Exception:
+                logger.exception("telegram statics polling failed")
+                await asyncio.sleep(POLL_IDLE_WAIT)
+
+    async def backfill_history():
+        """Fetches past messages of the owned channels that are queued for
+        backfill, a turn of a channel at a time
+        """
+        while True:
+            owned = {channel.pk: channel for channel in channels.channels.values()}
+            try:
+                channel_id = backfill.next_channel(set(owned))
+                if channel_id is None:
+                    await asyncio.sleep(BACKFILL_IDLE_WAIT)
+                    continue
+                finished = await backfill.backfill_channel(
+                    client, owned[channel_id], settings.TELEGRAM_BACKFILL_WAIT
+                )
+                backfill.end_turn(channel_id, finished)
+            except errors.FloodWaitError as error:
+                await wait_for_flood(error)
+            except (errors.RPCError, ValueError) as error:
+                # e.g. the channel is private now, it is tried again in its next turn
+                logger.error(f"backfill of channel {channel_id} failed: {error}")
+                backfill.end_turn(channel_id, False)
+                await asyncio.sleep(BACKFILL_IDLE_WAIT)
+            except Exception:
+                logger.exception("telegram backfill failed")
+                await asyncio.sleep(BACKFILL_IDLE_WAIT)
 
-    @client.on(events.NewMessage(incoming=True))
     async def my_event_handler(event):
         sender = await event.get_sender()
-        await set_channels_list_async()
-        channels = get_channels_list()
-        if sender and sender.username in channels:
-            await insert_to_db(sender.username, event)
+        channel = channels.get(sender.username) if sender else None
+        if channel is not None:
+            await buffer.add(channel, event.message)
 
-    loop = asyncio.get_event_loop()
-    loop.create_task(check_channels_must_joined())
-    loop.create_task(check_channel_posts_statics())
-    loop.create_task(client.run_until_disconnected())
-    loop.run_forever()
+    sharding.heartbeat(
+        account_id,
+        {"channels": 0, "joining": 0, "lag": 0, "pending": 0, "backlog": 0},
+    )
+    await channels.refresh()
+    client.add_event_handler(my_event_handler, events.NewMessage(incoming=True))
+    jobs = [
+        asyncio.ensure_future(job)
+        for job in (
+            keep_shard(),
+            buffer.keep_flushing(),
+            check_channels_must_joined(),
+            poll_statics(),
+            backfill_history(),
+        )
+    ]
+    try:
+        await client.run_until_disconnected()
+    finally:
+        for job in jobs:
+            job.cancel()
+        sharding.leave(account_id)
+        await buffer.flush()
+        await client.disconnect()
 
 
 @shared_task()
-def set_channels_list():
-    channels = [channel.username for channel in net_models.Channel.objects.all()]
-    if len(channels):
-        cache.set("telegram_channels", json.dumps(channels))
+def backfill_telegram(channel_ids=None, days=None):
+    """Queues fetching past messages of telegram channels, listeners of the
+    accounts that own them fetch the messages
+
+    Args:
+        channel_ids (list, optional): primary keys of channels. Defaults to all
+        active telegram channels.
+        days (int, optional): fetch messages of the last days. Defaults to all
+        messages.
+
+    Returns:
+        int: number of newly queued channels
+    """
+    if channel_ids is None:
+        channel_ids = list(
+            net_models.Channel.objects.filter(
+                network__name="Telegram", status=True
+            ).values_list("pk", flat=True)
+        )
+    since = None
+    if days is not None:
+        since = timezone.now() - timezone.timedelta(days=days)
+    return backfill.request(channel_ids, since)
+
+
+@shared_task()
+def run_telegram(account_id):
+    """Runs the listener of an account, e.g. a process per account"""
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(listen(account_id))
 
 
 @shared_task()
-def get_channels_list():
-    channels = cache.get("telegram_channels")
-    if channels:
-        return json.loads(channels)
-    return []
+def run_telegram_shards():
+    """Runs listeners of all accounts as tasks of one event loop. Listeners of
+    added accounts are started and stopped listeners are started again every
+    minute, listeners of removed accounts are stopped.
+    """
+
+    async def supervise():
+        listeners = {}
+        while True:
+            accounts = await account_ids()
+            for account_id in set(listeners) - set(accounts):
+                listeners.pop(account_id).cancel()
+            for account_id in accounts:
+                listener = listeners.get(account_id)
+                if listener is not None and not listener.done():
+                    continue
+                if listener is not None and not listener.cancelled():
+                    if listener.exception() is not None:
+                        logger.error(
+                            f"telegram listener of account {account_id} stopped",
+                            exc_info=listener.exception(),
+                        )
+                listeners[account_id] = asyncio.ensure_future(listen(account_id))
+            await asyncio.sleep(1 * MINUTE)
+
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(supervise())
 
 
 @shared_task()
@@ -0,0 +1,63 @@
+from celery.utils.log import get_task_logger
+from selenium.common.exceptions import JavascriptException
+
+logger = get_task_logger(__name__)
+
+# Each find_element, get_attribute and text of the helpers in twitter.tasks is an
+# http call to the selenium grid. This script reads the same selectors of all
+# tweets of a page in the browser at once, the helpers remain as fallback.
+TWEETS_SCRIPT = """
+const first = (article, selector) => article.querySelector(selector);
+const text = (article, selector) => {
+    const element = first(article, selector);
+    return element ? element.innerText : null;
+};
+const href = (article, selector) => {
+    const element = first(article, selector);
+    return element ? element.href : null;
+};
+const label = (article, name) => {
+    const element = first(article, `div[role="button"][data-testid="${name}"]`);
+    return element ? element.getAttribute("aria-label") : null;
+};
+return Array.from(document.getElementsByTagName("article"), (article) => {
+    const users = article.querySelectorAll('a[role="link"][href^="/"][tabindex="-1"]');
+    const user = users.length > 1 ? users[1] : users[0];
+    return {
+        element: article,
+        link: href(article, 'a[role="link"][dir][aria-label]:not([tabindex])'),
+        status_link: href(article, 'a[role="link"][dir="auto"][aria-label]'),
+        body: text(article, 'div[dir="auto"][id^="id__"][data-testid="tweetText"]'),
+        text: text(
+            article, 'div[dir="auto"][id^="id__"]:not([data-testid*="socialContext"])'
+        ),
+        username: user ? user.innerText : null,
+        reply: label(article, "reply"),
+        retweet: label(article, "retweet"),
+        like: label(article, "like"),
+    };
+});
+"""
+
+
+def read_tweets(driver):
+    """Reads all tweets of a page by one script
+
+    Returns:
+        list: dicts of element, link, status_link, body, text, username and
+        aria-labels of reply, retweet and like buttons of tweets, fields that are
+        not found are None. None if the script failed
+    """
+    try:
+        return driver.execute_script(TWEETS_SCRIPT)
+    except JavascriptException:
+        logger.warning("extraction script failed", exc_info=True)
+        return None
+
+
+def parse_id(link):
+    return int(link.split("/")[-1])
+
+
+def parse_count(label):
+    return int(label.split()[0])
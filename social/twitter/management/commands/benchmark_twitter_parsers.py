@@ -0,0 +1,8 @@
+from twitter import parsers
+from reusable.benchmarks import ParserBenchmarkCommand
+
+
+class Command(ParserBenchmarkCommand):
+    app = "twitter"
+    snapshots = [("search.html", parsers.parse_tweets)]
+    captured = {"twitter": parsers.parse_tweets}
@@ -0,0 +1,56 @@
+from urllib.parse import urljoin
+
+from reusable.parsing import parse, first, text
+
+# Selectors mirror the helpers of twitter.tasks and the script of
+# twitter.extraction, the parser returns the same fields as the script.
+TWITTER_URL = "https://x.com/"
+TWEET_LINK = ".//a[@role='link' and @dir and @aria-label and not(@tabindex)]"
+STATUS_LINK = ".//a[@role='link' and @dir='auto' and @aria-label]"
+TWEET_BODY = (
+    ".//div[@dir='auto' and starts-with(@id,'id__') and @data-testid='tweetText']"
+)
+TWEET_TEXT = (
+    ".//div[@dir='auto' and starts-with(@id,'id__') and "
+    "not(contains(@data-testid, 'socialContext'))]"
+)
+TWEET_USERNAME = ".//a[@role='link' and starts-with(@href,'/') and @tabindex='-1']"
+BUTTON = ".//div[@role='button' and @data-testid='{}']"
+
+
+def href(article, xpath):
+    link = first(article, xpath)
+    return urljoin(TWITTER_URL, link.get("href")) if link is not None else None
+
+
+def label(article, name):
+    button = first(article, BUTTON.format(name))
+    return button.get("aria-label") if button is not None else None
+
+
+def read_tweet(article):
+    users = article.xpath(TWEET_USERNAME)
+    user = users[1] if len(users) > 1 else (users[0] if users else None)
+    return {
+        "element": None,
+        "link": href(article, TWEET_LINK),
+        "status_link": href(article, STATUS_LINK),
+        "body": text(first(article, TWEET_BODY)),
+        "text": text(first(article, TWEET_TEXT)),
+        "username": text(user),
+        "reply": label(article, "reply"),
+        "retweet": label(article, "retweet"),
+        "like": label(article, "like"),
+    }
+
+
+def parse_tweets(source):
+    """Parses tweets of a page
+
+    Args:
+        source (str): html of the page
+
+    Returns:
+        list: dicts of fields of tweets, see extraction.read_tweets
+    """
+    return [read_tweet(article) for article in parse(source).xpath("//article")]
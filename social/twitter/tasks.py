@@ -3,69 +3,48 @@ import pickle
 import random
 import traceback
 
-from urllib3.exceptions import MaxRetryError
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
 from selenium.common.exceptions import TimeoutException
 from selenium.common.exceptions import NoSuchElementException
-from selenium.common.exceptions import SessionNotCreatedException
+from selenium.webdriver.support import expected_conditions as EC
 from django.utils import timezone
 from django.utils.html import strip_tags
 from django.conf import settings
-from django.core.cache import caches
 from celery import shared_task
 from celery.utils.log import get_task_logger
 
 from notification import tasks as not_tasks
 from notification import utils as not_utils
-from reusable.browser import scroll
+from reusable.browser import scroll, parses_page_source, page_source
+from reusable.waits import wait_for, elements_more_than
+from reusable.browser_pool import BrowserPool, BrowserUnavailable, create_driver
 from reusable.models import get_network_model
-from reusable.other import only_one_concurrency
+from reusable.dedup import get_duplicate_checker
 from . import models
+from . import extraction, parsers
 
 logger = get_task_logger(__name__)
 MINUTE = 60
 HOUR = 60 * MINUTE
 DAY = 24 * HOUR
 MONTH = 30 * DAY
-TASKS_TIMEOUT = 1 * MINUTE
-DUPLICATE_CHECKER = caches["twitter"]
+# keys of the "twitter" django cache were its version prefix and the tweet id
+DUPLICATE_CHECKER = get_duplicate_checker(
+    "twitter:tweet", MONTH * 3, legacy_key=lambda tweet_id: f":1:{tweet_id}"
+)
+LOGIN_TIMEOUT = 30
+# screens of a search page that are crawled, crawling stops at a screen of seen tweets
+SEARCH_PAGE_SCREENS = 1
 
 
-def get_driver():
-    """Creates a webdriver with Firefox capabilities.
-    In some situation session can't be created.
+def load_twitter_cookies(driver):
+    """This function head the browser to the twitter website and logs in by the
+    stored cookies. It runs once for each session of the browser pool.
 
-    Returns:
-        webdriver: webdriver object
-    """
-    try:
-        # Create Firefox options
-        
-        return webdriver.Remote(
-            "http://social_firefox:4444/wd/hub",
-            DesiredCapabilities.FIREFOX,
-            options=webdriver.FirefoxOptions(),
-        )
-    except SessionNotCreatedException as err:
-        logger.info("Error: %s\n\n%s", err, traceback.format_exc())
-    except MaxRetryError as err:
-        logger.info("Error: %s\n\n%s", err, traceback.format_exc())
-    return None
-
-
-def initialize_twitter_driver():
-    """This function head the browser to the twitter website.
-
-    Returns:
-        Webdriver: webdriver browser
+    Args:
+        driver (Webdriver): webdriver browser
     """
-    driver = get_driver()
-    if driver is None:
-        return None
-
     cookies = None
     with open("/app/social/x_cookies.pkl", "rb") as twitter_cookie:
         cookies = pickle.load(twitter_cookie)
@@ -73,7 +52,9 @@ def initialize_twitter_driver():
     driver.get("https://www.x.com/")
     for cookie in cookies:
         driver.add_cookie(cookie)
-    return driver
+
+
+BROWSER_POOL = BrowserPool("twitter", load_twitter_cookies)
 
 
 def driver_exit(driver):
@@ -87,22 +68,45 @@ def driver_exit(driver):
     driver.quit()
 
 
+def login_timed_out(driver, step):
+    logger.error("twitter login failed, %s did not load in %ss", step, LOGIN_TIMEOUT)
+    driver_exit(driver)
+
+
 def login():
-    driver = get_driver()
-    if driver is None:
+    try:
+        driver = create_driver()
+    except BrowserUnavailable:
         return
     driver.get("https://x.com/i/flow/login")
-    time.sleep(5)
-    username_elem = driver.find_element("xpath", "//input[@autocomplete='username']")
+    username_elem = wait_for(
+        driver,
+        EC.element_to_be_clickable((By.XPATH, "//input[@autocomplete='username']")),
+        LOGIN_TIMEOUT,
+        "username input",
+    )
+    if username_elem is None:
+        login_timed_out(driver, "username input")
+        return
     username_elem.send_keys(settings.TWITTER_USERNAME)
     username_elem.send_keys(Keys.ENTER)
-    time.sleep(5)
-    password_elem = driver.find_element(
-        "xpath", "//input[@autocomplete='current-password']"
+    password_elem = wait_for(
+        driver,
+        EC.element_to_be_clickable(
+            (By.XPATH, "//input[@autocomplete='current-password']")
+        ),
+        LOGIN_TIMEOUT,
+        "password input",
     )
+    if password_elem is None:
+        login_timed_out(driver, "password input")
+        return
     password_elem.send_keys(settings.TWITTER_PASSWORD)
     password_elem.send_keys(Keys.ENTER)
-    time.sleep(5)
+    if not wait_for(driver, EC.url_contains("/home"), LOGIN_TIMEOUT, "home page"):
+        # cookies of a failed login are not saved
+        login_timed_out(driver, "home page")
+        return
 
     with open("/app/social/x_cookies.pkl", "wb") as twitter_cookie:
         pickle.dump(driver.get_cookies(), twitter_cookie)
@@ -110,15 +114,28 @@ def login():
     driver_exit(driver)
 
 
-def get_post_detail(article):
+def get_post_detail(article, tweet=None):
     """extract information from an tweet div (information are id, body, reply, retweet, like)
 
     Args:
         article (element): it is a tweet html body
+        tweet (dict, optional): fields of the tweet read by extraction script
 
     Returns:
         detail (json): extracted information
     """
+    tweet = tweet or {}
+    fields = ("status_link", "text", "reply", "retweet", "like")
+    if all(tweet.get(field) is not None for field in fields):
+        detail = {
+            "id": extraction.parse_id(tweet["status_link"]),
+            "body": tweet["text"],
+        }
+        for item in ["reply", "retweet", "like"]:
+            detail[f"{item}_count"] = extraction.parse_count(tweet[item])
+        return detail
+    if article is None:
+        raise NoSuchElementException("tweet is incomplete in the page source")
     detail = {}
     detail["id"] = int(
         article.find_element(
@@ -216,11 +233,10 @@ def store_twitter_posts(channel_id, post_id, body, meta_data):
 
 
 @shared_task(name="get_twitter_posts")
-@only_one_concurrency(key="browser", timeout=TASKS_TIMEOUT)
 def get_twitter_posts(channel_id):
     """Get posts of a channel
-    The only-one-concurrency decorator is used to ensure that we will not open
-    two browser at the same time.
+    The browser session is leased from the pool, so no more browsers than the
+    grid capacity are opened at the same time.
 
     Args:
         channel_id (int): id of the channel
@@ -229,30 +245,32 @@ def get_twitter_posts(channel_id):
     channel = channel_model.objects.get(pk=channel_id)
     print(f"****** Twitter crawling {channel} started")
     channel_url = f"{channel.network.url}/{channel.username}"
-    driver = initialize_twitter_driver()
-    if driver is None:
-        return
-    driver.get(channel_url)
-    scroll(driver, 5)
-    time.sleep(5)
-    articles = driver.find_elements(By.TAG_NAME, "article")
-    for article in articles:
-        try:
-            post_detail = get_post_detail(article)
-            post_meta_data = {
-                "reply_count": post_detail["reply_count"],
-                "retweet_count": post_detail["retweet_count"],
-                "like_count": post_detail["like_count"],
-            }
-            store_twitter_posts.delay(
-                channel_id,
-                post_detail["id"],
-                post_detail["body"],
-                post_meta_data,
+    try:
+        with BROWSER_POOL.lease() as driver:
+            driver.get(channel_url)
+            wait_for(
+                driver, elements_more_than((By.TAG_NAME, "article")), message="tweets"
             )
-        except NoSuchElementException:
-            logger.error(traceback.format_exc())
-    driver_exit(driver)
+            scroll(driver, 5)
+            for tweet in get_tweets(driver):
+                try:
+                    post_detail = get_post_detail(tweet["element"], tweet)
+                    post_meta_data = {
+                        "reply_count": post_detail["reply_count"],
+                        "retweet_count": post_detail["retweet_count"],
+                        "like_count": post_detail["like_count"],
+                    }
+                    store_twitter_posts.delay(
+                        channel_id,
+                        post_detail["id"],
+                        post_detail["body"],
+                        post_meta_data,
+                    )
+                except NoSuchElementException:
+                    logger.error(traceback.format_exc())
+    except BrowserUnavailable as error:
+        logger.info("skipped crawling channel %s: %s", channel_id, error)
+        return
     channel.last_crawl = timezone.localtime()
     channel.save()
 
@@ -266,31 +284,33 @@ def get_twitter_post_comments(post_id):
     """
     post_model = get_network_model("Post")
     post = post_model.objects.get(pk=post_id)
-    driver = initialize_twitter_driver()
-    if driver is None:
-        return
-    driver.get(f"{post.channel.username}/status/{post.network_id}")
-    scroll(driver, 2)
-    time.sleep(10)
-    articles = driver.find_elements(By.TAG_NAME, "article")
-    for article in articles:
-        try:
-            post_detail = get_comment_detail(article)
-            # store on different tables?
-            post_meta_data = {
-                "reply_count": post_detail["reply_count"],
-                "retweet_count": post_detail["retweet_count"],
-                "like_count": post_detail["like_count"],
-            }
-            store_twitter_posts.delay(
-                post.channel_id,
-                post_detail["id"],
-                post_detail["body"],
-                post_meta_data,
+    try:
+        with BROWSER_POOL.lease() as driver:
+            driver.get(f"{post.channel.username}/status/{post.network_id}")
+            wait_for(
+                driver, elements_more_than((By.TAG_NAME, "article")), message="tweets"
             )
-        except NoSuchElementException:
-            logger.error(traceback.format_exc())
-    driver_exit(driver)
+            scroll(driver, 2)
+            articles = driver.find_elements(By.TAG_NAME, "article")
+            for article in articles:
+                try:
+                    post_detail = get_comment_detail(article)
+                    # store on different tables?
+                    post_meta_data = {
+                        "reply_count": post_detail["reply_count"],
+                        "retweet_count": post_detail["retweet_count"],
+                        "like_count": post_detail["like_count"],
+                    }
+                    store_twitter_posts.delay(
+                        post.channel_id,
+                        post_detail["id"],
+                        post_detail["body"],
+                        post_meta_data,
+                    )
+                except NoSuchElementException:
+                    logger.error(traceback.format_exc())
+    except BrowserUnavailable as error:
+        logger.info("skipped crawling comments of post %s: %s", post_id, error)
 
 
 @shared_task
@@ -345,23 +365,58 @@ def get_tweet_link(tweet_detail):
     )
 
 
-def get_post_detail_v2(article):
+def get_post_detail_v2(article, tweet=None):
     """extract post details from html element
 
     Args:
         article (html element): html of a tweet.
+        tweet (dict, optional): fields of the tweet read by extraction script,
+            fields that the script did not find are extracted by helpers.
 
     Returns:
         data (json): information of tweet.
     """
+    tweet = tweet or {}
+    fields = ("link", "body", "username")
+    if article is None and any(tweet.get(field) is None for field in fields):
+        raise NoSuchElementException("tweet is incomplete in the page source")
     detail = {}
-    detail["id"] = get_tweet_id(article)
-    detail["body"] = get_tweet_body(article)
-    detail["username"] = get_tweet_username(article)
+    if tweet.get("link") is not None:
+        detail["id"] = extraction.parse_id(tweet["link"])
+    else:
+        detail["id"] = get_tweet_id(article)
+    if tweet.get("body") is not None:
+        detail["body"] = tweet["body"]
+    else:
+        detail["body"] = get_tweet_body(article)
+    if tweet.get("username") is not None:
+        detail["username"] = tweet["username"]
+    else:
+        detail["username"] = get_tweet_username(article)
     detail["link"] = get_tweet_link(detail)
     return detail
 
 
+def get_tweets(driver):
+    """Reads all tweets of a page by one extraction script or parses them from
+    the page source. If the script fails, tweets only have their element and are
+    read by helpers. Parsed tweets have no element.
+
+    Args:
+        driver (Webdriver): webdriver browser
+
+    Returns:
+        list: dicts of fields of tweets, see extraction.read_tweets
+    """
+    if parses_page_source():
+        return parsers.parse_tweets(page_source(driver, "twitter"))
+    tweets = extraction.read_tweets(driver)
+    if tweets is None:
+        articles = driver.find_elements(By.TAG_NAME, "article")
+        tweets = [{"element": article} for article in articles]
+    return tweets
+
+
 @shared_task
 def update_last_crawl(page_id):
     page = models.SearchPage.objects.get(pk=page_id)
@@ -401,40 +456,48 @@ def crawl_search_page(page_id):
     """
     update_last_crawl.delay(page_id)
     page = models.SearchPage.objects.get(pk=page_id)
-    driver = initialize_twitter_driver()
-    if driver is None:
-        return
-    driver = driver_head_to_page(driver, page.url)
-    if driver is None:
-        return
-    time.sleep(5)
-    scroll_counter = 0
-    while scroll_counter < 1:
-        tweets = driver.find_elements(By.TAG_NAME, "article")
-        print(f"found {len(tweets)} tweets")
-        terms1 = page.terms_level_1.split("+") if page.terms_level_1 else []
-        terms2 = page.terms_level_2.split("+") if page.terms_level_2 else []
-        for tweet in tweets:
-            body = None
-            try:
-                driver.execute_script("arguments[0].scrollIntoView();", tweet)
-                post_detail = get_post_detail_v2(tweet)
-                body = post_detail["body"]
-                if DUPLICATE_CHECKER.get(post_detail["id"]):
-                    print(f"{post_detail['id']} exists")
-                    continue
-                print(f"{post_detail['id']} NOT exists")
-                DUPLICATE_CHECKER.set(post_detail["id"], 1, MONTH * 3)
-                send = determine_to_send(body, terms1, terms2)
-                if send:
-                    body = notification_message_prepare(body, post_detail["link"])
-                    not_tasks.send_message_to_telegram_channel(
-                        body, page.output_channel.pk
-                    )
-                    time.sleep(1)
-            except NoSuchElementException:
-                logger.error(traceback.format_exc())
-        scroll(driver, 1)
-        time.sleep(5)
-        scroll_counter += 1
-    driver_exit(driver)
+    try:
+        with BROWSER_POOL.lease() as driver:
+            if driver_head_to_page(driver, page.url) is None:
+                return
+            wait_for(
+                driver, elements_more_than((By.TAG_NAME, "article")), message="tweets"
+            )
+            for screen in range(SEARCH_PAGE_SCREENS):
+                if screen:
+                    scroll(driver, 0)
+                tweets = get_tweets(driver)
+                print(f"found {len(tweets)} tweets")
+                terms1 = page.terms_level_1.split("+") if page.terms_level_1 else []
+                terms2 = page.terms_level_2.split("+") if page.terms_level_2 else []
+                details = []
+                for tweet in tweets:
+                    try:
+                        article = tweet["element"]
+                        if article is not None:
+                            driver.execute_script(
+                                "arguments[0].scrollIntoView();", article
+                            )
+                        details.append(get_post_detail_v2(article, tweet))
+                    except NoSuchElementException:
+                        logger.error(traceback.format_exc())
+                unseen = DUPLICATE_CHECKER.claim([detail["id"] for detail in details])
+                logger.info("%s of %s tweets are new", len(unseen), len(details))
+                # a tweet shown twice in the page is sent once
+                to_send = set(unseen)
+                for post_detail in details:
+                    if post_detail["id"] not in to_send:
+                        continue
+                    to_send.discard(post_detail["id"])
+                    send = determine_to_send(post_detail["body"], terms1, terms2)
+                    if send:
+                        body = notification_message_prepare(
+                            post_detail["body"], post_detail["link"]
+                        )
+                        not_tasks.send_message_to_telegram_channel(
+                            body, page.output_channel.pk
+                        )
+                if not unseen:
+                    break
+    except BrowserUnavailable as error:
+        logger.info("skipped crawling search page %s: %s", page_id, error)